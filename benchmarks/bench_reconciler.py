@@ -0,0 +1,218 @@
+"""
+Reconciler scaling benchmark against the in-memory fake Docker daemon.
+
+Builds the threaded servicer exactly as the server does (container cache,
+reconciler, rate limiter) but points it at tests/fake_docker.py, then at
+each size runs, in order:
+
+    create    empty -> N instances
+    noop      the same N instances again
+    drift     10% of instances get a new web port (recreated)
+    status    GetStatus over all N instances
+    teardown  N instances -> empty
+
+and reports wall time plus the Docker API calls issued during the call
+("rpc") and by the container cache following events afterwards ("events").
+
+It exits with status 1 if a scenario makes more Docker API calls than
+CALL_BUDGETS allows, or, given --baseline (the --json output of an earlier
+run), more calls than the baseline did or more than --threshold slower.
+
+    PYTHONPATH=. python benchmarks/bench_reconciler.py --sizes 10 100 --latency 0.5
+    PYTHONPATH=. python benchmarks/bench_reconciler.py --json > baseline.jsonl
+    PYTHONPATH=. python benchmarks/bench_reconciler.py --baseline baseline.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+# fake_docker lives with the tests
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from fake_docker import FakeDockerDaemon  # noqa: E402
+from src import transctrl_pb2  # noqa: E402
+from src.config import settings  # noqa: E402
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DRIFT_FRACTION = 0.1
+
+# Most Docker API calls, rpc and events together, a scenario may take at
+# size instances of which drifted drift: creates inspect the image once, then
+# create, start and inspect each container, which the cache inspects again
+# for its create and start events. Large passes may leave the cache applying
+# events more than CACHE_MAX_STALENESS behind, so the reply can read every
+# instance back from Docker once: a listing and an inspect each. No-ops and
+# status reads are served from the cache.
+CALL_BUDGETS = {
+    "create": lambda size, drifted: 6 * size + 2,
+    "noop": lambda size, drifted: 0,
+    "drift": lambda size, drifted: 9 * drifted + size + 1,
+    "status": lambda size, drifted: 0,
+    "teardown": lambda size, drifted: 4 * size,
+}
+
+
+class _Context:
+    """Just enough of grpc.ServicerContext for calling RPC methods directly."""
+
+    def abort(self, code, details):
+        raise RuntimeError(f"{code}: {details}")
+
+    def is_active(self):
+        return True
+
+    def time_remaining(self):
+        return None
+
+
+def _specs(base: str, size: int, drifted: int = 0):
+    specs = []
+    for i in range(size):
+        instance_id = f"bench-{i}"
+        specs.append(transctrl_pb2.InstanceSpec(
+            id=instance_id,
+            config_path=f"{base}/config/{instance_id}",
+            data_path=f"{base}/data/{instance_id}",
+            watch_path=f"{base}/watch/{instance_id}",
+            web_port=(20000 if i < drifted else 10000) + i,
+            data_port=30000 + i,
+            resource_limits=transctrl_pb2.ResourceLimits(memory="512m", cpu_quota=50000),
+            image_tag="latest",
+        ))
+    return specs
+
+
+def _settle(daemon: FakeDockerDaemon, quiet: float = 0.2, limit: float = 60.0):
+    """Wait until the daemon has seen no API calls for `quiet` seconds."""
+    deadline = time.monotonic() + limit
+    last = daemon.total_calls()
+    while time.monotonic() < deadline:
+        time.sleep(quiet)
+        current = daemon.total_calls()
+        if current == last:
+            return
+        last = current
+
+
+def _measure(daemon: FakeDockerDaemon, call):
+    daemon.reset_calls()
+    started = time.perf_counter()
+    response = call()
+    elapsed = time.perf_counter() - started
+    rpc_calls = daemon.total_calls()
+    _settle(daemon)
+    return response, {
+        "seconds": elapsed,
+        "rpc_calls": rpc_calls,
+        "event_calls": daemon.total_calls() - rpc_calls,
+        "calls": dict(daemon.calls),
+    }
+
+
+def run_size(size: int, latency: float, workdir: str):
+    base = os.path.join(workdir, f"mnt-{size}")
+    for kind in ("config", "data", "watch"):
+        for i in range(size):
+            os.makedirs(f"{base}/{kind}/bench-{i}", exist_ok=True)
+
+    from src.server import TransmissionControllerServicer
+    logging.getLogger().setLevel(logging.WARNING)
+
+    context = _Context()
+    with FakeDockerDaemon(os.path.join(workdir, f"docker-{size}.sock"), latency=latency) as daemon:
+        settings.DOCKER_HOST = daemon.url
+        settings.ALLOWED_MOUNT_BASE = base
+        # Keep audit records out of the report
+        settings.AUDIT_LOG_PATH = os.devnull
+        servicer = TransmissionControllerServicer()
+        try:
+            while not servicer.container_cache.is_fresh():
+                time.sleep(0.01)
+            _settle(daemon)
+
+            drift_count = max(1, int(size * DRIFT_FRACTION))
+            desired = _specs(base, size)
+            drifted = _specs(base, size, drifted=drift_count)
+            scenarios = [
+                ("create", lambda: servicer.Reconcile(transctrl_pb2.DesiredState(instances=desired), context)),
+                ("noop", lambda: servicer.Reconcile(transctrl_pb2.DesiredState(instances=desired), context)),
+                ("drift", lambda: servicer.Reconcile(transctrl_pb2.DesiredState(instances=drifted), context)),
+                ("status", lambda: servicer.GetStatus(transctrl_pb2.StatusRequest(), context)),
+                ("teardown", lambda: servicer.Reconcile(transctrl_pb2.DesiredState(), context)),
+            ]
+            for name, call in scenarios:
+                response, row = _measure(daemon, call)
+                errors = list(getattr(response, "errors", []))
+                if errors:
+                    raise RuntimeError(f"{name} at {size} instances failed: {errors[:3]}")
+                budget = CALL_BUDGETS[name](size, drift_count)
+                yield {"size": size, "scenario": name, "call_budget": budget, **row}
+        finally:
+            servicer.container_cache.stop()
+            servicer.reconciler._executor.shutdown(wait=False)
+
+
+def regressions(row, baseline=None, threshold: float = 0.5):
+    """Why row is a regression, against its call budget and baseline row."""
+    label = f"{row['scenario']} at {row['size']} instances"
+    calls = row["rpc_calls"] + row["event_calls"]
+    found = []
+    if calls > row["call_budget"]:
+        found.append(f"{label}: {calls} Docker calls, budget {row['call_budget']}")
+    if baseline is not None:
+        before = baseline["rpc_calls"] + baseline["event_calls"]
+        if calls > before:
+            found.append(f"{label}: {calls} Docker calls, baseline {before}")
+        if row["seconds"] > baseline["seconds"] * (1 + threshold):
+            found.append(f"{label}: {row['seconds']:.3f}s, baseline {baseline['seconds']:.3f}s")
+    return found
+
+
+def _load_baseline(path: str):
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return {(row["size"], row["scenario"]): row for row in rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="per Docker API call latency of the fake daemon, in milliseconds")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per row")
+    parser.add_argument("--baseline", help="--json output of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="fraction slower than the baseline that counts as a regression")
+    args = parser.parse_args(argv)
+    baseline = _load_baseline(args.baseline) if args.baseline else {}
+    found = []
+
+    # The benchmark issues far more reconciles than a client would
+    settings.RATE_LIMIT_REQUESTS = 1_000_000
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.json:
+            print(f"{'size':>6} {'scenario':<9} {'seconds':>9} {'rpc':>7} {'events':>7}")
+        for size in args.sizes:
+            for row in run_size(size, args.latency / 1000, workdir):
+                if args.json:
+                    print(json.dumps(row))
+                else:
+                    print(f"{row['size']:>6} {row['scenario']:<9} {row['seconds']:>9.3f} "
+                          f"{row['rpc_calls']:>7} {row['event_calls']:>7}")
+                sys.stdout.flush()
+                found += regressions(row, baseline.get((row["size"], row["scenario"])), args.threshold)
+
+    for regression in found:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""Request builders shared by the sync and asyncio clients."""
+from typing import Iterable, Mapping, Union
+
+from src import transctrl_pb2
+
+
+SpecLike = Union[Mapping, transctrl_pb2.InstanceSpec]
+
+
+def desired_state(items: Iterable[SpecLike]) -> transctrl_pb2.DesiredState:
+    """
+    DesiredState from spec dicts or InstanceSpecs. Dicts use InstanceSpec
+    field names (resource_limits as a dict); None values are left unset
+    and unknown keys raise ValueError.
+
+    The dicts are handed to protobuf in one go, which converts them in C:
+    several times faster than building InstanceSpecs one by one, which
+    matters at tens of thousands of instances.
+    """
+    return transctrl_pb2.DesiredState(instances=list(items))
+
+
+def change_set(upserts: Iterable[SpecLike] = (), deletes: Iterable[str] = ()) -> transctrl_pb2.ChangeSet:
+    return transctrl_pb2.ChangeSet(upserts=list(upserts), deletes=list(deletes))
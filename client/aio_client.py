@@ -0,0 +1,170 @@
+import asyncio
+import random
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+import grpc
+from google.protobuf import field_mask_pb2
+
+from src import transctrl_pb2, transctrl_pb2_grpc
+
+from ._stubs import SpecLike, change_set, desired_state
+
+DEFAULT_SOCKET = "/var/run/transctrl/transctrl.sock"
+
+# Failures worth trying again: rate limited, or the server restarting
+RETRYABLE = (grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.UNAVAILABLE)
+
+
+def retry_after(error: grpc.aio.AioRpcError) -> Optional[float]:
+    """Seconds the server asked us to wait, from its retry-after trailer."""
+    for key, value in error.trailing_metadata() or ():
+        if key == "retry-after":
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AsyncTransmissionControllerClient:
+    """
+    asyncio client for transctrl on grpc.aio.
+
+    One long-lived channel with keepalive carries every call; calls can be
+    issued concurrently, up to max_in_flight at a time. Calls failing with
+    RESOURCE_EXHAUSTED or UNAVAILABLE are retried up to max_attempts times,
+    waiting the server's retry-after when given and otherwise a jittered
+    exponential backoff. Use as an async context manager, or call close().
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, max_in_flight: int = 64,
+                 max_attempts: int = 5, base_delay: float = 0.1, max_delay: float = 10.0,
+                 keepalive_ms: int = 30000):
+        self.channel = grpc.aio.insecure_channel(f"unix:{socket_path}", options=[
+            ("grpc.keepalive_time_ms", keepalive_ms),
+            ("grpc.keepalive_timeout_ms", 10000),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+        ])
+        self.stub = transctrl_pb2_grpc.TransmissionControllerStub(self.channel)
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.channel.close()
+
+    async def reconcile(self, desired_instances: Iterable[SpecLike],
+                        timeout: float = None) -> transctrl_pb2.ReconcileResult:
+        """Converge to desired_instances: spec dicts, InstanceSpecs, or a ready DesiredState."""
+        if not isinstance(desired_instances, transctrl_pb2.DesiredState):
+            desired_instances = desired_state(desired_instances)
+        return await self._call("Reconcile", desired_instances, timeout)
+
+    async def apply_changes(self, upserts: Iterable[SpecLike] = (), deletes: Iterable[str] = (),
+                            timeout: float = None) -> transctrl_pb2.ReconcileResult:
+        """Create/update the given instances and destroy the given ids, leaving the rest alone."""
+        return await self._call("ApplyChanges", change_set(upserts, deletes), timeout)
+
+    async def resume(self, continuation_token: str, timeout: float = None) -> transctrl_pb2.ReconcileResult:
+        """Finish a reconcile or change set that ran out of time, by its result's continuation_token."""
+        request = transctrl_pb2.DesiredState(continuation_token=continuation_token)
+        return await self._call("Reconcile", request, timeout)
+
+    async def get_status(self, statuses: Iterable[int] = (), id_prefix: str = "",
+                         labels: Optional[Dict[str, str]] = None, fields: Iterable[str] = (),
+                         page_size: int = 0) -> list:
+        """Status of the matching instances; see TransmissionControllerClient.get_status."""
+        return [status async for status in self.iter_status(statuses, id_prefix, labels, fields, page_size)]
+
+    async def iter_status(self, statuses: Iterable[int] = (), id_prefix: str = "",
+                          labels: Optional[Dict[str, str]] = None, fields: Iterable[str] = (),
+                          page_size: int = 500) -> AsyncIterator[transctrl_pb2.InstanceStatus]:
+        """Like get_status, yielding instances page by page in id order."""
+        request = transctrl_pb2.StatusRequest(
+            page_size=page_size,
+            statuses=list(statuses),
+            id_prefix=id_prefix,
+            labels=labels or {},
+            field_mask=field_mask_pb2.FieldMask(paths=list(fields))
+        )
+        while True:
+            response = await self._call("GetStatus", request)
+            for status in response.instances:
+                yield status
+            if not response.next_page_token:
+                return
+            request.page_token = response.next_page_token
+
+    async def get_instance(self, instance_id: str) -> Optional[transctrl_pb2.InstanceStatus]:
+        try:
+            return await self._call("GetInstance", transctrl_pb2.InstanceId(id=instance_id))
+        except grpc.aio.AioRpcError as e:
+            if e.code() == grpc.StatusCode.NOT_FOUND:
+                return None
+            raise
+
+    async def get_instances(self, instance_ids: Iterable[str],
+                            fields: Iterable[str] = ()) -> transctrl_pb2.Instances:
+        """Status of many instances in one call; ids without a container are listed in .missing."""
+        return await self._call("GetInstances", transctrl_pb2.InstanceIds(
+            ids=list(instance_ids),
+            field_mask=field_mask_pb2.FieldMask(paths=list(fields))
+        ))
+
+    async def watch(self, reconnect: bool = True) -> AsyncIterator[transctrl_pb2.InstanceStatus]:
+        """
+        Yield every instance's status, then each change as it happens.
+
+        When the stream fails with a retryable error it is reopened after a
+        backoff; the server then starts over with a full snapshot, so
+        consumers should treat statuses as upserts keyed by id (REMOVED
+        meaning gone) rather than as a log. Instances removed while the
+        stream was down come as REMOVED at the start of the new one.
+        """
+        attempt = 0
+        known: Dict[str, None] = {}
+        while True:
+            call = self.stub.WatchStatus(transctrl_pb2.WatchRequest(known_ids=list(known)))
+            try:
+                async for status in call:
+                    attempt = 0
+                    if status.status == transctrl_pb2.REMOVED:
+                        known.pop(status.id, None)
+                    else:
+                        known[status.id] = None
+                    yield status
+                return
+            except grpc.aio.AioRpcError as e:
+                if not reconnect or e.code() not in RETRYABLE:
+                    raise
+                await asyncio.sleep(self._delay(attempt, e))
+                attempt += 1
+            finally:
+                call.cancel()
+
+    async def _call(self, method: str, request, timeout: float = None):
+        async with self._in_flight:
+            for attempt in range(self.max_attempts):
+                try:
+                    return await getattr(self.stub, method)(request, timeout=timeout)
+                except grpc.aio.AioRpcError as e:
+                    if e.code() not in RETRYABLE or attempt == self.max_attempts - 1:
+                        raise
+                    await asyncio.sleep(self._delay(attempt, e))
+
+    def _delay(self, attempt: int, error: grpc.aio.AioRpcError) -> float:
+        """Seconds to wait before retry number attempt + 1."""
+        # Full jitter, so callers rejected together don't come back together
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        wait = retry_after(error)
+        if wait is not None:
+            delay += wait
+        return delay
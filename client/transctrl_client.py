@@ -1,47 +1,81 @@
 import grpc
-from typing import List, Dict, Optional
-import sys
-import os
+from google.protobuf import field_mask_pb2
+from typing import List, Dict, Iterable, Iterator, Optional
 
-# Add parent directory to path to allow importing from generated code if needed
-sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../src")
-
-import transctrl_pb2
-import transctrl_pb2_grpc
+from src import transctrl_pb2, transctrl_pb2_grpc
 
 class TransmissionControllerClient:
     def __init__(self, socket_path: str = "/var/run/transctrl/transctrl.sock"):
         self.channel = grpc.insecure_channel(f"unix:{socket_path}")
         self.stub = transctrl_pb2_grpc.TransmissionControllerStub(self.channel)
 
-    def reconcile(self, desired_instances: List[Dict]) -> transctrl_pb2.ReconcileResult:
-        instances = []
-        for item in desired_instances:
-            limits = None
-            if "resource_limits" in item:
-                limits = transctrl_pb2.ResourceLimits(
-                    memory=item["resource_limits"].get("memory"),
-                    cpu_quota=item["resource_limits"].get("cpu_quota")
-                )
-            
-            spec = transctrl_pb2.InstanceSpec(
-                id=item["id"],
-                config_path=item["config_path"],
-                data_path=item["data_path"],
-                watch_path=item["watch_path"],
-                web_port=item["web_port"],
-                data_port=item["data_port"],
-                image_tag=item.get("image_tag"),
-                resource_limits=limits
-            )
-            instances.append(spec)
-            
+    def reconcile(self, desired_instances: List[Dict], timeout: float = None) -> transctrl_pb2.ReconcileResult:
+        instances = [self._build_spec(item) for item in desired_instances]
         request = transctrl_pb2.DesiredState(instances=instances)
-        return self.stub.Reconcile(request)
+        return self.stub.Reconcile(request, timeout=timeout)
+
+    def apply_changes(self, upserts: List[Dict] = (), deletes: List[str] = (),
+                      timeout: float = None) -> transctrl_pb2.ReconcileResult:
+        """Create/update the given instances and destroy the given ids, leaving the rest alone."""
+        request = transctrl_pb2.ChangeSet(
+            upserts=[self._build_spec(item) for item in upserts],
+            deletes=list(deletes)
+        )
+        return self.stub.ApplyChanges(request, timeout=timeout)
 
-    def get_status(self) -> List[transctrl_pb2.InstanceStatus]:
-        response = self.stub.GetStatus(transctrl_pb2.Empty())
-        return list(response.instances)
+    def resume(self, continuation_token: str, timeout: float = None) -> transctrl_pb2.ReconcileResult:
+        """Finish a reconcile or change set that ran out of time, by its result's continuation_token."""
+        request = transctrl_pb2.DesiredState(continuation_token=continuation_token)
+        return self.stub.Reconcile(request, timeout=timeout)
+
+    def _build_spec(self, item: Dict) -> transctrl_pb2.InstanceSpec:
+        limits = None
+        if "resource_limits" in item:
+            limits = transctrl_pb2.ResourceLimits(
+                memory=item["resource_limits"].get("memory"),
+                cpu_quota=item["resource_limits"].get("cpu_quota")
+            )
+        
+        return transctrl_pb2.InstanceSpec(
+            id=item["id"],
+            config_path=item["config_path"],
+            data_path=item["data_path"],
+            watch_path=item["watch_path"],
+            web_port=item["web_port"],
+            data_port=item["data_port"],
+            image_tag=item.get("image_tag"),
+            priority=item.get("priority"),
+            resource_limits=limits
+        )
+
+    def get_status(self, statuses: Iterable[int] = (), id_prefix: str = "",
+                   labels: Optional[Dict[str, str]] = None, fields: Iterable[str] = (),
+                   page_size: int = 0) -> List[transctrl_pb2.InstanceStatus]:
+        """
+        Status of the matching instances: any of statuses, ids starting with
+        id_prefix, containers carrying all labels. fields limits which
+        InstanceStatus fields are filled in (id always is). With page_size,
+        fetched a page at a time.
+        """
+        return list(self.iter_status(statuses, id_prefix, labels, fields, page_size))
+
+    def iter_status(self, statuses: Iterable[int] = (), id_prefix: str = "",
+                    labels: Optional[Dict[str, str]] = None, fields: Iterable[str] = (),
+                    page_size: int = 500) -> Iterator[transctrl_pb2.InstanceStatus]:
+        """Like get_status, yielding instances page by page in id order."""
+        request = transctrl_pb2.StatusRequest(
+            page_size=page_size,
+            statuses=list(statuses),
+            id_prefix=id_prefix,
+            labels=labels or {},
+            field_mask=field_mask_pb2.FieldMask(paths=list(fields))
+        )
+        while True:
+            response = self.stub.GetStatus(request)
+            yield from response.instances
+            if not response.next_page_token:
+                return
+            request.page_token = response.next_page_token
 
     def get_instance(self, instance_id: str) -> Optional[transctrl_pb2.InstanceStatus]:
         try:
@@ -50,3 +84,17 @@ class TransmissionControllerClient:
             if e.code() == grpc.StatusCode.NOT_FOUND:
                 return None
             raise
+
+    def get_instances(self, instance_ids: Iterable[str], fields: Iterable[str] = ()) -> transctrl_pb2.Instances:
+        """Status of many instances in one call; ids without a container are listed in .missing."""
+        return self.stub.GetInstances(transctrl_pb2.InstanceIds(
+            ids=list(instance_ids),
+            field_mask=field_mask_pb2.FieldMask(paths=list(fields))
+        ))
+
+    def watch_status(self, known_ids: Iterable[str] = ()) -> Iterator[transctrl_pb2.InstanceStatus]:
+        """
+        Yield every instance's status, then each change as it happens.
+        Instances in known_ids that no longer exist come first, as REMOVED.
+        """
+        return self.stub.WatchStatus(transctrl_pb2.WatchRequest(known_ids=list(known_ids)))
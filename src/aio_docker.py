@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+from .config import settings
+from .docker_client import CAP_ADD, CONTAINER_ENVIRONMENT, SECURITY_OPT, container_labels, container_name
+from .metrics import docker_call
+from .specs import image_ref, parse_memory
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "v1.41"
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class NotFound(DockerAPIError):
+    pass
+
+
+class ContainerRecord:
+    """A container's inspect data, shaped like docker-py's Container model."""
+
+    def __init__(self, attrs: Dict):
+        self.attrs = attrs
+
+    @property
+    def id(self) -> str:
+        return self.attrs["Id"]
+
+    @property
+    def name(self) -> str:
+        return self.attrs.get("Name", "").lstrip("/")
+
+    @property
+    def labels(self) -> Dict[str, str]:
+        return self.attrs.get("Config", {}).get("Labels") or {}
+
+    @property
+    def status(self) -> str:
+        return self.attrs.get("State", {}).get("Status", "")
+
+
+class AsyncDockerClient:
+    """
+    Minimal asyncio Docker Engine API client.
+
+    Speaks HTTP/1.1 directly over the Unix socket or TCP address in
+    DOCKER_HOST, keeping up to max_connections keep-alive connections, so
+    many container operations can overlap without a thread each. Method
+    names and return shapes mirror DockerClient.
+    """
+
+    def __init__(self, base_url: str = None, max_connections: int = None, timeout: float = None):
+        url = urlsplit(base_url or settings.DOCKER_HOST)
+        if url.scheme == "unix":
+            self._unix_path = url.path
+            self._address = None
+        elif url.scheme in ("tcp", "http"):
+            self._unix_path = None
+            self._address = (url.hostname, url.port or 2375)
+        else:
+            raise ValueError(f"Unsupported DOCKER_HOST for asyncio mode: {base_url}")
+        self.timeout = timeout or settings.AIO_DOCKER_TIMEOUT
+        self._slots = asyncio.Semaphore(max_connections or settings.AIO_DOCKER_MAX_CONNECTIONS)
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    @docker_call("list")
+    async def list_managed_containers(self, filters: Dict[str, List[str]] = None) -> List[ContainerRecord]:
+        """List containers managed by transctrl, narrowed by extra Docker list filters."""
+        filters = dict(filters or {})
+        return await self._list_containers(
+            ["transctrl.managed=true", *filters.pop("label", [])], filters
+        )
+
+    @docker_call("get_by_instance")
+    async def get_container_by_id(self, instance_id: str) -> Optional[ContainerRecord]:
+        """Get a managed container by its instance-id label."""
+        containers = await self._list_containers([
+            "transctrl.managed=true",
+            f"transctrl.instance-id={instance_id}"
+        ])
+        return containers[0] if containers else None
+
+    @docker_call("get_by_instances")
+    async def get_containers_by_ids(self, instance_ids: List[str]) -> Dict[str, ContainerRecord]:
+        """Managed containers of several instances from one listing: instance ID -> container."""
+        wanted = set(instance_ids)
+        containers = await self._list_containers(
+            ["transctrl.managed=true"],
+            select=lambda summary: (summary.get("Labels") or {}).get("transctrl.instance-id") in wanted
+        )
+        found = {}
+        for container in containers:
+            found.setdefault(container.labels.get("transctrl.instance-id"), container)
+        return found
+
+    @docker_call("inspect")
+    async def get_container(self, container_id: str) -> ContainerRecord:
+        """Get a container by its Docker ID (raises NotFound)."""
+        return ContainerRecord(await self._request("GET", f"/containers/{container_id}/json"))
+
+    @docker_call("create")
+    async def create_container(self, spec) -> ContainerRecord:
+        """Create and start a new Transmission container based on spec."""
+        name = container_name(spec.id)
+        image = image_ref(spec.image_tag)
+        memory = spec.resource_limits.memory if spec.resource_limits.memory else settings.DEFAULT_MEM_LIMIT
+        cpu_quota = spec.resource_limits.cpu_quota if spec.resource_limits.cpu_quota > 0 else settings.DEFAULT_CPU_QUOTA
+        # Same container as DockerClient.create_container, in Engine API form
+        config = {
+            "Image": image,
+            "Labels": container_labels(spec),
+            "Env": [f"{k}={v}" for k, v in CONTAINER_ENVIRONMENT.items()],
+            "ExposedPorts": {"9091/tcp": {}, "51413/tcp": {}},
+            "HostConfig": {
+                "Binds": [
+                    f"{spec.config_path}:/config:rw",
+                    f"{spec.data_path}:/downloads:rw",
+                    f"{spec.watch_path}:/watch:rw",
+                ],
+                "PortBindings": {
+                    "9091/tcp": [{"HostIp": "", "HostPort": str(spec.web_port)}],
+                    "51413/tcp": [{"HostIp": "", "HostPort": str(spec.data_port)}],
+                },
+                "RestartPolicy": {"Name": "unless-stopped"},
+                "Memory": parse_memory(memory),
+                "CpuQuota": cpu_quota,
+                "CapDrop": ["ALL"],
+                "CapAdd": CAP_ADD,
+                "SecurityOpt": SECURITY_OPT,
+                "NetworkMode": "bridge",
+            },
+        }
+
+        try:
+            try:
+                created = await self._request("POST", "/containers/create", {"name": name}, config)
+            except NotFound:
+                # Image isn't local yet; pull it and retry, as docker-py's run() does
+                await self.pull_image(image)
+                created = await self._request("POST", "/containers/create", {"name": name}, config)
+            await self._request("POST", f"/containers/{created['Id']}/start")
+            return await self.get_container(created["Id"])
+        except Exception as e:
+            logger.error(f"Failed to create container {name}: {e}")
+            raise
+
+    @docker_call("update")
+    async def update_container(self, container: ContainerRecord, memory: int, cpu_quota: int) -> ContainerRecord:
+        """Change a running container's memory (bytes) and CPU limits in place."""
+        try:
+            await self._request("POST", f"/containers/{container.id}/update", body={
+                "Memory": memory,
+                "MemorySwap": 2 * memory,
+                "CpuQuota": cpu_quota,
+            })
+            return await self.get_container(container.id)
+        except Exception as e:
+            logger.error(f"Failed to update container {container.name}: {e}")
+            raise
+
+    @docker_call("remove")
+    async def remove_container(self, container: ContainerRecord):
+        """Remove a managed container."""
+        if container.labels.get("transctrl.managed") != "true":
+            raise ValueError(f"Container {container.id} is not managed by transctrl")
+
+        try:
+            await self._request("POST", f"/containers/{container.id}/stop", {"t": 10},
+                                timeout=self.timeout + 10)
+            await self._request("DELETE", f"/containers/{container.id}", {"force": 1})
+        except Exception as e:
+            logger.error(f"Failed to remove container {container.name}: {e}")
+            raise
+
+    @docker_call("image_inspect")
+    async def get_image_id(self, ref: str) -> Optional[str]:
+        """Resolve an image reference to its local image ID, or None if not present."""
+        try:
+            return (await self._request("GET", f"/images/{ref}/json"))["Id"]
+        except NotFound:
+            return None
+
+    @docker_call("pull")
+    async def pull_image(self, ref: str):
+        """Pull an image, waiting for the pull to finish."""
+        repository, _, tag = ref.rpartition(":")
+        progress = await self._request("POST", "/images/create",
+                                       {"fromImage": repository, "tag": tag},
+                                       timeout=None)
+        # Pull errors arrive in the JSON progress stream of a 200 response
+        lines = progress.splitlines() if isinstance(progress, str) else [json.dumps(progress)]
+        for line in lines:
+            if '"error"' in line:
+                raise DockerAPIError(500, json.loads(line).get("error", line))
+
+    async def _list_containers(self, labels: List[str], filters: Dict[str, List[str]] = None,
+                               select: Callable[[Dict], bool] = None) -> List[ContainerRecord]:
+        filters = json.dumps({**(filters or {}), "label": labels})
+        summaries = await self._request("GET", "/containers/json", {"all": 1, "filters": filters})
+        if select is not None:
+            summaries = [s for s in summaries if select(s)]
+        # The list endpoint only returns summaries; inspect them concurrently
+        results = await asyncio.gather(
+            *(self.get_container(s["Id"]) for s in summaries), return_exceptions=True
+        )
+        containers = []
+        for result in results:
+            if isinstance(result, NotFound):
+                continue  # removed while we were listing
+            if isinstance(result, BaseException):
+                raise result
+            containers.append(result)
+        return containers
+
+    async def _request(self, method: str, path: str, params: Dict = None, body=None,
+                       timeout: Optional[float] = ...):
+        """Send one API request and return its decoded body, raising DockerAPIError on failure."""
+        if timeout is ...:
+            timeout = self.timeout
+        target = f"/{API_VERSION}{quote(path)}"
+        if params:
+            target += "?" + urlencode(params)
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (
+            f"{method} {target} HTTP/1.1\r\n"
+            f"Host: docker\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"\r\n"
+        ).encode()
+
+        async with self._slots:
+            status, headers, data = await asyncio.wait_for(
+                self._exchange(head + payload), timeout
+            )
+
+        if headers.get("content-type", "").startswith("application/json") and data:
+            try:
+                decoded = json.loads(data)
+            except ValueError:
+                decoded = data.decode(errors="replace")  # a JSON-lines stream
+        else:
+            decoded = data.decode(errors="replace")
+
+        if status >= 400:
+            message = decoded.get("message", "") if isinstance(decoded, dict) else decoded
+            raise (NotFound if status == 404 else DockerAPIError)(status, message)
+        return decoded
+
+    async def _exchange(self, request: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        reused = bool(self._idle)
+        reader, writer = self._idle.pop() if reused else await self._connect()
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, headers, data = await self._read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if not reused:
+                raise
+            # The daemon closed an idle keep-alive connection; retry on a fresh one
+            reader, writer = await self._connect()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, data = await self._read_response(reader)
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            writer.close()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+        return status, headers, data
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self._unix_path:
+            return await asyncio.open_unix_connection(self._unix_path, limit=2**20)
+        return await asyncio.open_connection(*self._address, limit=2**20)
+
+    async def _read_response(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Docker closed the connection")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if status in (204, 304):
+            return status, headers, b""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status, headers, b"".join(chunks)
+        if "content-length" in headers:
+            return status, headers, await reader.readexactly(int(headers["content-length"]))
+        # No framing: body runs until the daemon closes the connection
+        headers["connection"] = "close"
+        return status, headers, await reader.read()
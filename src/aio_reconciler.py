@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from .aio_docker import AsyncDockerClient
+from .audit import new_correlation_id
+from .docker_client import DockerClient
+from .metrics import RECONCILE_PHASE_DURATION
+from .reconciler import Deferred, Reconciler, ReconcilePlan
+from .specs import normalize_spec
+from .status import StatusQuery
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncReconciler(Reconciler):
+    """
+    Reconciler whose Docker actions run on the event loop.
+
+    Planning and bookkeeping are inherited, with the diff run in a worker
+    thread; reading the current state and running each action go through
+    AsyncDockerClient, at most `concurrency` at a time.
+    """
+
+    def __init__(self, docker_client: DockerClient, aio_docker: AsyncDockerClient, **kwargs):
+        super().__init__(docker_client, **kwargs)
+        self.aio_docker = aio_docker
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._pulls: Dict[str, asyncio.Task] = {}
+
+    async def reconcile(self, desired_instances: List, plan: ReconcilePlan = None,
+                        correlation_id: str = None, deadline: float = None) -> Dict:
+        results = self._new_results()
+        try:
+            if plan is None:
+                plan = await self.plan(desired_instances)
+            await self._execute_async(plan, results, correlation_id or new_correlation_id(), deadline)
+            return results
+        except Exception as e:
+            logger.error(f"Reconciliation loop failed: {e}")
+            results["errors"].append(f"Global reconciliation error: {e}")
+            return results
+
+    async def apply_changes(self, upserts: List, deletes: List[str], plan: ReconcilePlan = None,
+                            correlation_id: str = None, deadline: float = None) -> Dict:
+        results = self._new_results()
+        try:
+            if plan is None:
+                plan = await self.plan_changes(upserts, deletes)
+            await self._execute_async(plan, results, correlation_id or new_correlation_id(), deadline)
+            return results
+        except Exception as e:
+            logger.error(f"Applying changes failed: {e}")
+            results["errors"].append(f"Global reconciliation error: {e}")
+            return results
+
+    async def plan(self, desired_instances: List) -> ReconcilePlan:
+        with RECONCILE_PHASE_DURATION.time(phase="list"):
+            existing_containers = await self.list_managed_containers()
+        # Validation stats mount paths and image IDs may be resolved through
+        # docker-py: both block, so the diff stays off the event loop
+        return await asyncio.to_thread(self.diff, existing_containers, desired_instances)
+
+    async def plan_changes(self, upserts: List, deletes: List[str]) -> ReconcilePlan:
+        touched = list(self._touched_ids(upserts, deletes))
+        with RECONCILE_PHASE_DURATION.time(phase="list"):
+            existing_map = await self.get_containers_by_ids(touched) if touched else {}
+        with RECONCILE_PHASE_DURATION.time(phase="diff"):
+            return await asyncio.to_thread(self.diff_changes, existing_map, upserts, deletes)
+
+    async def list_managed_containers(self, query: StatusQuery = None) -> List:
+        """Managed containers, those matching query if given, from the cache when it is fresh."""
+        if self.cache is not None and self.cache.is_fresh():
+            return self.cache.list_managed_containers(query)
+        if query is None or not query.filtered:
+            return await self.aio_docker.list_managed_containers()
+        containers = await self.aio_docker.list_managed_containers(query.docker_filters())
+        return [c for c in containers if query.matches(c)]
+
+    async def get_container_by_id(self, instance_id: str):
+        """A managed container by instance ID, from the cache when it is fresh."""
+        if self.cache is not None and self.cache.is_fresh():
+            return self.cache.get_container_by_id(instance_id)
+        return await self.aio_docker.get_container_by_id(instance_id)
+
+    async def get_containers_by_ids(self, instance_ids: List[str]) -> Dict:
+        """Managed containers of several instances, from the cache when it is fresh."""
+        if self.cache is not None and self.cache.is_fresh():
+            return self.cache.get_containers_by_ids(instance_ids)
+        return await self.aio_docker.get_containers_by_ids(instance_ids)
+
+    async def _execute_async(self, plan: ReconcilePlan, results: Dict, correlation_id: str,
+                             deadline: float = None):
+        phases = self._phases(plan, results, correlation_id)
+        try:
+            action, items = next(phases)
+            while True:
+                with RECONCILE_PHASE_DURATION.time(phase=action):
+                    outcomes = await self._run_concurrent(getattr(self, f"_{action}_async"), items,
+                                                          self._deadline_for(action, deadline))
+                action, items = phases.send(outcomes)
+        except StopIteration:
+            pass
+
+    async def _run_concurrent(self, action, items: List, deadline: float = None) -> List:
+        """Async counterpart of _run_parallel: (item, exception or None) pairs in order."""
+        async def run(item):
+            async with self._slots:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise Deferred()
+                await action(item)
+
+        errors = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+        return [(item, error) for item, error in zip(items, errors)]
+
+    async def _pull_async(self, ref: str):
+        # One pull per reference, shared by every reconcile that needs it
+        task = self._pulls.get(ref)
+        if task is None:
+            task = self._pulls[ref] = asyncio.ensure_future(self._pull_missing(ref))
+            task.add_done_callback(lambda _: self._pulls.pop(ref, None))
+        await asyncio.shield(task)
+
+    async def _pull_missing(self, ref: str):
+        if await self.aio_docker.get_image_id(ref) is None:
+            logger.info(f"Pulling image {ref}")
+            await self.aio_docker.pull_image(ref)
+        self.image_ids.invalidate(ref)
+
+    async def _update_async(self, item):
+        container, spec = item
+        logger.info(f"Updating resource limits for instance {spec.id}")
+        limits = normalize_spec(spec)
+        container = await self.aio_docker.update_container(container, limits["memory"], limits["cpu_quota"])
+        if self.cache is not None:
+            self.cache.put(container)
+
+    async def _destroy_async(self, container):
+        instance_id = container.labels.get("transctrl.instance-id")
+        logger.info(f"Destroying container for instance {instance_id}")
+        await self.aio_docker.remove_container(container)
+        if self.cache is not None:
+            self.cache.discard(container)
+
+    async def _create_async(self, spec):
+        logger.info(f"Creating container for instance {spec.id}")
+        container = await self.aio_docker.create_container(spec)
+        if self.cache is not None:
+            self.cache.put(container)
+        return container
@@ -0,0 +1,212 @@
+import asyncio
+import grpc
+import logging
+import signal
+
+from . import transctrl_pb2_grpc
+from .aio_docker import AsyncDockerClient
+from .aio_reconciler import AsyncReconciler
+from .audit import log_event, new_correlation_id
+from .coalescer import AsyncReconcileCoalescer
+from .config import settings
+from .container_cache import ContainerCache
+from .docker_client import DockerClient
+from .health import HealthProber
+from .metrics import MANAGED_CONTAINERS, AsyncRpcMetricsInterceptor, start_metrics_server
+from .rate_limiter import RateLimiter
+from .server import TransmissionControllerServicer, prepare_socket
+from .sharding import docker_hosts
+from .status import mask_fields
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTransmissionControllerServicer(TransmissionControllerServicer):
+    """
+    grpc.aio servicer: every RPC is a coroutine and Docker calls go through
+    AsyncDockerClient, so slow reconciles don't hold up status reads.
+
+    Status conversion is shared with the threaded servicer; the blocking
+    DockerClient is only used to follow the events stream for the cache.
+    """
+
+    def __init__(self):
+        # Not calling super().__init__(): that builds the threaded reconciler
+        hosts = docker_hosts()
+        if len(hosts) > 1:
+            raise ValueError("Several DOCKER_HOSTS need SERVER_MODE=threaded")
+        recovery = self._open_journal()
+        self.docker_client = DockerClient(hosts[0])
+        self.aio_docker = AsyncDockerClient(hosts[0])
+        self.container_cache = ContainerCache(self.docker_client, host=hosts[0])
+        self.container_cache.start()
+        self.reconciler = AsyncReconciler(
+            self.docker_client, self.aio_docker, cache=self.container_cache, journal=self.journal
+        )
+        self.coalescer = AsyncReconcileCoalescer(self.reconciler, journal=self.journal)
+        self.rate_limiter = RateLimiter()
+        self.rate_limit_key = self._checked_rate_limit_key()
+        self._watchers = asyncio.BoundedSemaphore(settings.MAX_WATCHERS)
+        if settings.PREPULL_IMAGE_TAGS:
+            self.reconciler.image_puller.start_warming(settings.PREPULL_IMAGE_TAGS)
+        MANAGED_CONTAINERS.set_function(self._count_by_status)
+        self._start_usage_sampler()
+        self.health = HealthProber(self.container_cache) if settings.HEALTH_PROBE_INTERVAL > 0 else None
+        # Probes share the server's event loop; kept referenced like _resuming
+        self._probing = asyncio.ensure_future(self.health.run()) if self.health is not None else None
+        resume = self._resume_call(recovery)
+        # Kept referenced so the pass isn't garbage collected mid-way
+        self._resuming = asyncio.ensure_future(self._resume(resume, recovery)) if resume else None
+
+    async def _resume(self, resume, recovery):
+        await resume()
+        await asyncio.to_thread(self.journal.end, *recovery.passes)
+
+    async def Reconcile(self, request, context):
+        deadline = self._deadline(context)
+        if request.continuation_token:
+            return await self._reconcile_reply(await self._continue_pass(request, context, deadline))
+        retry_after = self._rate_limit(context)
+        if retry_after:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        planned_at = self.coalescer.generation
+        try:
+            plan = await self.reconciler.plan(request.instances)
+        except Exception:
+            plan = None  # reconcile() plans again and reports the failure
+        self._charge_actions(context, plan)
+
+        correlation_id = new_correlation_id()
+        log_event("reconcile", details={"instance_count": len(request.instances)},
+                  correlation_id=correlation_id)
+
+        reconcile_results = await self.coalescer.reconcile(
+            request.instances, plan=plan, planned_at=planned_at, correlation_id=correlation_id,
+            deadline=deadline
+        )
+        return await self._reconcile_reply(reconcile_results)
+
+    async def _continue_pass(self, request, context, deadline) -> dict:
+        if request.instances:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                "Send either instances or a continuation_token, not both")
+        retry_after = self._rate_limit(context)
+        if retry_after:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                f"Rate limit exceeded, retry after {retry_after:.1f}s")
+
+        correlation_id = new_correlation_id()
+        log_event("reconcile", details={"continuation_token": request.continuation_token},
+                  correlation_id=correlation_id)
+        try:
+            return await self.coalescer.resume(request.continuation_token, correlation_id, deadline)
+        except KeyError:
+            await context.abort(grpc.StatusCode.NOT_FOUND,
+                                f"No unfinished pass {request.continuation_token}")
+
+    async def ApplyChanges(self, request, context):
+        deadline = self._deadline(context)
+        retry_after = self._rate_limit(context)
+        if retry_after:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        planned_at = self.coalescer.generation
+        try:
+            plan = await self.reconciler.plan_changes(request.upserts, request.deletes)
+        except Exception:
+            plan = None
+        self._charge_actions(context, plan)
+
+        correlation_id = new_correlation_id()
+        log_event("apply_changes", details={
+            "upsert_count": len(request.upserts),
+            "delete_count": len(request.deletes),
+        }, correlation_id=correlation_id)
+
+        reconcile_results = await self.coalescer.apply_changes(
+            request.upserts, request.deletes, plan=plan, planned_at=planned_at,
+            correlation_id=correlation_id, deadline=deadline
+        )
+        return await self._reconcile_reply(reconcile_results)
+
+    async def _reconcile_reply(self, reconcile_results: dict):
+        ids = [spec.id for spec in reconcile_results["instances"]]
+        containers = await self.reconciler.get_containers_by_ids(ids) if ids else {}
+        return self._to_reconcile_result(reconcile_results, containers)
+
+    async def GetStatus(self, request, context):
+        try:
+            query, after = self._status_query(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        containers = await self.reconciler.list_managed_containers(query)
+        return self._current_state(containers, request, query, after)
+
+    async def GetInstance(self, request, context):
+        container = await self.reconciler.get_container_by_id(request.id)
+        if not container:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"Instance {request.id} not found")
+        return self._container_to_status(container)
+
+    async def GetInstances(self, request, context):
+        try:
+            fields = mask_fields(request.field_mask)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        ids = list(dict.fromkeys(request.ids))
+        return self._instances(ids, await self.reconciler.get_containers_by_ids(ids), fields)
+
+    async def WatchStatus(self, request, context):
+        if self._watchers.locked():
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many watchers")
+
+        async with self._watchers:
+            subscription = self.container_cache.subscribe()
+            try:
+                sent = dict.fromkeys(request.known_ids, "")
+                updates = None
+                while not context.done():
+                    if updates is None:
+                        statuses = self._snapshot(await self.reconciler.list_managed_containers(), sent)
+                    else:
+                        statuses = [self._update_to_status(*update) for update in updates]
+                    for status in statuses:
+                        self._track(sent, status)
+                        yield status
+                    # drain() blocks on a condition variable; wait in a worker thread
+                    updates = await asyncio.to_thread(subscription.drain, 1.0)
+            finally:
+                self.container_cache.unsubscribe(subscription)
+
+
+async def serve_aio():
+    socket_path = settings.SOCKET_PATH
+    prepare_socket(socket_path)
+
+    if settings.METRICS_ADDRESS:
+        start_metrics_server(settings.METRICS_ADDRESS)
+
+    server = grpc.aio.server(interceptors=[AsyncRpcMetricsInterceptor()])
+    servicer = AsyncTransmissionControllerServicer()
+    transctrl_pb2_grpc.add_TransmissionControllerServicer_to_server(servicer, server)
+
+    # Listen on Unix socket
+    server.add_insecure_port(f"unix:{socket_path}")
+
+    logger.info(f"Server (asyncio) starting on {socket_path}")
+    await server.start()
+
+    # Handle graceful shutdown
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(
+        signal.SIGTERM,
+        lambda: asyncio.ensure_future(server.stop(grace=5))
+    )
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        servicer.container_cache.stop()
+        await servicer.aio_docker.close()
+        logger.info("Server stopped")
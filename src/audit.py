@@ -0,0 +1,178 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .config import settings
+from .metrics import AUDIT_RECORDS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+AUDIT_POLICIES = ("drop", "block")
+BATCH_SIZE = 500
+
+_STOP = object()
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+class _StdoutSink:
+    def write(self, data: str):
+        # Looked up per write so redirections of sys.stdout are honoured
+        sys.stdout.write(data)
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+class _RotatingFileSink:
+    """Appends to path, rolling it over to path.1 .. path.<backups> past max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stream = open(path, "a", encoding="utf-8")
+        self._size = self._stream.tell()
+
+    def write(self, data: str):
+        if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._stream.write(data)
+        self._stream.flush()
+        self._size += len(data)
+
+    def _rotate(self):
+        self._stream.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._stream = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+
+    def close(self):
+        self._stream.close()
+
+
+class AuditLogger:
+    """
+    Audit records as JSON lines, written off the request path.
+
+    log() only timestamps the record and puts it on a bounded queue; a
+    writer thread serializes queued records and writes them in batches to
+    stdout, or to path with size-based rotation. When the queue is full,
+    policy "drop" discards the record (counted in dropped and the
+    transctrl_audit_records_dropped_total metric) and "block" waits for
+    room.
+    """
+
+    def __init__(self, path: str = None, max_queue: int = None, policy: str = None,
+                 max_bytes: int = None, backups: int = None):
+        self.path = settings.AUDIT_LOG_PATH if path is None else path
+        self.policy = policy or settings.AUDIT_QUEUE_POLICY
+        if self.policy not in AUDIT_POLICIES:
+            raise ValueError(f"Unknown AUDIT_QUEUE_POLICY: {self.policy}")
+        self.max_bytes = settings.AUDIT_LOG_MAX_BYTES if max_bytes is None else max_bytes
+        self.backups = settings.AUDIT_LOG_BACKUPS if backups is None else backups
+        self._queue: queue.Queue = queue.Queue(max_queue or settings.AUDIT_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+
+    def log(self, event: str, instance_id: str = None, details: dict = None,
+            correlation_id: str = None):
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "event": event,
+        }
+        if correlation_id:
+            record["correlation_id"] = correlation_id
+        if instance_id:
+            record["instance_id"] = instance_id
+        if details:
+            record["details"] = details
+        if self.policy == "block":
+            self._queue.put(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            AUDIT_RECORDS_DROPPED.inc()
+
+    def start(self):
+        """Start the writer thread."""
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Write out everything queued so far and stop the writer."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        sink = _RotatingFileSink(self.path, self.max_bytes, self.backups) if self.path else _StdoutSink()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = any(record is _STOP for record in batch)
+                records = [record for record in batch if record is not _STOP]
+                if records:
+                    self._write(sink, records)
+                if stopping:
+                    return
+        finally:
+            sink.close()
+
+    def _write(self, sink, records: List[Dict]):
+        try:
+            sink.write("".join(json.dumps(record) + "\n" for record in records))
+        except Exception as e:
+            logger.error(f"Failed to write {len(records)} audit records: {e}")
+            return
+        with self._lock:
+            self.written += len(records)
+
+
+_default: Optional[AuditLogger] = None
+_default_lock = threading.Lock()
+
+
+def audit_logger() -> AuditLogger:
+    """The process-wide AuditLogger, configured from settings and started on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AuditLogger()
+            _default.start()
+            atexit.register(_default.close)
+        return _default
+
+
+def log_event(event: str, instance_id: str = None, details: dict = None,
+              correlation_id: str = None):
+    """Queue an audit record on the process-wide AuditLogger."""
+    audit_logger().log(event, instance_id, details, correlation_id)
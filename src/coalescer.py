@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .audit import log_event, new_correlation_id
+from .config import settings
+from .reconciler import ReconcilePlan
+
+logger = logging.getLogger(__name__)
+
+# Unfinished passes kept for resuming, and finished ones answering late resumes
+MAX_CONTINUATIONS = 64
+
+
+class _Batch:
+    """
+    Requests waiting for the same reconcile pass, merged into one.
+
+    Once a full desired state has been submitted the batch is a full
+    reconcile, with any later change sets applied on top of it; until then
+    it is one merged change set. Later requests win over earlier ones.
+    The pass stops starting actions at the latest of its callers' deadlines,
+    or never if any caller has none.
+    """
+
+    def __init__(self):
+        self.state: Optional[Dict[str, object]] = None  # instance ID -> spec
+        self.upserts: Dict[str, object] = {}
+        self.deletes: Dict[str, None] = {}  # ordered set of instance IDs
+        self.errors: List[str] = []
+        self.size = 0
+        self.plan: Optional[ReconcilePlan] = None
+        self.planned_at: Optional[int] = None
+        # The first request's; the pass's actions are audited under it
+        self.correlation_id: Optional[str] = None
+        self.deadline: Optional[float] = None
+        self.continues: List[str] = []  # unfinished passes this one finishes
+        self.done = False
+        self.result: Optional[Dict] = None
+        self.error: Optional[BaseException] = None
+
+    def add_state(self, desired_instances: List, plan: ReconcilePlan, planned_at: int,
+                  correlation_id: str = None, deadline: float = None):
+        self._merging()
+        self.state = {spec.id: spec for spec in desired_instances}
+        self.upserts.clear()
+        self.deletes.clear()
+        self._joined(plan, planned_at, correlation_id, deadline)
+
+    def add_changes(self, upserts: List, deletes: List[str], plan: ReconcilePlan, planned_at: int,
+                    correlation_id: str = None, deadline: float = None):
+        if self.size == 0:
+            # Alone so far: keep the request as sent, diff_changes reports conflicts
+            self.upserts = {spec.id: spec for spec in upserts}
+            self.deletes = dict.fromkeys(deletes)
+            self._joined(plan, planned_at, correlation_id, deadline)
+            return
+        self._merging()
+        conflicting = {spec.id for spec in upserts}.intersection(deletes)
+        for instance_id in sorted(conflicting):
+            self.errors.append(f"Instance {instance_id} is both upserted and deleted; skipping")
+        self._merge(upserts, deletes, conflicting)
+        self._joined(plan, planned_at, correlation_id, deadline)
+
+    def add_unfinished(self, earlier: "_Batch", correlation_id: str = None, deadline: float = None):
+        """
+        Take up what an earlier pass left undone. Its desired state is
+        older than any request already here, which override it.
+        """
+        if self.state is None:
+            self._merging()
+            upserts, deletes = list(self.upserts.values()), list(self.deletes)
+            if earlier.state is not None:
+                self.state = dict(earlier.state)
+                self.upserts, self.deletes = {}, {}
+            else:
+                self.upserts, self.deletes = dict(earlier.upserts), dict(earlier.deletes)
+            self._merge(upserts, deletes)
+        # else a full state supersedes the earlier pass altogether
+        self.continues.append(earlier.correlation_id)
+        self._joined(None, None, correlation_id or earlier.correlation_id, deadline)
+
+    def overlay(self, later: "_Batch"):
+        """Bring this unfinished pass's desired state up to date with a later change set."""
+        self._merge(list(later.upserts.values()), list(later.deletes),
+                    set(later.upserts).intersection(later.deletes))
+
+    def _merge(self, upserts: List, deletes: List[str], conflicting=()):
+        for instance_id in deletes:
+            if instance_id in conflicting:
+                continue
+            if self.state is not None:
+                self.state.pop(instance_id, None)
+            else:
+                self.upserts.pop(instance_id, None)
+                self.deletes[instance_id] = None
+        for spec in upserts:
+            if spec.id in conflicting:
+                continue
+            if self.state is not None:
+                self.state[spec.id] = spec
+            else:
+                self.deletes.pop(spec.id, None)
+                self.upserts[spec.id] = spec
+
+    def _merging(self):
+        if self.state is None and self.size == 1:
+            # The first change set's conflicts must be reported before merging
+            self._drop_conflicts()
+
+    def _drop_conflicts(self):
+        conflicting = set(self.upserts).intersection(self.deletes)
+        for instance_id in sorted(conflicting):
+            self.errors.append(f"Instance {instance_id} is both upserted and deleted; skipping")
+            del self.upserts[instance_id]
+            del self.deletes[instance_id]
+
+    def _joined(self, plan: ReconcilePlan, planned_at: int, correlation_id: Optional[str],
+                deadline: Optional[float]):
+        self.size += 1
+        # A caller's own plan only describes the batch while it is alone in it
+        self.plan, self.planned_at = (plan, planned_at) if self.size == 1 else (None, None)
+        if self.size == 1:
+            self.deadline = deadline
+        elif deadline is None or self.deadline is None:
+            self.deadline = None
+        else:
+            self.deadline = max(self.deadline, deadline)
+        if self.correlation_id is None:
+            self.correlation_id = correlation_id or new_correlation_id()
+        elif correlation_id:
+            log_event("coalesced", details={"pass": self.correlation_id}, correlation_id=correlation_id)
+
+    def begin(self, journal):
+        """Journal the pass as started, with the desired state it works towards."""
+        if self.state is not None:
+            journal.begin_reconcile(self.correlation_id, list(self.state.values()))
+        else:
+            journal.begin_apply(self.correlation_id, list(self.upserts.values()), list(self.deletes))
+
+    def run(self, reconciler, generation: int):
+        """Start the pass on reconciler; returns its results, or a coroutine for them."""
+        # The plan is stale if any pass finished after it was made
+        plan = self.plan if self.planned_at == generation else None
+        if self.state is not None:
+            return reconciler.reconcile(list(self.state.values()), plan=plan,
+                                        correlation_id=self.correlation_id, deadline=self.deadline)
+        return reconciler.apply_changes(list(self.upserts.values()), list(self.deletes), plan=plan,
+                                        correlation_id=self.correlation_id, deadline=self.deadline)
+
+    def finish(self, result: Optional[Dict], error: Optional[BaseException]):
+        if result is not None and self.errors:
+            result["errors"][:0] = self.errors
+        self.result, self.error, self.done = result, error, True
+
+    def outcome(self) -> Dict:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class ReconcileCoalescer:
+    """
+    Runs at most one reconcile pass at a time.
+
+    Reconcile and ApplyChanges requests arriving while a pass runs are
+    merged into a single follow-up pass built from the latest desired
+    state, and each caller gets the results of the pass that covered its
+    request. Same signatures as Reconciler.reconcile / apply_changes, plus
+    planned_at: the `generation` read before the caller made plan, so a
+    plan overtaken by another pass is made again. A request merged into a
+    pass started by another is audited as "coalesced", pointing at the
+    pass's correlation ID. With a Journal, every pass is journaled from
+    start to finish so a restart can pick it up again.
+
+    A pass that reaches its deadline with actions left over returns a
+    continuation_token, and resume() with it finishes them; with
+    `background`, that starts as soon as the pass has returned. Meanwhile
+    the unfinished pass's desired state follows later change sets, and a
+    later full desired state supersedes it.
+    """
+
+    def __init__(self, reconciler, journal=None, background: bool = None):
+        self.reconciler = reconciler
+        self.journal = journal
+        self.background = settings.RECONCILE_FINISH_IN_BACKGROUND if background is None else background
+        self.generation = 0  # passes completed
+        self._cond = threading.Condition()
+        self._busy = False
+        self._next: Optional[_Batch] = None
+        self._unfinished: "OrderedDict[str, _Batch]" = OrderedDict()  # token -> pass
+        self._taken_up: "OrderedDict[str, _Batch]" = OrderedDict()  # token -> pass finishing it
+
+    def reconcile(self, desired_instances: List, plan: ReconcilePlan = None,
+                  planned_at: int = None, correlation_id: str = None, deadline: float = None) -> Dict:
+        return self._submit(
+            lambda batch: batch.add_state(desired_instances, plan, planned_at, correlation_id, deadline)
+        )
+
+    def apply_changes(self, upserts: List, deletes: List[str], plan: ReconcilePlan = None,
+                      planned_at: int = None, correlation_id: str = None,
+                      deadline: float = None) -> Dict:
+        return self._submit(
+            lambda batch: batch.add_changes(upserts, deletes, plan, planned_at, correlation_id,
+                                            deadline)
+        )
+
+    def resume(self, token: str, correlation_id: str = None, deadline: float = None) -> Dict:
+        """
+        Finish what the pass that returned token left undone, and return the
+        results of the pass that did. Raises KeyError for an unknown token.
+        """
+        return self._submit(self._resuming(token, correlation_id, deadline))
+
+    def _resuming(self, token: str, correlation_id: Optional[str], deadline: Optional[float]):
+        def join(batch: _Batch) -> Optional[_Batch]:
+            earlier = self._unfinished.pop(token, None)
+            if earlier is None:
+                # Already taken up, e.g. in the background: wait for that pass
+                return self._taken_up[token]
+            batch.add_unfinished(earlier, correlation_id, deadline)
+            self._remember(token, batch)
+        return join
+
+    def _submit(self, join) -> Dict:
+        with self._cond:
+            batch = self._join(join)
+            while self._busy and not batch.done:
+                self._cond.wait()
+            if batch.done:
+                return batch.outcome()
+            # First of the batch to get the slot runs the pass for everyone
+            self._lead(batch)
+
+        result, error = None, None
+        try:
+            if self.journal is not None:
+                batch.begin(self.journal)
+            result = batch.run(self.reconciler, self.generation)
+            with self._cond:
+                finished = self._settle(batch, result)
+            if self.journal is not None:
+                self.journal.end(*finished)
+        except BaseException as e:
+            error = e
+        with self._cond:
+            self._finish(batch, result, error)
+            self._cond.notify_all()
+        self._follow_up(result)
+        return batch.outcome()
+
+    def _join(self, join) -> _Batch:
+        if self._next is None:
+            self._next = _Batch()
+        # join may hand back another batch that already covers the request
+        return join(self._next) or self._next
+
+    def _lead(self, batch: _Batch):
+        self._busy = True
+        self._next = None
+        if batch.size > 1:
+            logger.info(f"Running one reconcile pass for {batch.size} coalesced requests")
+
+    def _settle(self, batch: _Batch, result: Dict) -> List[str]:
+        """
+        Keep batch for resuming if its pass left actions undone, and bring
+        the other unfinished passes up to date with it. Returns the IDs of
+        the passes now finished, for the journal.
+        """
+        finished = [id for id in batch.continues if id != batch.correlation_id]
+        if batch.state is not None:
+            for token in self._unfinished:
+                self._remember(token, batch)
+            finished.extend(self._unfinished)
+            self._unfinished.clear()
+        else:
+            for earlier in self._unfinished.values():
+                earlier.overlay(batch)
+        if not result.get("deferred_count"):
+            return finished + [batch.correlation_id]
+        result["continuation_token"] = batch.correlation_id
+        self._unfinished[batch.correlation_id] = batch
+        if len(self._unfinished) > MAX_CONTINUATIONS:
+            token, _ = self._unfinished.popitem(last=False)
+            logger.warning(f"Too many unfinished passes; dropping {token}")
+            finished.append(token)
+        return finished
+
+    def _remember(self, token: str, batch: _Batch):
+        self._taken_up[token] = batch
+        while len(self._taken_up) > MAX_CONTINUATIONS:
+            self._taken_up.popitem(last=False)
+
+    def _finish(self, batch: _Batch, result: Optional[Dict], error: Optional[BaseException]):
+        self.generation += 1
+        self._busy = False
+        batch.finish(result, error)
+
+    def _follow_up(self, result: Optional[Dict]):
+        token = result.get("continuation_token") if result is not None else None
+        if token and self.background:
+            threading.Thread(target=self._finish_unfinished, args=(token,),
+                             name="reconcile-continuation", daemon=True).start()
+
+    def _finish_unfinished(self, token: str):
+        try:
+            self.resume(token)
+        except KeyError:
+            pass  # its caller resumed it first
+        except Exception as e:
+            logger.error(f"Finishing pass {token} failed: {e}")
+
+
+class AsyncReconcileCoalescer(ReconcileCoalescer):
+    """ReconcileCoalescer for AsyncReconciler, waiting on the event loop."""
+
+    def __init__(self, reconciler, journal=None, background: bool = None):
+        super().__init__(reconciler, journal, background)
+        self._cond = asyncio.Condition()
+        self._pass: Optional[asyncio.Task] = None
+        self._finishing = set()  # background resumes, referenced until done
+
+    async def reconcile(self, desired_instances: List, plan: ReconcilePlan = None,
+                        planned_at: int = None, correlation_id: str = None,
+                        deadline: float = None) -> Dict:
+        return await self._submit(
+            lambda batch: batch.add_state(desired_instances, plan, planned_at, correlation_id, deadline)
+        )
+
+    async def apply_changes(self, upserts: List, deletes: List[str], plan: ReconcilePlan = None,
+                            planned_at: int = None, correlation_id: str = None,
+                            deadline: float = None) -> Dict:
+        return await self._submit(
+            lambda batch: batch.add_changes(upserts, deletes, plan, planned_at, correlation_id,
+                                            deadline)
+        )
+
+    async def resume(self, token: str, correlation_id: str = None, deadline: float = None) -> Dict:
+        return await self._submit(self._resuming(token, correlation_id, deadline))
+
+    async def _submit(self, join) -> Dict:
+        async with self._cond:
+            batch = self._join(join)
+            while not batch.done:
+                if not self._busy:
+                    # The pass runs in its own task so that a caller
+                    # cancelling doesn't cancel it for the others
+                    self._lead(batch)
+                    self._pass = asyncio.ensure_future(self._run(batch))
+                await self._cond.wait()
+            return batch.outcome()
+
+    async def _run(self, batch: _Batch):
+        result, error = None, None
+        try:
+            # Journal writes are fsynced; keep them off the event loop
+            if self.journal is not None:
+                await asyncio.to_thread(batch.begin, self.journal)
+            result = await batch.run(self.reconciler, self.generation)
+            finished = self._settle(batch, result)
+            if self.journal is not None:
+                await asyncio.to_thread(self.journal.end, *finished)
+        except Exception as e:
+            error = e
+        async with self._cond:
+            self._finish(batch, result, error)
+            self._cond.notify_all()
+        self._follow_up(result)
+
+    def _follow_up(self, result: Optional[Dict]):
+        token = result.get("continuation_token") if result is not None else None
+        if token and self.background:
+            task = asyncio.ensure_future(self._finish_unfinished(token))
+            self._finishing.add(task)
+            task.add_done_callback(self._finishing.discard)
+
+    async def _finish_unfinished(self, token: str):
+        try:
+            await self.resume(token)
+        except KeyError:
+            pass
+        except Exception as e:
+            logger.error(f"Finishing pass {token} failed: {e}")
@@ -1,16 +1,57 @@
 import os
+from typing import List
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     SOCKET_PATH: str = "/var/run/transctrl/transctrl.sock"
     DOCKER_HOST: str = "unix:///var/run/docker.sock"
+    DOCKER_HOSTS: List[str] = []
+    PLACEMENT_POLICY: str = "hash"
+    DOCKER_POOL_SIZE: int = 0
+    DOCKER_POOL_TIMEOUT: float = 30.0
+    DOCKER_TIMEOUT: float = 60.0
+    GRPC_MAX_WORKERS: int = 10
     ALLOWED_MOUNT_BASE: str = "/mnt"
+    VALIDATION_CACHE_TTL: float = 5.0
     RATE_LIMIT_REQUESTS: int = 10
     RATE_LIMIT_WINDOW: int = 60
+    RATE_LIMIT_ACTION_COST: float = 0.1
+    RATE_LIMIT_KEY: str = ""
     DEFAULT_MEM_LIMIT: str = "512m"
     DEFAULT_CPU_QUOTA: int = 50000
+    AUTO_PORT_RANGE: str = ""
+    RECONCILE_CONCURRENCY: int = 8
+    CACHE_MAX_STALENESS: float = 5.0
+    IMAGE_CACHE_TTL: float = 60.0
+    PREPULL_IMAGE_TAGS: List[str] = []
+    PREPULL_INTERVAL: float = 3600.0
+    RECONCILE_DEEP_VERIFY: bool = False
+    RECONCILE_DEADLINE_MARGIN: float = 1.0
+    RECONCILE_FINISH_IN_BACKGROUND: bool = True
+    MAX_WATCHERS: int = 4
+    WATCH_MAX_PENDING: int = 1000
     LOG_LEVEL: str = "INFO"
+    SERVER_MODE: str = "threaded"
+    AIO_DOCKER_MAX_CONNECTIONS: int = 64
+    AIO_DOCKER_TIMEOUT: float = 30.0
+    METRICS_ADDRESS: str = ""
+    AUDIT_LOG_PATH: str = ""
+    AUDIT_LOG_MAX_BYTES: int = 100 * 1024 * 1024
+    AUDIT_LOG_BACKUPS: int = 5
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_QUEUE_POLICY: str = "drop"
+    USAGE_SAMPLE_INTERVAL: float = 0.0
+    USAGE_HISTORY: int = 8
+    CGROUP_ROOT: str = "/sys/fs/cgroup"
+    PROC_ROOT: str = "/proc"
+    HEALTH_PROBE_INTERVAL: float = 0.0
+    HEALTH_PROBE_CONCURRENCY: int = 32
+    HEALTH_PROBE_TIMEOUT: float = 3.0
+    HEALTH_PROBE_HOST: str = "127.0.0.1"
+    JOURNAL_PATH: str = ""
+    JOURNAL_COMPACT_BYTES: int = 64 * 1024 * 1024
+    JOURNAL_RECONCILE_ON_START: bool = False
 
     class Config:
         env_file = ".env"
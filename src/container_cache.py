@@ -0,0 +1,357 @@
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import docker
+
+from .config import settings
+from .docker_client import DockerClient
+from .metrics import CACHE_STALENESS
+from .ports import PortIndex
+from .status import StatusQuery
+
+logger = logging.getLogger(__name__)
+
+# Container event actions that can change what we report for a container.
+# Anything else (exec_*, attach, resize, ...) is ignored.
+STATE_ACTIONS = {
+    "create", "start", "restart", "stop", "die", "kill", "oom",
+    "pause", "unpause", "rename", "update", "health_status",
+}
+
+
+class Subscription:
+    """
+    Container changes waiting to be sent to one watcher.
+
+    Updates are coalesced per instance, so a slow consumer only ever holds
+    the latest state of each instance and never blocks the event thread. If
+    more than max_pending instances are waiting, the subscription is marked
+    overflowed and the consumer should start again from a full snapshot.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._pending: "OrderedDict[str, Tuple[object, bool]]" = OrderedDict()
+        self._overflowed = False
+
+    def push(self, instance_id: str, container, removed: bool = False):
+        with self._cond:
+            if self._overflowed:
+                return
+            if instance_id not in self._pending and len(self._pending) >= self.max_pending:
+                self._pending.clear()
+                self._overflowed = True
+            else:
+                self._pending[instance_id] = (container, removed)
+            self._cond.notify()
+
+    def drain(self, timeout: float) -> Optional[List[Tuple[str, object, bool]]]:
+        """
+        Wait up to timeout for changes and take them all.
+
+        Returns (instance_id, container, removed) tuples, or None if the
+        subscription overflowed since the last drain.
+        """
+        with self._cond:
+            if not self._pending and not self._overflowed:
+                self._cond.wait(timeout)
+            if self._overflowed:
+                self._overflowed = False
+                return None
+            updates = [(id, c, removed) for id, (c, removed) in self._pending.items()]
+            self._pending.clear()
+            return updates
+
+
+# Started caches, for the staleness gauge
+_caches: "weakref.WeakSet[ContainerCache]" = weakref.WeakSet()
+
+
+def _staleness() -> Dict[Tuple[str], float]:
+    return {(cache.host,): cache.staleness() for cache in list(_caches)}
+
+
+CACHE_STALENESS.set_function(_staleness)
+
+
+class ContainerCache:
+    """
+    In-memory view of managed containers, kept current from Docker events.
+
+    The cache is filled by one full listing and then updated from the
+    Docker events stream (filtered on transctrl.managed=true). When the
+    stream drops, the cache reconnects and resyncs. Reads fall back to the
+    Docker API whenever the cache is older than max_staleness seconds, so
+    callers can use it as a drop-in for DockerClient's read methods.
+    """
+
+    def __init__(self, docker_client: DockerClient, max_staleness: float = None, host: str = None):
+        self.docker_client = docker_client
+        self.host = host or settings.DOCKER_HOST
+        self.max_staleness = (
+            max_staleness if max_staleness is not None else settings.CACHE_MAX_STALENESS
+        )
+        self._lock = threading.Lock()
+        self._containers: Dict[str, docker.models.containers.Container] = {}
+        self._by_instance: Dict[str, str] = {}
+        # Every container carrying each instance ID, in the order they appeared
+        self._instance_containers: Dict[str, Dict[str, None]] = {}
+        self._ports = PortIndex()
+        self._synced = False
+        self._connected = False
+        # Monotonic time up to which the cache is known to be complete
+        self._valid_at = 0.0
+        # Wall-clock time Docker stamped on the event being applied, if any
+        self._applying: Optional[float] = None
+        self._stream = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._subscriptions: List[Subscription] = []
+
+    def start(self):
+        """Start following the Docker events stream in a background thread."""
+        _caches.add(self)
+        self._thread = threading.Thread(
+            target=self._run, name="container-cache", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        stream = self._stream
+        if stream is not None:
+            stream.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def staleness(self) -> float:
+        """
+        Seconds since the cache was last known to match Docker.
+
+        While the events stream is connected that is how long ago the event
+        being applied happened, by its timestamp, and 0.0 between events:
+        a slow or stuck event handler shows up here even though the stream
+        is fine.
+        """
+        with self._lock:
+            if not self._synced:
+                return float("inf")
+            if self._connected:
+                return self._lag()
+            return time.monotonic() - self._valid_at
+
+    def is_fresh(self) -> bool:
+        return self.staleness() <= self.max_staleness
+
+    def list_managed_containers(self, query: StatusQuery = None) -> List[docker.models.containers.Container]:
+        """
+        List managed containers, those matching query if given, from the
+        cache when it is fresh. Otherwise the Docker listing is narrowed
+        to the query as far as Docker's filters go.
+        """
+        if not self.is_fresh():
+            if query is None or not query.filtered:
+                return self.docker_client.list_managed_containers()
+            containers = self.docker_client.list_managed_containers(query.docker_filters())
+        else:
+            with self._lock:
+                containers = list(self._containers.values())
+            if query is None or not query.filtered:
+                return containers
+        return [c for c in containers if query.matches(c)]
+
+    def get_container_by_id(self, instance_id: str) -> Optional[docker.models.containers.Container]:
+        """Get a managed container by its instance-id label, from the cache when it is fresh."""
+        if not self.is_fresh():
+            return self.docker_client.get_container_by_id(instance_id)
+        with self._lock:
+            container_id = self._by_instance.get(instance_id)
+            return self._containers.get(container_id) if container_id else None
+
+    def get_containers_by_ids(self, instance_ids: List[str]) -> Dict[str, docker.models.containers.Container]:
+        """Managed containers of several instances, from the cache when it is fresh; instance ID -> container."""
+        if not self.is_fresh():
+            return self.docker_client.get_containers_by_ids(instance_ids)
+        with self._lock:
+            found = {}
+            for instance_id in instance_ids:
+                container = self._containers.get(self._by_instance.get(instance_id))
+                if container is not None:
+                    found[instance_id] = container
+            return found
+
+    def host_of(self, container) -> str:
+        """Docker host a managed container runs on."""
+        return self.host
+
+    def holds(self, container_id: str) -> bool:
+        """Whether a container is currently in the cache."""
+        with self._lock:
+            return container_id in self._containers
+
+    def port_owner(self, port: int) -> Optional[str]:
+        """Instance whose container binds host port, as far as the cache knows."""
+        with self._lock:
+            return self._ports.owner(port)
+
+    def put(self, container: docker.models.containers.Container):
+        """Record a container we just created, ahead of its events."""
+        with self._lock:
+            self._upsert(container)
+
+    def discard(self, container: docker.models.containers.Container):
+        """Forget a container we just removed, ahead of its events."""
+        with self._lock:
+            self._remove(container.id)
+
+    def subscribe(self, max_pending: int = None, subscription: Subscription = None) -> Subscription:
+        """
+        Start receiving container changes; call unsubscribe() when done.
+
+        Pass subscription to feed changes into an existing one instead.
+        """
+        if subscription is None:
+            subscription = Subscription(max_pending or settings.WATCH_MAX_PENDING)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+
+    def resync(self):
+        """Replace the cache contents with a full listing from Docker."""
+        started = time.monotonic()
+        containers = self.docker_client.list_managed_containers()
+        with self._lock:
+            previous = self._containers
+            self._containers = {}
+            self._by_instance = {}
+            self._instance_containers = {}
+            self._ports = PortIndex()
+            for container in containers:
+                self._upsert(container)
+            # Tell watchers about anything that vanished while we weren't looking
+            for container_id, container in previous.items():
+                instance_id = container.labels.get("transctrl.instance-id")
+                if container_id not in self._containers and instance_id not in self._by_instance:
+                    self._notify(instance_id, container, removed=True)
+            self._synced = True
+            self._valid_at = started
+        logger.debug(f"Container cache resynced with {len(containers)} containers")
+
+    def handle_event(self, event: dict):
+        """Apply one decoded Docker container event to the cache."""
+        if event.get("Type") != "container":
+            return
+        action = event.get("Action", "").split(":")[0]
+        container_id = event.get("Actor", {}).get("ID") or event.get("id")
+        if not container_id:
+            return
+
+        if action == "destroy":
+            with self._lock:
+                self._remove(container_id)
+        elif action in STATE_ACTIONS:
+            try:
+                container = self.docker_client.get_container(container_id)
+            except docker.errors.NotFound:
+                with self._lock:
+                    self._remove(container_id)
+                return
+            with self._lock:
+                self._upsert(container)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                # Subscribe before listing so no event between the two is lost
+                self._stream = self.docker_client.managed_events()
+                self.resync()
+                with self._lock:
+                    self._connected = True
+                backoff = 1.0
+                for event in self._stream:
+                    self._apply(event)
+                    if self._stop.is_set():
+                        break
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"Docker events stream failed: {e}")
+            finally:
+                with self._lock:
+                    if self._connected:
+                        self._valid_at = time.monotonic() - self._lag()
+                    self._connected = False
+                    self._applying = None
+                self._stream = None
+
+            if not self._stop.is_set():
+                logger.info(f"Docker events stream disconnected, resyncing in {backoff:.0f}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _apply(self, event: dict):
+        """handle_event, tracking the event's time for staleness()."""
+        happened = event.get("timeNano")
+        with self._lock:
+            self._applying = happened / 1e9 if happened else event.get("time", time.time())
+        try:
+            self.handle_event(event)
+        finally:
+            with self._lock:
+                self._applying = None
+
+    def _lag(self) -> float:
+        # Docker's clock may run ahead of ours
+        if self._applying is None:
+            return 0.0
+        return max(0.0, time.time() - self._applying)
+
+    def _upsert(self, container):
+        instance_id = container.labels.get("transctrl.instance-id")
+        previous = self._containers.get(container.id)
+        if previous is not None:
+            self._ports.remove(previous)
+        self._containers[container.id] = container
+        self._ports.add(container)
+        if instance_id:
+            self._by_instance[instance_id] = container.id
+            self._instance_containers.setdefault(instance_id, {})[container.id] = None
+            self._notify(instance_id, container)
+
+    def _remove(self, container_id: str):
+        container = self._containers.pop(container_id, None)
+        if container is None:
+            return
+        self._ports.remove(container)
+        instance_id = container.labels.get("transctrl.instance-id")
+        others = self._instance_containers.get(instance_id)
+        if others is not None:
+            others.pop(container_id, None)
+            if not others:
+                del self._instance_containers[instance_id]
+        if self._by_instance.get(instance_id) != container_id:
+            return
+        del self._by_instance[instance_id]
+        # Another container may still carry this instance id (e.g. the
+        # replacement of a recreate whose old container went away last)
+        if others:
+            other = self._containers[next(iter(others))]
+            self._by_instance[instance_id] = other.id
+            self._notify(instance_id, other)
+        else:
+            self._notify(instance_id, container, removed=True)
+
+    def _notify(self, instance_id: str, container, removed: bool = False):
+        if not instance_id:
+            return
+        for subscription in self._subscriptions:
+            subscription.push(instance_id, container, removed)
@@ -1,22 +1,209 @@
 import docker
+import functools
 import logging
-from typing import List, Dict, Optional
+import requests
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from docker.transport import UnixHTTPAdapter
+from docker.utils import parse_host
 from .config import settings
+from .metrics import (
+    DOCKER_POOL_CONNECTIONS, DOCKER_POOL_TIMEOUTS, DOCKER_POOL_WAIT_DURATION,
+    DOCKER_POOL_WAITING, docker_call,
+)
+from .specs import SPEC_HASH_LABEL, image_ref, spec_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Settings shared by every Transmission container we run
+CONTAINER_ENVIRONMENT = {
+    "PUID": "1000",
+    "PGID": "1000",
+    "TZ": "UTC",
+}
+CAP_ADD = ["CHOWN", "SETGID", "SETUID"]
+SECURITY_OPT = ["no-new-privileges=true"]
+
+def container_name(instance_id: str) -> str:
+    return f"transctrl-{instance_id}"
+
+def container_labels(spec) -> Dict[str, str]:
+    """Labels identifying a managed container and the spec it was created from."""
+    return {
+        "transctrl.managed": "true",
+        "transctrl.instance-id": spec.id,
+        "transctrl.created-at": datetime.now().isoformat(),
+        SPEC_HASH_LABEL: spec_fingerprint(spec),
+    }
+
+def default_pool_size() -> int:
+    """DOCKER_POOL_SIZE, or enough for every gRPC and reconcile worker to make a call at once."""
+    return settings.DOCKER_POOL_SIZE or settings.GRPC_MAX_WORKERS + settings.RECONCILE_CONCURRENCY
+
+
+class PoolTimeout(Exception):
+    """No Docker API connection became free in time."""
+
+
+_pools: "weakref.WeakSet[ConnectionPool]" = weakref.WeakSet()
+
+
+class ConnectionPool:
+    """
+    Call slots for the HTTP connections a DockerClient keeps alive.
+
+    docker-py's connection pools never block: once every connection is busy
+    a request opens a throwaway one, closed again right after. Calls wait
+    here for one of `size` slots instead, up to timeout seconds, so at most
+    `size` requests are in flight and each reuses a kept-alive connection.
+    """
+
+    def __init__(self, host: str, size: int, timeout: float):
+        self.host = host
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiting = 0
+        self._waits = 0
+        self._timeouts = 0
+        _pools.add(self)
+
+    @contextmanager
+    def connection(self):
+        """Hold a slot for the duration of the block."""
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waiting += 1
+                self._waits += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self._timeouts += 1
+                DOCKER_POOL_TIMEOUTS.inc(host=self.host)
+                raise PoolTimeout(f"No Docker API connection to {self.host} free after {self.timeout}s")
+        DOCKER_POOL_WAIT_DURATION.observe(time.monotonic() - started, host=self.host)
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Slots in use and callers waiting now; waits and timeouts so far."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+            }
+
+
+def _pool_connections() -> Dict[Tuple[str, str], int]:
+    values: Dict[Tuple[str, str], int] = {}
+    for pool in list(_pools):
+        stats = pool.stats()
+        for state, count in (("in_use", stats["in_use"]), ("idle", stats["size"] - stats["in_use"])):
+            values[(pool.host, state)] = values.get((pool.host, state), 0) + count
+    return values
+
+
+def _pool_waiting() -> Dict[Tuple[str], int]:
+    values: Dict[Tuple[str], int] = {}
+    for pool in list(_pools):
+        values[(pool.host,)] = values.get((pool.host,), 0) + pool.stats()["waiting"]
+    return values
+
+
+DOCKER_POOL_CONNECTIONS.set_function(_pool_connections)
+DOCKER_POOL_WAITING.set_function(_pool_waiting)
+
+
+class UnixSocketAdapter(UnixHTTPAdapter):
+    """
+    UnixHTTPAdapter with one connection pool for its socket.
+
+    docker-py's keeps a pool per request URL, and only for the most recent
+    URLs, so calls about different containers never share a connection.
+    """
+
+    def get_connection(self, url, proxies=None):
+        return super().get_connection("http+docker://localhost", proxies)
+
+
+def pooled(method):
+    """Run a DockerClient method holding one of its connection slots."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pool.connection():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class DockerClient:
-    def __init__(self):
-        self.client = docker.DockerClient(base_url=settings.DOCKER_HOST)
+    """
+    Blocking Docker API client, safe to share between threads.
 
-    def list_managed_containers(self) -> List[docker.models.containers.Container]:
-        """List all containers managed by transctrl."""
-        return self.client.containers.list(
-            all=True,
-            filters={"label": "transctrl.managed=true"}
+    Calls go through a ConnectionPool of pool_size kept-alive connections
+    (default_pool_size() by default) and each times out after timeout
+    seconds (DOCKER_TIMEOUT).
+    """
+
+    def __init__(self, base_url: str = None, pool_size: int = None, timeout: float = None):
+        base_url = base_url or settings.DOCKER_HOST
+        self.pool = ConnectionPool(base_url, pool_size or default_pool_size(), settings.DOCKER_POOL_TIMEOUT)
+        # One connection more than there are slots: the events stream keeps one
+        connections = self.pool.size + 1
+        self.client = docker.DockerClient(
+            base_url=base_url,
+            max_pool_size=connections,
+            timeout=timeout or settings.DOCKER_TIMEOUT,
         )
+        api = self.client.api
+        if base_url.startswith("unix:"):
+            # docker-py has no hook for its socket adapter; replace the one
+            # it keeps, and refuse to guess if a release stops keeping it
+            if not isinstance(getattr(api, "_custom_adapter", None), UnixHTTPAdapter):
+                raise RuntimeError(
+                    f"docker {docker.__version__} keeps no UnixHTTPAdapter in APIClient._custom_adapter; "
+                    "transctrl's connection pooling supports docker 7.x"
+                )
+            api._custom_adapter.close()
+            api._custom_adapter = UnixSocketAdapter(parse_host(base_url), api.timeout, max_pool_size=connections)
+            api.mount("http+docker://", api._custom_adapter)
+        elif not base_url.startswith(("npipe:", "ssh:")):
+            # docker-py only sizes the pools of its own socket adapters. TLS
+            # certificates and verification are session settings, so a
+            # sized adapter on https:// keeps them
+            for prefix in ("http://", "https://"):
+                api.get_adapter(prefix).close()
+                api.mount(prefix, requests.adapters.HTTPAdapter(pool_maxsize=connections))
 
+    @docker_call("list")
+    @pooled
+    def list_managed_containers(self, filters: Dict[str, List[str]] = None) -> List[docker.models.containers.Container]:
+        """List containers managed by transctrl, narrowed by extra Docker list filters."""
+        filters = dict(filters or {})
+        filters["label"] = ["transctrl.managed=true", *filters.get("label", [])]
+        return self.client.containers.list(all=True, filters=filters)
+
+    @docker_call("get_by_instance")
+    @pooled
     def get_container_by_id(self, instance_id: str) -> Optional[docker.models.containers.Container]:
         """Get a managed container by its instance-id label."""
         containers = self.client.containers.list(
@@ -30,10 +217,65 @@ class DockerClient:
         )
         return containers[0] if containers else None
 
+    @docker_call("get_by_instances")
+    @pooled
+    def get_containers_by_ids(self, instance_ids: List[str]) -> Dict[str, docker.models.containers.Container]:
+        """
+        Managed containers of several instances: instance ID -> container.
+
+        One sparse listing finds them (label filters can't OR IDs together),
+        then only the matches are inspected.
+        """
+        wanted = set(instance_ids)
+        summaries = self.client.containers.list(
+            all=True,
+            sparse=True,
+            filters={"label": "transctrl.managed=true"}
+        )
+        found = {}
+        for summary in summaries:
+            instance_id = (summary.attrs.get("Labels") or {}).get("transctrl.instance-id")
+            if instance_id in wanted and instance_id not in found:
+                try:
+                    found[instance_id] = self.client.containers.get(summary.id)
+                except docker.errors.NotFound:
+                    pass  # removed while we were listing
+        return found
+
+    @docker_call("inspect")
+    @pooled
+    def get_container(self, container_id: str) -> docker.models.containers.Container:
+        """Get a container by its Docker ID (raises docker.errors.NotFound)."""
+        return self.client.containers.get(container_id)
+
+    @docker_call("image_inspect")
+    @pooled
+    def get_image_id(self, ref: str) -> Optional[str]:
+        """Resolve an image reference to its local image ID, or None if not present."""
+        try:
+            return self.client.images.get(ref).id
+        except docker.errors.ImageNotFound:
+            return None
+
+    @docker_call("pull")
+    @pooled
+    def pull_image(self, ref: str):
+        """Pull an image reference (repository:tag) from its registry."""
+        repository, _, tag = ref.rpartition(":")
+        self.client.images.pull(repository, tag=tag)
+
+    def managed_events(self):
+        """Open a stream of decoded Docker events for managed containers."""
+        return self.client.events(
+            decode=True,
+            filters={"type": "container", "label": "transctrl.managed=true"}
+        )
+
+    @docker_call("create")
+    @pooled
     def create_container(self, spec) -> docker.models.containers.Container:
         """Create a new Transmission container based on spec."""
-        instance_id = spec.id
-        name = f"transctrl-{instance_id}"
+        name = container_name(spec.id)
         
         # Validation should have happened before this call
         volumes = {
@@ -47,17 +289,12 @@ class DockerClient:
             "51413/tcp": spec.data_port,
         }
         
-        labels = {
-            "transctrl.managed": "true",
-            "transctrl.instance-id": instance_id,
-            "transctrl.created-at": datetime.now().isoformat(),
-        }
+        labels = container_labels(spec)
         
         mem_limit = spec.resource_limits.memory if spec.resource_limits.memory else settings.DEFAULT_MEM_LIMIT
         cpu_quota = spec.resource_limits.cpu_quota if spec.resource_limits.cpu_quota > 0 else settings.DEFAULT_CPU_QUOTA
         
-        image_tag = spec.image_tag or "latest"
-        image = f"linuxserver/transmission:{image_tag}"
+        image = image_ref(spec.image_tag)
         
         try:
             # Drop ALL capabilities, add only those needed
@@ -72,17 +309,13 @@ class DockerClient:
                 volumes=volumes,
                 ports=ports,
                 labels=labels,
-                environment={
-                    "PUID": "1000",
-                    "PGID": "1000",
-                    "TZ": "UTC",
-                },
+                environment=CONTAINER_ENVIRONMENT,
                 restart_policy={"Name": "unless-stopped"},
                 mem_limit=mem_limit,
                 cpu_quota=cpu_quota,
                 cap_drop=["ALL"],
-                cap_add=["CHOWN", "SETGID", "SETUID"],
-                security_opt=["no-new-privileges=true"],
+                cap_add=CAP_ADD,
+                security_opt=SECURITY_OPT,
                 network_mode="bridge"
             )
             return container
@@ -90,6 +323,23 @@ class DockerClient:
             logger.error(f"Failed to create container {name}: {e}")
             raise
 
+    @docker_call("update")
+    @pooled
+    def update_container(self, container: docker.models.containers.Container,
+                         memory: int, cpu_quota: int) -> docker.models.containers.Container:
+        """Change a running container's memory (bytes) and CPU limits in place."""
+        try:
+            # Keep swap at Docker's default of twice the memory limit; the
+            # old swap limit may be below the new memory limit.
+            container.update(mem_limit=memory, memswap_limit=2 * memory, cpu_quota=cpu_quota)
+            container.reload()
+            return container
+        except Exception as e:
+            logger.error(f"Failed to update container {container.name}: {e}")
+            raise
+
+    @docker_call("remove")
+    @pooled
     def remove_container(self, container: docker.models.containers.Container):
         """Remove a managed container."""
         if container.labels.get("transctrl.managed") != "true":
@@ -101,3 +351,33 @@ class DockerClient:
         except Exception as e:
             logger.error(f"Failed to remove container {container.name}: {e}")
             raise
+
+
+class ImageIdCache:
+    """Caches image reference -> image ID lookups for ttl seconds."""
+
+    def __init__(self, docker_client: DockerClient, ttl: float = None):
+        self.docker_client = docker_client
+        self.ttl = ttl if ttl is not None else settings.IMAGE_CACHE_TTL
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """Image ID for ref, or None if the image is not present locally."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(ref)
+            if entry and entry[1] > now:
+                return entry[0]
+        image_id = self.docker_client.get_image_id(ref)
+        with self._lock:
+            self._entries[ref] = (image_id, now + self.ttl)
+        return image_id
+
+    def invalidate(self, ref: str = None):
+        """Drop one cached reference, or all of them."""
+        with self._lock:
+            if ref is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ref, None)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from .config import settings
+from .metrics import HEALTH_PROBE_DURATION
+from .ports import container_ports
+
+logger = logging.getLogger(__name__)
+
+RPC_PATH = "/transmission/rpc"
+SESSION_HEADER = "x-transmission-session-id"
+# Smallest useful RPC: proves the daemon answers without listing torrents
+PROBE_BODY = b'{"method":"session-get","arguments":{"fields":["version"]}}'
+
+
+@dataclass
+class ProbeResult:
+    healthy: bool
+    latency: float  # seconds, handshake included
+    checked_at: float  # time.time()
+    error: str = ""
+
+
+def probe_host(docker_host: str) -> str:
+    """Address a Docker host's published ports are reached at."""
+    parsed = urlparse(docker_host)
+    if parsed.scheme in ("tcp", "http", "https") and parsed.hostname:
+        return parsed.hostname
+    return settings.HEALTH_PROBE_HOST
+
+
+async def _post(host: str, port: int, session_id: Optional[str]) -> Tuple[int, Dict[str, str]]:
+    """One RPC request; returns the response status and headers."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = (
+            f"POST {RPC_PATH} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(PROBE_BODY)}\r\n"
+            "Connection: close\r\n"
+        )
+        if session_id:
+            head += f"X-Transmission-Session-Id: {session_id}\r\n"
+        writer.write(head.encode() + b"\r\n" + PROBE_BODY)
+        await writer.drain()
+        status_line = await reader.readline()
+        parts = status_line.split()
+        if len(parts) < 2:
+            raise ConnectionError("Malformed response")
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return int(parts[1]), headers
+    finally:
+        writer.close()
+
+
+class HealthProber:
+    """
+    Checks that every running instance's Transmission RPC endpoint answers.
+
+    Every interval, all running managed containers are probed concurrently,
+    at most `concurrency` connections at once, each probe bounded by
+    `timeout`. A probe posts session-get to the published web port and
+    follows the X-Transmission-Session-Id handshake: a 409 hands out the
+    session ID to retry with, which is remembered so later probes take one
+    round trip. 200 (or 401, RPC answering but password protected) is
+    healthy; anything else, a refused connection or a timeout is not.
+    The latest result per instance is kept for status reads.
+    """
+
+    def __init__(self, cache, interval: float = None, concurrency: int = None, timeout: float = None):
+        self.cache = cache
+        self.interval = interval or settings.HEALTH_PROBE_INTERVAL
+        self.concurrency = concurrency or settings.HEALTH_PROBE_CONCURRENCY
+        self.timeout = timeout or settings.HEALTH_PROBE_TIMEOUT
+        self._lock = threading.Lock()
+        self._results: Dict[str, ProbeResult] = {}
+        self._sessions: Dict[str, str] = {}  # instance ID -> session ID
+
+    def result(self, instance_id: str) -> Optional[ProbeResult]:
+        with self._lock:
+            return self._results.get(instance_id)
+
+    def start(self):
+        """Probe forever from a background thread with its own event loop."""
+        threading.Thread(target=asyncio.run, args=(self.run(),), name="health-prober",
+                         daemon=True).start()
+
+    async def run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning(f"Health sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self):
+        """Probe every running managed container once."""
+        # The cache read is in-memory when fresh, but may fall back to Docker
+        containers = await asyncio.to_thread(self.cache.list_managed_containers)
+        targets = {}
+        for container in containers:
+            instance_id = container.labels.get("transctrl.instance-id")
+            web_port, _ = container_ports(container)
+            if instance_id and web_port and container.status == "running":
+                targets[instance_id] = (probe_host(self.cache.host_of(container)), web_port)
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(instance_id, host, port):
+            async with limit:
+                return instance_id, await self.probe(instance_id, host, port)
+
+        results = await asyncio.gather(*(bounded(id, *target) for id, target in targets.items()))
+        with self._lock:
+            # Stopped or removed instances have no health to report
+            self._results = dict(results)
+        self._sessions = {id: s for id, s in self._sessions.items() if id in targets}
+
+    async def probe(self, instance_id: str, host: str, port: int) -> ProbeResult:
+        started = time.monotonic()
+        try:
+            healthy, error = await asyncio.wait_for(self._handshake(instance_id, host, port), self.timeout)
+        except asyncio.TimeoutError:
+            healthy, error = False, f"No answer within {self.timeout:g}s"
+        except (OSError, ValueError) as e:
+            healthy, error = False, str(e) or type(e).__name__
+        latency = time.monotonic() - started
+        HEALTH_PROBE_DURATION.observe(latency, outcome="healthy" if healthy else "unhealthy")
+        return ProbeResult(healthy=healthy, latency=latency, checked_at=time.time(), error=error)
+
+    async def _handshake(self, instance_id: str, host: str, port: int) -> Tuple[bool, str]:
+        status, headers = await _post(host, port, self._sessions.get(instance_id))
+        if status == 409 and SESSION_HEADER in headers:
+            # New or expired session: retry once with the ID handed out
+            self._sessions[instance_id] = headers[SESSION_HEADER]
+            status, headers = await _post(host, port, self._sessions[instance_id])
+        if status in (200, 401):
+            return True, ""
+        return False, f"RPC answered HTTP {status}"
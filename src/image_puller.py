@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from .config import settings
+from .docker_client import DockerClient, ImageIdCache
+from .specs import image_ref
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePuller:
+    """
+    Pulls images, at most one pull per reference at a time.
+
+    Callers asking for a reference that is already being pulled wait for
+    that pull instead of starting another, whichever reconcile they come
+    from.
+    """
+
+    def __init__(self, docker_client: DockerClient, image_ids: ImageIdCache):
+        self.docker_client = docker_client
+        self.image_ids = image_ids
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._warm_thread: Optional[threading.Thread] = None
+
+    def ensure(self, ref: str) -> bool:
+        """Make sure ref is present locally. Returns True if it had to be pulled."""
+        if self.image_ids.resolve(ref) is not None:
+            return False
+        self.pull(ref)
+        return True
+
+    def pull(self, ref: str):
+        """Pull ref, or wait for the pull of ref already in progress."""
+        with self._lock:
+            future = self._in_flight.get(ref)
+            owner = future is None
+            if owner:
+                future = self._in_flight[ref] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            started = time.monotonic()
+            logger.info(f"Pulling image {ref}")
+            self.docker_client.pull_image(ref)
+            logger.info(f"Pulled image {ref} in {time.monotonic() - started:.1f}s")
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.image_ids.invalidate(ref)
+            with self._lock:
+                del self._in_flight[ref]
+
+    def start_warming(self, image_tags: List[str], interval: float = None):
+        """Re-pull the given tags in the background every interval seconds."""
+        interval = interval or settings.PREPULL_INTERVAL
+        refs = [image_ref(tag) for tag in image_tags]
+
+        def warm():
+            while True:
+                for ref in refs:
+                    try:
+                        self.pull(ref)
+                    except Exception as e:
+                        logger.warning(f"Failed to pre-pull image {ref}: {e}")
+                time.sleep(interval)
+
+        self._warm_thread = threading.Thread(target=warm, name="image-warmer", daemon=True)
+        self._warm_thread.start()
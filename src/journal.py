@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from google.protobuf import json_format
+
+from . import transctrl_pb2
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(spec) -> Dict:
+    return json_format.MessageToDict(spec, preserving_proto_field_name=True)
+
+
+def _decode(data: Dict):
+    return json_format.ParseDict(data, transctrl_pb2.InstanceSpec())
+
+
+def _key(spec) -> bytes:
+    return spec.SerializeToString(deterministic=True)
+
+
+def _parse(data: bytes):
+    spec = transctrl_pb2.InstanceSpec()
+    spec.ParseFromString(data)
+    return spec
+
+
+@dataclass
+class Recovery:
+    """What a journal says is left to do after a restart."""
+    desired: Optional[List] = None  # last full desired state, with later changes applied
+    full: bool = False              # an unfinished pass was a full reconcile
+    upserts: List = field(default_factory=list)   # unfinished change sets, merged
+    deletes: List[str] = field(default_factory=list)
+    done: int = 0                   # actions of unfinished passes that had succeeded
+    passes: List[str] = field(default_factory=list)  # IDs of the unfinished passes
+
+    @property
+    def unfinished(self) -> bool:
+        return self.full or bool(self.upserts or self.deletes)
+
+
+class Journal:
+    """
+    Append-only JSON lines record of accepted desired state and pass progress.
+
+    Records, one per line:
+      {"t": "reconcile", "id", "instances"}   a full pass began; instances
+                                              left out when unchanged
+      {"t": "apply", "id", "upserts", "deletes"}  a change set pass began
+      {"t": "done", "id", "action", "instance_id"}  one of its actions succeeded
+      {"t": "end", "id"}                      the pass finished
+      {"t": "snapshot", "complete", "instances"}  desired state at compaction
+
+    Pass starts and ends are fsynced; action records are only flushed. Once
+    the file outgrows compact_bytes it is rewritten as one snapshot plus the
+    unfinished passes, so loading it stays quick however long it has run.
+    """
+
+    def __init__(self, path: str, compact_bytes: int = None):
+        self.path = path
+        self.compact_bytes = compact_bytes or settings.JOURNAL_COMPACT_BYTES
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        # The desired state as the journal knows it, serialized for cheap
+        # comparison; complete once a full state has been accepted
+        self._desired: Dict[str, bytes] = {}
+        self._complete = False
+        self._unfinished: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def open(self) -> Recovery:
+        """Load the journal, compact it and start appending; returns what is left to do."""
+        with self._lock:
+            done = self._load()
+            recovery = self._recovery(done)
+            self._compact()
+        if recovery.unfinished:
+            logger.info(
+                f"Journal has {len(self._unfinished)} unfinished reconcile passes "
+                f"({recovery.done} actions done)"
+            )
+        return recovery
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def begin_reconcile(self, pass_id: str, specs: List):
+        desired = {spec.id: _key(spec) for spec in specs}
+        record = {"t": "reconcile", "id": pass_id}
+        with self._lock:
+            if not self._complete or desired != self._desired:
+                record["instances"] = [_encode(spec) for spec in specs]
+                self._desired, self._complete = desired, True
+            self._unfinished[pass_id] = record
+            self._append(record, sync=True)
+
+    def begin_apply(self, pass_id: str, upserts: List, deletes: List[str]):
+        record = {
+            "t": "apply",
+            "id": pass_id,
+            "upserts": [_encode(spec) for spec in upserts],
+            "deletes": list(deletes),
+        }
+        with self._lock:
+            self._apply(upserts, deletes)
+            self._unfinished[pass_id] = record
+            self._append(record, sync=True)
+
+    def done(self, pass_id: str, action: str, instance_id: str):
+        with self._lock:
+            if pass_id in self._unfinished:
+                self._append({"t": "done", "id": pass_id, "action": action, "instance_id": instance_id})
+
+    def end(self, *pass_ids: str):
+        """Record passes as finished: run to the end, or covered by a later pass."""
+        with self._lock:
+            ended = [pass_id for pass_id in pass_ids if self._unfinished.pop(pass_id, None) is not None]
+            for i, pass_id in enumerate(ended):
+                self._append({"t": "end", "id": pass_id}, sync=i == len(ended) - 1)
+            if self._size > self.compact_bytes:
+                self._compact()
+
+    def _apply(self, upserts: List, deletes: List[str]):
+        conflicting = {spec.id for spec in upserts}.intersection(deletes)
+        for instance_id in deletes:
+            if instance_id not in conflicting:
+                self._desired.pop(instance_id, None)
+        for spec in upserts:
+            if spec.id not in conflicting:
+                self._desired[spec.id] = _key(spec)
+
+    def _load(self) -> Counter:
+        done: Counter = Counter()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write at a crash; nothing after it was acknowledged
+                    logger.warning(f"Ignoring truncated journal record in {self.path}")
+                    break
+                kind, pass_id = record["t"], record.get("id")
+                if kind == "snapshot":
+                    self._desired = {s["id"]: _key(_decode(s)) for s in record["instances"]}
+                    self._complete = record["complete"]
+                elif kind == "reconcile":
+                    if "instances" in record:
+                        self._desired = {s["id"]: _key(_decode(s)) for s in record["instances"]}
+                        self._complete = True
+                    self._unfinished[pass_id] = record
+                elif kind == "apply":
+                    self._apply([_decode(s) for s in record["upserts"]], record["deletes"])
+                    self._unfinished[pass_id] = record
+                elif kind == "done":
+                    done[pass_id] += 1
+                elif kind == "end":
+                    self._unfinished.pop(pass_id, None)
+                    done.pop(pass_id, None)
+        return done
+
+    def _recovery(self, done: Counter) -> Recovery:
+        recovery = Recovery(done=sum(done.values()), passes=list(self._unfinished))
+        if self._complete:
+            recovery.desired = self._specs()
+        touched: Dict[str, None] = {}  # ordered set of instance IDs
+        for record in self._unfinished.values():
+            if record["t"] == "reconcile":
+                recovery.full = True
+                continue
+            upserted = [data["id"] for data in record["upserts"]]
+            conflicting = set(upserted).intersection(record["deletes"])
+            for instance_id in upserted + record["deletes"]:
+                if instance_id not in conflicting:
+                    touched.pop(instance_id, None)
+                    touched[instance_id] = None
+        # Replay each instance as the journal wants it now, not as the
+        # unfinished pass had it: a later, finished pass may have changed it
+        for instance_id in touched:
+            if instance_id in self._desired:
+                recovery.upserts.append(_parse(self._desired[instance_id]))
+            else:
+                recovery.deletes.append(instance_id)
+        return recovery
+
+    def _specs(self) -> List:
+        return [_parse(data) for data in self._desired.values()]
+
+    def _compact(self):
+        if self._file is not None:
+            self._file.close()
+        records = [{
+            "t": "snapshot",
+            "complete": self._complete,
+            "instances": [_encode(spec) for spec in self._specs()],
+        }]
+        records.extend(self._unfinished.values())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _append(self, record: Dict, sync: bool = False):
+        # A journal that can't be written loses resumability, not service
+        try:
+            line = json.dumps(record) + "\n"
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+            self._size += len(line)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to write journal {self.path}: {e}")
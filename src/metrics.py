@@ -0,0 +1,456 @@
+import functools
+import inspect
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import grpc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                for key, v in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Callable[[], Dict[Tuple[str, ...], float]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Compute the gauge at scrape time; function returns {label values: value}."""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception as e:
+                logger.warning(f"Failed to collect {self.name}: {e}")
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                for key, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series[-1] if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        lines = []
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.monotonic() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+RPC_DURATION = Histogram(
+    "transctrl_rpc_duration_seconds",
+    "Time spent handling gRPC calls (whole stream for streaming calls).",
+    ["method", "code"],
+)
+RECONCILE_PHASE_DURATION = Histogram(
+    "transctrl_reconcile_phase_duration_seconds",
+    "Time spent in each reconcile phase.",
+    ["phase"],
+)
+DOCKER_API_CALLS = Counter(
+    "transctrl_docker_api_calls_total",
+    "Docker API operations issued, by outcome.",
+    ["operation", "outcome"],
+)
+DOCKER_API_DURATION = Histogram(
+    "transctrl_docker_api_call_duration_seconds",
+    "Latency of Docker API operations.",
+    ["operation"],
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "transctrl_rate_limit_rejections_total",
+    "Calls rejected by the rate limiter.",
+)
+AUDIT_RECORDS_DROPPED = Counter(
+    "transctrl_audit_records_dropped_total",
+    "Audit records discarded because the audit queue was full.",
+)
+USAGE_SWEEP_DURATION = Histogram(
+    "transctrl_usage_sweep_duration_seconds",
+    "Time taken to sample every managed container's cgroup counters.",
+)
+HEALTH_PROBE_DURATION = Histogram(
+    "transctrl_health_probe_duration_seconds",
+    "Latency of Transmission RPC health probes, session handshake included.",
+    ["outcome"],
+)
+CACHE_STALENESS = Gauge(
+    "transctrl_container_cache_staleness_seconds",
+    "Seconds since each host's container cache was last known to match Docker "
+    "(+Inf before the first sync); reads go to Docker past CACHE_MAX_STALENESS.",
+    ["host"],
+)
+MANAGED_CONTAINERS = Gauge(
+    "transctrl_managed_containers",
+    "Managed containers by Docker status, as seen by the container cache.",
+    ["status"],
+)
+
+
+DOCKER_POOL_CONNECTIONS = Gauge(
+    "transctrl_docker_pool_connections",
+    "Docker API connection slots per host, by state (in_use, idle).",
+    ["host", "state"],
+)
+DOCKER_POOL_WAITING = Gauge(
+    "transctrl_docker_pool_waiting",
+    "Calls waiting for a free Docker API connection, per host.",
+    ["host"],
+)
+DOCKER_POOL_WAIT_DURATION = Histogram(
+    "transctrl_docker_pool_wait_seconds",
+    "Time calls spent waiting for a free Docker API connection.",
+    ["host"],
+    buckets=(0.0, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+DOCKER_POOL_TIMEOUTS = Counter(
+    "transctrl_docker_pool_timeouts_total",
+    "Calls that gave up waiting for a free Docker API connection.",
+    ["host"],
+)
+
+
+def docker_call(operation: str):
+    """Count and time a DockerClient / AsyncDockerClient method as one Docker API operation."""
+    def record(started: float, outcome: str):
+        DOCKER_API_DURATION.observe(time.monotonic() - started, operation=operation)
+        DOCKER_API_CALLS.inc(operation=operation, outcome=outcome)
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                started = time.monotonic()
+                try:
+                    result = await method(*args, **kwargs)
+                except Exception:
+                    record(started, "error")
+                    raise
+                record(started, "ok")
+                return result
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                record(started, "error")
+                raise
+            record(started, "ok")
+            return result
+        return wrapper
+
+    return decorator
+
+
+def _rpc_code(context, failed: bool = False) -> str:
+    code = context.code()
+    if code is None:
+        return "UNKNOWN" if failed else "OK"
+    return code.name
+
+
+class RpcMetricsInterceptor(grpc.ServerInterceptor):
+    """Times every unary and server-streaming call on the threaded server."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method.rsplit("/", 1)[-1]
+
+        if handler.unary_unary:
+            def unary_unary(request, context, behavior=handler.unary_unary):
+                started = time.monotonic()
+                code = "UNKNOWN"
+                try:
+                    response = behavior(request, context)
+                    code = _rpc_code(context)
+                    return response
+                except Exception:
+                    code = _rpc_code(context, failed=True)
+                    raise
+                finally:
+                    RPC_DURATION.observe(time.monotonic() - started, method=method, code=code)
+
+            return grpc.unary_unary_rpc_method_handler(
+                unary_unary,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        if handler.unary_stream:
+            def unary_stream(request, context, behavior=handler.unary_stream):
+                started = time.monotonic()
+                code = "CANCELLED"
+                try:
+                    yield from behavior(request, context)
+                    code = _rpc_code(context)
+                except Exception:
+                    code = _rpc_code(context, failed=True)
+                    raise
+                finally:
+                    RPC_DURATION.observe(time.monotonic() - started, method=method, code=code)
+
+            return grpc.unary_stream_rpc_method_handler(
+                unary_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        return handler
+
+
+class AsyncRpcMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Times every unary and server-streaming call on the grpc.aio server."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method.rsplit("/", 1)[-1]
+
+        if handler.unary_unary:
+            async def unary_unary(request, context, behavior=handler.unary_unary):
+                started = time.monotonic()
+                code = "UNKNOWN"
+                try:
+                    response = await behavior(request, context)
+                    code = _rpc_code(context)
+                    return response
+                except BaseException:
+                    code = _rpc_code(context, failed=True)
+                    raise
+                finally:
+                    RPC_DURATION.observe(time.monotonic() - started, method=method, code=code)
+
+            return grpc.unary_unary_rpc_method_handler(
+                unary_unary,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        if handler.unary_stream:
+            async def unary_stream(request, context, behavior=handler.unary_stream):
+                started = time.monotonic()
+                code = "CANCELLED"
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                    code = _rpc_code(context)
+                except BaseException:
+                    code = _rpc_code(context, failed=True)
+                    raise
+                finally:
+                    RPC_DURATION.observe(time.monotonic() - started, method=method, code=code)
+
+            return grpc.unary_stream_rpc_method_handler(
+                unary_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        return handler
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+
+def start_metrics_server(address: str):
+    """
+    Serve /metrics on address in a background thread.
+
+    address is "host:port" or "unix:/path/to/socket".
+    """
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        if os.path.exists(path):
+            os.remove(path)
+        server = _UnixHTTPServer(path, _MetricsHandler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), _MetricsHandler)
+        server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logger.info(f"Metrics available on {address}")
+    return server
@@ -0,0 +1,56 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+WEB_PORT = "9091/tcp"
+DATA_PORT = "51413/tcp"
+
+
+def container_ports(container) -> Tuple[int, int]:
+    """(web, data) host ports a container is bound to; 0 where unbound."""
+    port_bindings = container.attrs.get("HostConfig", {}).get("PortBindings") or {}
+    return _host_port(port_bindings, WEB_PORT), _host_port(port_bindings, DATA_PORT)
+
+
+def _host_port(port_bindings: Dict, container_port: str) -> int:
+    bindings = port_bindings.get(container_port) or [{"HostPort": "0"}]
+    return int(bindings[0].get("HostPort") or 0)
+
+
+def parse_port_range(value: str) -> Optional[range]:
+    """"20000-29999" -> range(20000, 30000); "" -> None."""
+    if not value:
+        return None
+    low, _, high = value.partition("-")
+    ports = range(int(low), int(high or low) + 1)
+    if not ports or ports.start < 1024 or ports.stop > 65536:
+        raise ValueError(f"Invalid port range: {value}")
+    return ports
+
+
+class PortIndex:
+    """Host port -> owning instance ID, for every port bound by a set of containers."""
+
+    def __init__(self, containers: Iterable = ()):
+        # port -> (instance ID, container ID)
+        self._owners: Dict[int, Tuple[str, str]] = {}
+        for container in containers:
+            self.add(container)
+
+    def add(self, container):
+        owner = (container.labels.get("transctrl.instance-id"), container.id)
+        for port in container_ports(container):
+            if port:
+                self._owners[port] = owner
+
+    def remove(self, container):
+        # Only drop ports still held by this container, not by its replacement
+        for port in container_ports(container):
+            owner = self._owners.get(port)
+            if owner is not None and owner[1] == container.id:
+                del self._owners[port]
+
+    def owner(self, port: int) -> Optional[str]:
+        owner = self._owners.get(port)
+        return owner[0] if owner else None
+
+    def __len__(self) -> int:
+        return len(self._owners)
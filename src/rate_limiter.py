@@ -1,23 +1,81 @@
+import threading
 import time
-from collections import deque
+from typing import Dict
 from .config import settings
+from .metrics import RATE_LIMIT_REJECTIONS
+
+# Past this many keys, buckets that have refilled completely are dropped;
+# a full bucket is indistinguishable from a new one.
+MAX_KEYS = 10000
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
 
 class RateLimiter:
+    """
+    Token bucket rate limiter, one bucket per key.
+
+    Each bucket holds up to `requests` tokens and refills at requests/window
+    tokens a second. A call is admitted when its bucket holds its cost, or
+    is full for calls costing more than a full bucket; the whole cost is
+    then taken, so an expensive call can leave the bucket in debt. charge()
+    takes tokens without asking, for costs only known once a call is in.
+    """
+
     def __init__(self, requests: int = None, window: int = None):
         self.requests = requests or settings.RATE_LIMIT_REQUESTS
         self.window = window or settings.RATE_LIMIT_WINDOW
-        self.history = deque()
+        self.rate = self.requests / self.window
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _Bucket] = {}
 
-    def is_allowed(self) -> bool:
+    def acquire(self, cost: float = 1, key: str = "") -> float:
+        """
+        Take cost tokens from key's bucket.
+
+        Returns 0.0 if the call is allowed, otherwise the seconds until it
+        would be.
+        """
+        needed = min(cost, self.requests)
+        with self._lock:
+            bucket = self._refilled(key)
+            if bucket.tokens >= needed:
+                bucket.tokens -= cost
+                return 0.0
+            tokens = bucket.tokens
+
+        RATE_LIMIT_REJECTIONS.inc()
+        return (needed - tokens) / self.rate
+
+    def charge(self, cost: float, key: str = ""):
+        """Take cost tokens from key's bucket even if that puts it in debt."""
+        with self._lock:
+            self._refilled(key).tokens -= cost
+
+    def is_allowed(self, cost: float = 1, key: str = "") -> bool:
         """Check if request is allowed under rate limit."""
-        now = time.time()
-        
-        # Remove timestamps outside current window
-        while self.history and self.history[0] <= now - self.window:
-            self.history.popleft()
-            
-        if len(self.history) < self.requests:
-            self.history.append(now)
-            return True
-            
-        return False
+        return self.acquire(cost, key) == 0.0
+
+    def _refilled(self, key: str) -> _Bucket:
+        """key's bucket, topped up to now; hold self._lock."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_KEYS:
+                self._prune(now)
+            bucket = self._buckets[key] = _Bucket(self.requests, now)
+        bucket.tokens = min(self.requests, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        return bucket
+
+    def _prune(self, now: float):
+        full = [key for key, bucket in self._buckets.items()
+                if bucket.tokens + (now - bucket.updated) * self.rate >= self.requests]
+        for key in full:
+            del self._buckets[key]
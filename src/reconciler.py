@@ -1,92 +1,476 @@
+import copy
 import logging
-from typing import List, Dict, Set
-from .docker_client import DockerClient
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set
+from .audit import log_event, new_correlation_id
+from .docker_client import DockerClient, ImageIdCache
+from .image_puller import ImagePuller
+from .metrics import RECONCILE_PHASE_DURATION
+from .ports import PortIndex, container_ports, parse_port_range
+from .specs import SPEC_HASH_LABEL, SPEC_HASH_VERSION, image_ref, normalize_spec, spec_fingerprint
+from .validation import SpecValidator
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class ReconcilePlan:
+    """Actions that move the managed containers to a desired state."""
+    to_create: List = field(default_factory=list)    # specs without a container
+    to_recreate: List = field(default_factory=list)  # specs whose container drifted
+    to_update: List = field(default_factory=list)    # (container, spec) with only limits changed
+    to_destroy: List = field(default_factory=list)   # containers, including drifted ones
+    to_keep: List = field(default_factory=list)      # specs already in place
+    errors: List = field(default_factory=list)       # problems found while planning
+
+    def action_count(self) -> int:
+        """Docker container actions executing the plan takes."""
+        return len(self.to_destroy) + len(self.to_update) + len(self.to_create) + len(self.to_recreate)
+
+class Deferred(Exception):
+    """An action left unstarted because the pass's deadline had passed."""
+
+def _before(deadline: float, action):
+    """action, raising Deferred instead of starting once deadline (monotonic) has passed."""
+    def guarded(item):
+        if time.monotonic() >= deadline:
+            raise Deferred()
+        return action(item)
+    return guarded
+
 class Reconciler:
-    def __init__(self, docker_client: DockerClient):
+    def __init__(self, docker_client: DockerClient, concurrency: int = None, cache=None,
+                 deep_verify: bool = None, journal=None):
         self.docker_client = docker_client
+        # Compare full container attributes even when a spec hash is present
+        self.deep_verify = settings.RECONCILE_DEEP_VERIFY if deep_verify is None else deep_verify
+        # Optional ContainerCache serving the diff step; kept in step with
+        # our own creates/removes so back-to-back reconciles see them.
+        self.cache = cache
+        # Optional Journal told of every action that succeeds
+        self.journal = journal
+        self.image_ids = ImageIdCache(docker_client)
+        self.image_puller = ImagePuller(docker_client, self.image_ids)
+        self.validator = SpecValidator()
+        # Host ports handed out to specs asking for port 0
+        self.port_range = parse_port_range(settings.AUTO_PORT_RANGE)
+        self.concurrency = concurrency or settings.RECONCILE_CONCURRENCY
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix="reconcile"
+        )
 
-    def reconcile(self, desired_instances: List) -> Dict:
+    def reconcile(self, desired_instances: List, plan: ReconcilePlan = None,
+                  correlation_id: str = None, deadline: float = None) -> Dict:
         """
         Reconcile desired state with actual state.
         
         desired_instances: List of InstanceSpec objects
+        plan: plan(desired_instances), if the caller already made it
+        correlation_id: tags the audit record of every action taken
+        deadline: time.monotonic() after which no new action is started;
+            those left over are counted in deferred_count
+        """
+        results = self._new_results()
+        try:
+            if plan is None:
+                plan = self.plan(desired_instances)
+            self._execute(plan, results, correlation_id or new_correlation_id(), deadline)
+            return results
+        except Exception as e:
+            logger.error(f"Reconciliation loop failed: {e}")
+            results["errors"].append(f"Global reconciliation error: {e}")
+            return results
+
+    def apply_changes(self, upserts: List, deletes: List[str], plan: ReconcilePlan = None,
+                      correlation_id: str = None, deadline: float = None) -> Dict:
+        """
+        Apply a delta to the managed containers.
+        
+        upserts: InstanceSpecs to create, or to recreate if they drifted
+        deletes: instance IDs to destroy
+        plan: plan_changes(upserts, deletes), if the caller already made it
+        correlation_id, deadline: as for reconcile()
+        
+        Containers for any other instance are left untouched.
+        """
+        results = self._new_results()
+        try:
+            if plan is None:
+                plan = self.plan_changes(upserts, deletes)
+            self._execute(plan, results, correlation_id or new_correlation_id(), deadline)
+            return results
+        except Exception as e:
+            logger.error(f"Applying changes failed: {e}")
+            results["errors"].append(f"Global reconciliation error: {e}")
+            return results
+
+    def plan(self, desired_instances: List) -> ReconcilePlan:
+        """Diff the full desired state against every managed container."""
+        # 1. Get all currently managed containers
+        with RECONCILE_PHASE_DURATION.time(phase="list"):
+            existing_containers = self._state().list_managed_containers()
+        return self.diff(existing_containers, desired_instances)
+
+    def diff(self, existing_containers: List, desired_instances: List) -> ReconcilePlan:
+        with RECONCILE_PHASE_DURATION.time(phase="diff"):
+            return self._diff(existing_containers, desired_instances)
+
+    def _diff(self, existing_containers: List, desired_instances: List) -> ReconcilePlan:
+        existing_map = {c.labels.get("transctrl.instance-id"): c for c in existing_containers}
+        
+        desired_ids = {spec.id for spec in desired_instances}
+        
+        # 2. Identify actions
+        plan = ReconcilePlan(
+            to_destroy=[c for id, c in existing_map.items() if id not in desired_ids]
+        )
+        # Every existing container is either destroyed or re-specified
+        ports = PortIndex(existing_containers)
+        self._classify(plan, existing_map, desired_instances, ports.owner, set(existing_map))
+        return plan
+
+    def plan_changes(self, upserts: List, deletes: List[str]) -> ReconcilePlan:
+        """Diff only the upserted and deleted instances against their containers."""
+        touched = list(self._touched_ids(upserts, deletes))
+        with RECONCILE_PHASE_DURATION.time(phase="list"):
+            existing_map = self._state().get_containers_by_ids(touched) if touched else {}
+        with RECONCILE_PHASE_DURATION.time(phase="diff"):
+            return self.diff_changes(existing_map, upserts, deletes)
+
+    def diff_changes(self, existing_map: Dict, upserts: List, deletes: List[str]) -> ReconcilePlan:
+        """
+        existing_map: instance ID -> container, for the touched instances
+        that have one
+        """
+        conflicting = self._conflicting_ids(upserts, deletes)
+        plan = ReconcilePlan(
+            to_destroy=[existing_map[id] for id in dict.fromkeys(deletes)
+                        if id in existing_map and id not in conflicting],
+            errors=[f"Instance {id} is both upserted and deleted; skipping" for id in sorted(conflicting)],
+        )
+        # Without a cache only ports within the request can be checked;
+        # the cache indexes every managed container's bindings
+        port_owner = self.cache.port_owner if self.cache is not None else (lambda port: None)
+        self._classify(plan, existing_map, [s for s in upserts if s.id not in conflicting],
+                       port_owner, self._touched_ids(upserts, deletes))
+        return plan
+
+    def _touched_ids(self, upserts: List, deletes: List[str]) -> Set[str]:
+        """Instance IDs a change set needs container lookups for."""
+        upsert_ids = {spec.id for spec in upserts}
+        return upsert_ids.union(deletes) - self._conflicting_ids(upserts, deletes)
+
+    def _conflicting_ids(self, upserts: List, deletes: List[str]) -> Set[str]:
+        return {spec.id for spec in upserts}.intersection(deletes)
+
+    def _classify(self, plan: ReconcilePlan, existing_map: Dict, specs: List,
+                  port_owner, replaced: Set[str]):
+        """
+        port_owner: host port -> instance ID of the managed container bound to it
+        replaced: instances whose current containers, if any, this plan
+        destroys or re-specifies
+        """
+        specs = self._assign_ports(specs, existing_map, port_owner)
+        # Invalid specs are left out entirely: an existing container for one
+        # is neither recreated nor, being listed, destroyed
+        invalid = self.validator.validate(specs)
+        invalid.update(self._port_conflicts(specs, invalid, port_owner, replaced))
+        for instance_id, reason in invalid.items():
+            plan.errors.append(f"Invalid spec for {instance_id}: {reason}")
+        for spec in specs:
+            if spec.id in invalid:
+                continue
+            if spec.id not in existing_map:
+                plan.to_create.append(spec)
+            else:
+                container = existing_map[spec.id]
+                if self._needs_recreation(container, spec):
+                    plan.to_recreate.append(spec)
+                    plan.to_destroy.append(container)
+                elif self._needs_update(container, spec):
+                    plan.to_update.append((container, spec))
+                else:
+                    plan.to_keep.append(spec)
+
+    def _assign_ports(self, specs: List, existing_map: Dict, port_owner) -> List:
+        """Fill in ports left at 0 from port_range, keeping the ports an instance already has."""
+        if self.port_range is None or all(spec.web_port and spec.data_port for spec in specs):
+            return specs
+        claimed = {port for spec in specs for port in (spec.web_port, spec.data_port) if port}
+        free = (port for port in self.port_range if port not in claimed and port_owner(port) is None)
+
+        assigned = []
+        for spec in specs:
+            if spec.web_port and spec.data_port:
+                assigned.append(spec)
+                continue
+            container = existing_map.get(spec.id)
+            current = container_ports(container) if container is not None else (0, 0)
+            spec = copy.copy(spec)
+            for attr, port in zip(("web_port", "data_port"), current):
+                if getattr(spec, attr):
+                    continue
+                if not port or port in claimed:
+                    port = next(free, 0)  # 0 if the range is used up; fails validation
+                claimed.add(port)
+                setattr(spec, attr, port)
+            assigned.append(spec)
+        return assigned
+
+    def _port_conflicts(self, specs: List, invalid: Dict[str, str], port_owner,
+                        replaced: Set[str]) -> Dict[str, str]:
+        """Specs whose host ports another spec or a container staying in place also binds."""
+        claims: Dict[int, List[str]] = {}
+        for spec in specs:
+            if spec.id not in invalid:
+                for port in (spec.web_port, spec.data_port):
+                    claims.setdefault(port, []).append(spec.id)
+
+        conflicts = {}
+        for port, instance_ids in claims.items():
+            # An instance asking to keep a port it holds wins it; the
+            # others are caught below
+            if len(instance_ids) > 1 and port_owner(port) not in instance_ids:
+                for instance_id in instance_ids:
+                    others = ", ".join(i for i in instance_ids if i != instance_id)
+                    conflicts.setdefault(instance_id, f"Port {port} is also requested by {others}")
+
+        # Containers of invalid specs stay as they are, ports included, which
+        # can in turn put other specs in conflict
+        while True:
+            held = invalid.keys() | conflicts.keys()
+            found = {}
+            for port, instance_ids in claims.items():
+                owner = port_owner(port)
+                # Free once its holder is replaced by a spec not asking for it
+                if owner is None or (owner in replaced and owner not in held
+                                     and owner not in instance_ids):
+                    continue
+                for instance_id in instance_ids:
+                    if instance_id != owner and instance_id not in held:
+                        found[instance_id] = f"Port {port} is in use by instance {owner}"
+            if not found:
+                return conflicts
+            conflicts.update(found)
+
+    def _execute(self, plan: ReconcilePlan, results: Dict, correlation_id: str,
+                 deadline: float = None):
+        # 3. Execute actions (Best effort)
+        phases = self._phases(plan, results, correlation_id)
+        try:
+            action, items = next(phases)
+            while True:
+                with RECONCILE_PHASE_DURATION.time(phase=action):
+                    outcomes = self._run_parallel(getattr(self, f"_{action}"), items,
+                                                  self._deadline_for(action, deadline))
+                action, items = phases.send(outcomes)
+        except StopIteration:
+            pass
+
+    def _phases(self, plan: ReconcilePlan, results: Dict, correlation_id: str):
         """
-        results = {
-            "instances": [],
+        Walk a plan phase by phase, recording outcomes in results and the
+        audit log.
+        
+        Yields (action, items) for each phase and is sent back the
+        (item, exception or None) outcomes, so executors only decide how an
+        action runs. Every destroy finishes before any create starts: a
+        recreated instance reuses the old container's name and host ports.
+        Within a phase, instances with a higher spec priority go first.
+        Actions the executor reports as Deferred are only counted.
+        """
+        results["errors"].extend(plan.errors)
+
+        # Pull missing images up front, once per image, and before anything
+        # is destroyed: a recreate whose new image can't be pulled keeps its
+        # old container.
+        started = time.monotonic()
+        outcomes = yield "pull", self._images_needed(plan)
+        results["image_pull_seconds"] = time.monotonic() - started
+        failed_images = set()
+        for ref, error in outcomes:
+            if error is not None:
+                failed_images.add(ref)
+                results["errors"].append(f"Failed to pull image {ref}: {error}")
+        if failed_images:
+            plan = self._without_images(plan, failed_images, results["errors"])
+        
+        # Destroy; a drifted container goes with its replacement's priority
+        priorities = {spec.id: spec.priority for spec in plan.to_recreate}
+        outcomes = yield "destroy", self._by_priority(
+            plan.to_destroy, lambda c: priorities.get(c.labels.get("transctrl.instance-id"), 0)
+        )
+        for container, error in outcomes:
+            if isinstance(error, Deferred):
+                results["deferred_count"] += 1
+                continue
+            instance_id = container.labels.get("transctrl.instance-id")
+            self._record("destroy", instance_id, error, correlation_id, container_id=container.id)
+            if error is None:
+                results["destroyed_count"] += 1
+            else:
+                results["errors"].append(f"Failed to destroy {instance_id}: {error}")
+        
+        # Update resource limits in place
+        outcomes = yield "update", self._by_priority(plan.to_update, lambda item: item[1].priority)
+        for (container, spec), error in outcomes:
+            if isinstance(error, Deferred):
+                results["deferred_count"] += 1
+                continue
+            self._record("update", spec.id, error, correlation_id, container_id=container.id)
+            if error is None:
+                results["updated_count"] += 1
+                results["instances"].append(spec)
+            else:
+                results["errors"].append(f"Failed to update {spec.id}: {error}")
+        
+        # Create / Recreate
+        recreate_ids = {spec.id for spec in plan.to_recreate}
+        outcomes = yield "create", self._by_priority(plan.to_create + plan.to_recreate,
+                                                     lambda spec: spec.priority)
+        for spec, error in outcomes:
+            if isinstance(error, Deferred):
+                results["deferred_count"] += 1
+                continue
+            self._record("create", spec.id, error, correlation_id, recreate=spec.id in recreate_ids)
+            if error is None:
+                results["created_count"] += 1
+                results["instances"].append(spec)
+                if spec.id in recreate_ids:
+                    results["recreated_count"] += 1
+            else:
+                results["errors"].append(f"Failed to create {spec.id}: {error}")
+        
+        # Mark unchanged
+        results["unchanged_count"] = len(plan.to_keep)
+
+    def _record(self, action: str, instance_id: str, error: Optional[Exception],
+                correlation_id: str, **details):
+        """Audit an action's outcome, and journal it if it succeeded."""
+        if error is None and self.journal is not None:
+            self.journal.done(correlation_id, action, instance_id)
+        details["outcome"] = "ok" if error is None else "error"
+        if error is not None:
+            details["error"] = str(error)
+        log_event(action, instance_id, details, correlation_id)
+
+    def _images_needed(self, plan: ReconcilePlan) -> List[str]:
+        """Distinct image references the plan's creates will run."""
+        return list(dict.fromkeys(
+            image_ref(spec.image_tag) for spec in plan.to_create + plan.to_recreate
+        ))
+
+    def _without_images(self, plan: ReconcilePlan, refs: Set[str], errors: List[str]) -> ReconcilePlan:
+        """Drop creates (and the matching recreate destroys) needing any of refs."""
+        skipped = set()
+        for spec in plan.to_create + plan.to_recreate:
+            ref = image_ref(spec.image_tag)
+            if ref in refs:
+                skipped.add(spec.id)
+                errors.append(f"Skipped {spec.id}: image {ref} is unavailable")
+        # Drifted containers whose replacement can't start stay up
+        kept_running = skipped & {spec.id for spec in plan.to_recreate}
+        return ReconcilePlan(
+            to_create=[s for s in plan.to_create if s.id not in skipped],
+            to_recreate=[s for s in plan.to_recreate if s.id not in skipped],
+            to_destroy=[c for c in plan.to_destroy
+                        if c.labels.get("transctrl.instance-id") not in kept_running],
+            to_update=plan.to_update,
+            to_keep=plan.to_keep,
+            errors=plan.errors,
+        )
+
+    @staticmethod
+    def _new_results() -> Dict:
+        return {
+            "instances": [],  # specs, as executed, of instances created or updated
             "created_count": 0,
             "destroyed_count": 0,
             "unchanged_count": 0,
             "recreated_count": 0,
+            "updated_count": 0,
+            "image_pull_seconds": 0.0,
+            "deferred_count": 0,  # actions not started before the deadline
             "errors": []
         }
+
+    def _state(self):
+        """Where managed containers are read from: the cache if we have one."""
+        return self.cache if self.cache is not None else self.docker_client
+
+    @staticmethod
+    def _by_priority(items: List, priority) -> List:
+        """items, highest priority(item) first, otherwise in plan order."""
+        if len(items) < 2:
+            return items
+        return sorted(items, key=lambda item: -priority(item))
+
+    @staticmethod
+    def _deadline_for(action: str, deadline: Optional[float]) -> Optional[float]:
+        # Pulls always finish: creates need them, and later passes reuse them
+        return None if action == "pull" else deadline
+
+    def _run_parallel(self, action, items: List, deadline: float = None) -> List:
+        """
+        Run action on every item using the worker pool.
         
-        try:
-            # 1. Get all currently managed containers
-            existing_containers = self.docker_client.list_managed_containers()
-            existing_map = {c.labels.get("transctrl.instance-id"): c for c in existing_containers}
-            
-            desired_ids = {spec.id for spec in desired_instances}
-            
-            # 2. Identify actions
-            to_destroy = [c for id, c in existing_map.items() if id not in desired_ids]
-            to_create = []
-            to_recreate = []
-            to_keep = []
-            
-            for spec in desired_instances:
-                if spec.id not in existing_map:
-                    to_create.append(spec)
-                else:
-                    container = existing_map[spec.id]
-                    if self._needs_recreation(container, spec):
-                        to_recreate.append(spec)
-                        to_destroy.append(container)
-                    else:
-                        to_keep.append(spec)
-            
-            # 3. Execute actions (Best effort)
-            
-            # Destroy
-            for container in to_destroy:
-                try:
-                    instance_id = container.labels.get("transctrl.instance-id")
-                    logger.info(f"Destroying container for instance {instance_id}")
-                    self.docker_client.remove_container(container)
-                    results["destroyed_count"] += 1
-                except Exception as e:
-                    results["errors"].append(f"Failed to destroy {instance_id}: {e}")
-            
-            # Create / Recreate
-            for spec in to_create + to_recreate:
-                try:
-                    logger.info(f"Creating container for instance {spec.id}")
-                    # Path validation should happen here if not already done in the server layer
-                    self._validate_spec(spec)
-                    
-                    container = self.docker_client.create_container(spec)
-                    # Note: In a real implementation, we'd map this back to InstanceStatus
-                    results["created_count"] += 1
-                    if spec in to_recreate:
-                        results["recreated_count"] += 1
-                except Exception as e:
-                    results["errors"].append(f"Failed to create {spec.id}: {e}")
-            
-            # Mark unchanged
-            results["unchanged_count"] = len(to_keep)
-            
-            return results
-            
-        except Exception as e:
-            logger.error(f"Reconciliation loop failed: {e}")
-            results["errors"].append(f"Global reconciliation error: {e}")
-            return results
+        Returns (item, exception or None) pairs in submission order, once
+        all of them have finished. Items not started by deadline, if given,
+        come back with Deferred.
+        """
+        if deadline is not None:
+            action = _before(deadline, action)
+        futures = [self._executor.submit(action, item) for item in items]
+        return [(item, future.exception()) for item, future in zip(items, futures)]
+
+    def _pull(self, ref: str):
+        self.image_puller.ensure(ref)
+
+    def _update(self, item):
+        container, spec = item
+        logger.info(f"Updating resource limits for instance {spec.id}")
+        limits = normalize_spec(spec)
+        container = self.docker_client.update_container(container, limits["memory"], limits["cpu_quota"])
+        if self.cache is not None:
+            self.cache.put(container)
+
+    def _destroy(self, container):
+        instance_id = container.labels.get("transctrl.instance-id")
+        logger.info(f"Destroying container for instance {instance_id}")
+        self.docker_client.remove_container(container)
+        if self.cache is not None:
+            self.cache.discard(container)
+
+    def _create(self, spec):
+        logger.info(f"Creating container for instance {spec.id}")
+        # Note: In a real implementation, we'd map this back to InstanceStatus
+        container = self.docker_client.create_container(spec)
+        if self.cache is not None:
+            self.cache.put(container)
+        return container
+
+    def _needs_update(self, container, spec) -> bool:
+        """Check if the container's resource limits differ from spec."""
+        limits = normalize_spec(spec)
+        host_config = container.attrs.get("HostConfig", {})
+        if host_config.get("Memory") != limits["memory"]: return True
+        if host_config.get("CpuQuota") != limits["cpu_quota"]: return True
+        return False
 
     def _needs_recreation(self, container, spec) -> bool:
-        """Check if container configuration differs from spec."""
+        """Check if container configuration differs from spec in a way only a recreate can fix."""
+        if not self.deep_verify:
+            spec_hash = container.labels.get(SPEC_HASH_LABEL, "")
+            if spec_hash.startswith(f"{SPEC_HASH_VERSION}:"):
+                return spec_hash != spec_fingerprint(spec)
+        # No usable fingerprint (or deep verify): compare attributes
+        return self._differs_from_spec(container, spec)
+
+    def _differs_from_spec(self, container, spec) -> bool:
+        """Compare container attributes other than resource limits against spec."""
         # Check volumes
         mounts = {m["Destination"]: m["Source"] for m in container.attrs.get("Mounts", [])}
         if mounts.get("/config") != spec.config_path: return True
@@ -101,48 +485,16 @@ class Reconciler:
         if not web_binding or int(web_binding[0].get("HostPort")) != spec.web_port: return True
         if not data_binding or int(data_binding[0].get("HostPort")) != spec.data_port: return True
         
-        # Check image tag
-        image_name = container.image.tags[0] if container.image.tags else ""
-        desired_image = f"linuxserver/transmission:{spec.image_tag or 'latest'}"
-        if image_name and image_name != desired_image: return True
+        # Check image, from the reference the container was created with.
+        # Only containers without one need the desired tag resolved to an ID.
+        desired_image = image_ref(spec.image_tag)
+        config_image = container.attrs.get("Config", {}).get("Image")
+        if config_image:
+            if config_image != desired_image: return True
+        else:
+            desired_image_id = self.image_ids.resolve(desired_image)
+            if desired_image_id and container.attrs.get("Image") != desired_image_id: return True
         
-        # Check resource limits (simplified)
-        host_config = container.attrs.get("HostConfig", {})
-        if host_config.get("Memory") != self._parse_memory(spec.resource_limits.memory or settings.DEFAULT_MEM_LIMIT): return True
-        if host_config.get("CpuQuota") != (spec.resource_limits.cpu_quota or settings.DEFAULT_CPU_QUOTA): return True
+        # Resource limits are left to _needs_update
         
         return False
-
-    def _validate_spec(self, spec):
-        """Validate instance spec against security requirements."""
-        # 1. Path validation
-        for path_attr in ["config_path", "data_path", "watch_path"]:
-            path = getattr(spec, path_attr)
-            if not os.path.isabs(path):
-                raise ValueError(f"{path_attr} must be an absolute path: {path}")
-            if not path.startswith(settings.ALLOWED_MOUNT_BASE):
-                raise ValueError(f"{path_attr} must be under {settings.ALLOWED_MOUNT_BASE}: {path}")
-            if not os.path.exists(path):
-                raise ValueError(f"{path_attr} does not exist: {path}")
-
-        # 2. Port validation
-        if not (1024 <= spec.web_port <= 65535):
-            raise ValueError(f"web_port out of range: {spec.web_port}")
-        if not (1024 <= spec.data_port <= 65535):
-            raise ValueError(f"data_port out of range: {spec.data_port}")
-        if spec.web_port == spec.data_port:
-            raise ValueError("web_port and data_port must be different")
-
-        # 3. ID validation
-        import re
-        if not re.match(r"^[a-zA-Z0-9_-]{1,64}$", spec.id) or spec.id.startswith("-"):
-            raise ValueError(f"Invalid instance ID: {spec.id}")
-
-    def _parse_memory(self, mem_str: str) -> int:
-        """Parse memory string (e.g., 512m) to bytes."""
-        units = {"k": 1024, "m": 1024**2, "g": 1024**3}
-        unit = mem_str[-1].lower()
-        if unit in units:
-            return int(mem_str[:-1]) * units[unit]
-        return int(mem_str)
-import os
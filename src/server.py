@@ -1,118 +1,431 @@
 import grpc
 import logging
 import os
-import json
 import signal
+import threading
+import time
+from collections import Counter
 from concurrent import futures
 from datetime import datetime
-from google.protobuf import timestamp_pb2
 
 from . import transctrl_pb2
 from . import transctrl_pb2_grpc
+from .audit import log_event, new_correlation_id
 from .config import settings
 from .docker_client import DockerClient
+from .journal import Journal, Recovery
+from .coalescer import ReconcileCoalescer
+from .container_cache import ContainerCache
+from .metrics import MANAGED_CONTAINERS, RpcMetricsInterceptor, start_metrics_server
+from .ports import container_ports
 from .reconciler import Reconciler
 from .rate_limiter import RateLimiter
+from .sharding import ShardedCache, ShardedReconciler, docker_hosts
+from .status import StatusQuery, decode_page_token, mask_fields, page, status_of
+from .usage import UsageSampler
+from .health import HealthProber
 
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
-def log_event(event: str, instance_id: str = None, details: dict = None):
-    """Log audit events as JSON to stdout."""
-    log_data = {
-        "timestamp": datetime.now().isoformat(),
-        "event": event,
-    }
-    if instance_id:
-        log_data["instance_id"] = instance_id
-    if details:
-        log_data["details"] = details
-    print(json.dumps(log_data))
-
 class TransmissionControllerServicer(transctrl_pb2_grpc.TransmissionControllerServicer):
     def __init__(self):
-        self.docker_client = DockerClient()
-        self.reconciler = Reconciler(self.docker_client)
+        recovery = self._open_journal()
+        # One Docker connection, cache and reconciler per host
+        caches, reconcilers = {}, {}
+        for host in docker_hosts():
+            docker_client = DockerClient(host)
+            caches[host] = ContainerCache(docker_client, host=host)
+            caches[host].start()
+            reconcilers[host] = Reconciler(docker_client, cache=caches[host], journal=self.journal)
+            if settings.PREPULL_IMAGE_TAGS:
+                reconcilers[host].image_puller.start_warming(settings.PREPULL_IMAGE_TAGS)
+        if len(reconcilers) == 1:
+            (self.container_cache,) = caches.values()
+            (self.reconciler,) = reconcilers.values()
+        else:
+            self.container_cache = ShardedCache(caches)
+            self.reconciler = ShardedReconciler(reconcilers)
+        self.coalescer = ReconcileCoalescer(self.reconciler, journal=self.journal)
         self.rate_limiter = RateLimiter()
+        self.rate_limit_key = self._checked_rate_limit_key()
+        self._watchers = threading.BoundedSemaphore(settings.MAX_WATCHERS)
+        MANAGED_CONTAINERS.set_function(self._count_by_status)
+        self._start_usage_sampler()
+        self.health = HealthProber(self.container_cache) if settings.HEALTH_PROBE_INTERVAL > 0 else None
+        if self.health is not None:
+            self.health.start()
+        resume = self._resume_call(recovery)
+        if resume is not None:
+            # Not waiting for a client: pick up where the last run stopped
+            threading.Thread(target=self._resume, args=(resume, recovery), name="journal-resume",
+                             daemon=True).start()
+
+    def _start_usage_sampler(self):
+        self.usage = None
+        if settings.USAGE_SAMPLE_INTERVAL > 0:
+            self.usage = UsageSampler(self.container_cache)
+            self.usage.start()
+
+    def _open_journal(self):
+        """Set self.journal from JOURNAL_PATH; returns what it says is left to do."""
+        self.journal = Journal(settings.JOURNAL_PATH) if settings.JOURNAL_PATH else None
+        return self.journal.open() if self.journal is not None else None
+
+    def _resume(self, resume, recovery: Recovery):
+        resume()
+        # The journaled passes are covered by the one just run
+        self.journal.end(*recovery.passes)
+
+    def _resume_call(self, recovery: Recovery):
+        """
+        The coalescer call finishing what the journal says is unfinished, or
+        None. An unfinished full pass, or any stored desired state with
+        JOURNAL_RECONCILE_ON_START, is reconciled in full; otherwise the
+        unfinished change sets are applied again. Actions already done show
+        up as unchanged.
+        """
+        if recovery is None:
+            return None
+        if recovery.desired is not None and (recovery.full or settings.JOURNAL_RECONCILE_ON_START):
+            method, args = self.coalescer.reconcile, (recovery.desired,)
+            details = {"instance_count": len(recovery.desired)}
+        elif recovery.unfinished:
+            method, args = self.coalescer.apply_changes, (recovery.upserts, recovery.deletes)
+            details = {"upsert_count": len(recovery.upserts), "delete_count": len(recovery.deletes)}
+        else:
+            return None
+        correlation_id = new_correlation_id()
+        details["actions_done"] = recovery.done
+        log_event("resume", details=details, correlation_id=correlation_id)
+        return lambda: method(*args, correlation_id=correlation_id)
+
+    def _count_by_status(self) -> dict:
+        # Read from the cache so scrapes never cost a Docker API call
+        counts = Counter(c.status for c in self.container_cache.list_managed_containers())
+        return {(status,): count for status, count in counts.items()}
 
     def Reconcile(self, request, context):
-        if not self.rate_limiter.is_allowed():
-            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Rate limit exceeded")
+        deadline = self._deadline(context)
+        if request.continuation_token:
+            return self._reconcile_reply(self._continue_pass(request, context, deadline))
+        retry_after = self._rate_limit(context)
+        if retry_after:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        planned_at = self.coalescer.generation
+        try:
+            plan = self.reconciler.plan(request.instances)
+        except Exception:
+            plan = None  # reconcile() plans again and reports the failure
+        self._charge_actions(context, plan)
 
-        log_event("reconcile", details={"instance_count": len(request.instances)})
+        correlation_id = new_correlation_id()
+        log_event("reconcile", details={"instance_count": len(request.instances)},
+                  correlation_id=correlation_id)
         
-        reconcile_results = self.reconciler.reconcile(request.instances)
+        reconcile_results = self.coalescer.reconcile(
+            request.instances, plan=plan, planned_at=planned_at, correlation_id=correlation_id,
+            deadline=deadline
+        )
+        return self._reconcile_reply(reconcile_results)
+
+    def _continue_pass(self, request, context, deadline) -> dict:
+        """Finish an earlier Reconcile/ApplyChanges left unfinished at its deadline."""
+        if request.instances:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          "Send either instances or a continuation_token, not both")
+        # Its actions were charged for by the call that planned them
+        retry_after = self._rate_limit(context)
+        if retry_after:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          f"Rate limit exceeded, retry after {retry_after:.1f}s")
+
+        correlation_id = new_correlation_id()
+        log_event("reconcile", details={"continuation_token": request.continuation_token},
+                  correlation_id=correlation_id)
+        try:
+            return self.coalescer.resume(request.continuation_token, correlation_id, deadline)
+        except KeyError:
+            context.abort(grpc.StatusCode.NOT_FOUND,
+                          f"No unfinished pass {request.continuation_token}")
+
+    def ApplyChanges(self, request, context):
+        deadline = self._deadline(context)
+        retry_after = self._rate_limit(context)
+        if retry_after:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        planned_at = self.coalescer.generation
+        try:
+            plan = self.reconciler.plan_changes(request.upserts, request.deletes)
+        except Exception:
+            plan = None
+        self._charge_actions(context, plan)
+
+        correlation_id = new_correlation_id()
+        log_event("apply_changes", details={
+            "upsert_count": len(request.upserts),
+            "delete_count": len(request.deletes),
+        }, correlation_id=correlation_id)
         
-        # Convert results to gRPC message
-        response = transctrl_pb2.ReconcileResult(
+        reconcile_results = self.coalescer.apply_changes(
+            request.upserts, request.deletes, plan=plan, planned_at=planned_at,
+            correlation_id=correlation_id, deadline=deadline
+        )
+        return self._reconcile_reply(reconcile_results)
+
+    @staticmethod
+    def _deadline(context):
+        """
+        time.monotonic() after which a call's pass should start no more
+        actions, leaving RECONCILE_DEADLINE_MARGIN for those still running
+        and the reply; None if the caller set no deadline.
+        """
+        remaining = context.time_remaining()
+        if remaining is None:
+            return None
+        return time.monotonic() + remaining - settings.RECONCILE_DEADLINE_MARGIN
+
+    def _rate_limit(self, context) -> float:
+        """
+        Admit a call against its caller's budget for one token.
+
+        Checked before planning, so a caller out of tokens costs no more
+        than this. Returns 0.0 if the call may go ahead, otherwise the
+        seconds until it could, which is also set as the retry-after trailer.
+        """
+        retry_after = self.rate_limiter.acquire(1, self._rate_limit_key(context))
+        if retry_after:
+            context.set_trailing_metadata((("retry-after", f"{retry_after:.3f}"),))
+        return retry_after
+
+    def _charge_actions(self, context, plan):
+        """Charge an admitted call RATE_LIMIT_ACTION_COST per Docker action it plans."""
+        actions = plan.action_count() if plan is not None else 0
+        if actions:
+            self.rate_limiter.charge(settings.RATE_LIMIT_ACTION_COST * actions,
+                                     self._rate_limit_key(context))
+
+    @staticmethod
+    def _checked_rate_limit_key() -> str:
+        mode = settings.RATE_LIMIT_KEY
+        if mode and mode != "peer" and not mode.startswith("metadata:"):
+            raise ValueError(f"Unknown RATE_LIMIT_KEY: {mode}")
+        return mode
+
+    def _rate_limit_key(self, context) -> str:
+        """Whose budget a call is charged to, per RATE_LIMIT_KEY."""
+        mode = self.rate_limit_key
+        if mode == "peer":
+            return context.peer()
+        if mode.startswith("metadata:"):
+            name = mode[len("metadata:"):].lower()
+            return dict(context.invocation_metadata() or ()).get(name, "")
+        return ""
+
+    def _reconcile_reply(self, reconcile_results: dict) -> transctrl_pb2.ReconcileResult:
+        ids = [spec.id for spec in reconcile_results["instances"]]
+        containers = self.container_cache.get_containers_by_ids(ids) if ids else {}
+        return self._to_reconcile_result(reconcile_results, containers)
+
+    def _to_reconcile_result(self, reconcile_results: dict, containers: dict) -> transctrl_pb2.ReconcileResult:
+        """Convert results to the gRPC message; containers maps instance IDs to their containers."""
+        return transctrl_pb2.ReconcileResult(
+            instances=[self._spec_to_status(spec, containers.get(spec.id))
+                       for spec in reconcile_results["instances"]],
             created_count=reconcile_results["created_count"],
             destroyed_count=reconcile_results["destroyed_count"],
             unchanged_count=reconcile_results["unchanged_count"],
             recreated_count=reconcile_results["recreated_count"],
+            updated_count=reconcile_results["updated_count"],
+            image_pull_seconds=reconcile_results["image_pull_seconds"],
+            deferred_count=reconcile_results["deferred_count"],
+            continuation_token=reconcile_results.get("continuation_token", ""),
             errors=reconcile_results["errors"]
         )
-        
-        # In a full implementation, we'd query status for each instance to return here
-        # For now, let's just return what we have
-        return response
 
     def GetStatus(self, request, context):
-        containers = self.docker_client.list_managed_containers()
-        instances = []
-        for c in containers:
-            instances.append(self._container_to_status(c))
-        return transctrl_pb2.CurrentState(instances=instances)
+        try:
+            query, after = self._status_query(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        containers = self.container_cache.list_managed_containers(query)
+        return self._current_state(containers, request, query, after)
 
     def GetInstance(self, request, context):
-        container = self.docker_client.get_container_by_id(request.id)
+        container = self.container_cache.get_container_by_id(request.id)
         if not container:
             context.abort(grpc.StatusCode.NOT_FOUND, f"Instance {request.id} not found")
         return self._container_to_status(container)
 
-    def _container_to_status(self, container) -> transctrl_pb2.InstanceStatus:
-        instance_id = container.labels.get("transctrl.instance-id")
-        created_at_str = container.labels.get("transctrl.created-at")
-        
-        status_map = {
-            "running": transctrl_pb2.RUNNING,
-            "exited": transctrl_pb2.STOPPED,
-            "created": transctrl_pb2.CREATING,
-            "restarting": transctrl_pb2.CREATING,
-            "paused": transctrl_pb2.STOPPED,
-        }
-        
-        port_bindings = container.attrs.get("HostConfig", {}).get("PortBindings", {})
-        web_port = int(port_bindings.get("9091/tcp", [{"HostPort": "0"}])[0]["HostPort"])
-        data_port = int(port_bindings.get("51413/tcp", [{"HostPort": "0"}])[0]["HostPort"])
-        
-        status = status_map.get(container.status, transctrl_pb2.ERROR)
-        
-        created_at = timestamp_pb2.Timestamp()
-        if created_at_str:
-            try:
-                dt = datetime.fromisoformat(created_at_str)
-                created_at.FromDatetime(dt)
-            except ValueError:
-                pass
+    def GetInstances(self, request, context):
+        try:
+            fields = mask_fields(request.field_mask)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        ids = list(dict.fromkeys(request.ids))
+        return self._instances(ids, self.container_cache.get_containers_by_ids(ids), fields)
+
+    def WatchStatus(self, request, context):
+        # Streams hold a worker thread for their whole life; cap them so
+        # watchers can't starve the unary RPCs.
+        if not self._watchers.acquire(blocking=False):
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many watchers")
+
+        # Subscribe before taking the snapshot so no change falls in between
+        subscription = self.container_cache.subscribe()
+        try:
+            sent = dict.fromkeys(request.known_ids, "")  # instance ID -> container ID
+            updates = None
+            while context.is_active():
+                if updates is None:
+                    # First pass, or this watcher fell too far behind
+                    statuses = self._snapshot(self.container_cache.list_managed_containers(), sent)
+                else:
+                    statuses = [self._update_to_status(*update) for update in updates]
+                for status in statuses:
+                    self._track(sent, status)
+                    yield status
+                updates = subscription.drain(timeout=1.0)
+        finally:
+            self.container_cache.unsubscribe(subscription)
+            self._watchers.release()
+
+    def _update_to_status(self, instance_id: str, container, removed: bool) -> transctrl_pb2.InstanceStatus:
+        if removed:
+            return self._removed_status(instance_id, container.id)
+        return self._container_to_status(container)
+
+    @staticmethod
+    def _removed_status(instance_id: str, container_id: str) -> transctrl_pb2.InstanceStatus:
+        return transctrl_pb2.InstanceStatus(id=instance_id, container_id=container_id,
+                                            status=transctrl_pb2.REMOVED)
+
+    def _snapshot(self, containers, sent: dict) -> list:
+        """
+        Statuses of containers, preceded by REMOVED for every instance a
+        stream has sent (see _track) that is no longer among them: a stream
+        that fell behind missed those removals.
+        """
+        statuses = [self._container_to_status(c) for c in containers]
+        current = {status.id for status in statuses}
+        gone = [self._removed_status(id, container_id)
+                for id, container_id in sent.items() if id not in current]
+        return gone + statuses
+
+    @staticmethod
+    def _track(sent: dict, status: transctrl_pb2.InstanceStatus):
+        if status.status == transctrl_pb2.REMOVED:
+            sent.pop(status.id, None)
+        else:
+            sent[status.id] = status.container_id
+
+    def _status_query(self, request):
+        """Parse a StatusRequest into (StatusQuery, page start); raises ValueError if invalid."""
+        if request.page_size < 0:
+            raise ValueError("page_size must not be negative")
+        return StatusQuery.from_request(request), decode_page_token(request.page_token)
+
+    def _current_state(self, containers, request, query: StatusQuery, after: str) -> transctrl_pb2.CurrentState:
+        next_page_token = ""
+        if request.page_size or after:
+            containers, next_page_token = page(containers, request.page_size, after)
+        return transctrl_pb2.CurrentState(
+            instances=[self._container_to_status(c, query.fields) for c in containers],
+            next_page_token=next_page_token
+        )
+
+    def _instances(self, ids, found, fields) -> transctrl_pb2.Instances:
+        return transctrl_pb2.Instances(
+            instances=[self._container_to_status(found[id], fields) for id in ids if id in found],
+            missing=[id for id in ids if id not in found]
+        )
 
+    def _spec_to_status(self, spec, container) -> transctrl_pb2.InstanceStatus:
+        # Ports actually bound, which for auto-assigned ones the caller
+        # only learns from here
+        if container is not None:
+            return self._container_to_status(container)
         return transctrl_pb2.InstanceStatus(
-            id=instance_id,
-            container_id=container.id,
-            status=status,
-            created_at=created_at,
-            actual_web_port=web_port,
-            actual_data_port=data_port
+            id=spec.id,
+            actual_web_port=spec.web_port,
+            actual_data_port=spec.data_port
         )
 
-def serve():
-    socket_path = settings.SOCKET_PATH
+    def _container_to_status(self, container, fields=None) -> transctrl_pb2.InstanceStatus:
+        """InstanceStatus of a container, filling only fields (a set of names) if given."""
+        instance_id = container.labels.get("transctrl.instance-id")
+        status = transctrl_pb2.InstanceStatus(id=instance_id)
+        # Port bindings and timestamps are the costly part; skip them unless asked for
+        wanted = (lambda name: True) if fields is None else fields.__contains__
+
+        if wanted("container_id"):
+            status.container_id = container.id
+        if wanted("status"):
+            status.status = status_of(container)
+        if wanted("created_at"):
+            created_at_str = container.labels.get("transctrl.created-at")
+            status.created_at.SetInParent()
+            if created_at_str:
+                try:
+                    dt = datetime.fromisoformat(created_at_str)
+                    status.created_at.FromDatetime(dt)
+                except ValueError:
+                    pass
+        if wanted("actual_web_port") or wanted("actual_data_port"):
+            web_port, data_port = container_ports(container)
+            if wanted("actual_web_port"):
+                status.actual_web_port = web_port
+            if wanted("actual_data_port"):
+                status.actual_data_port = data_port
+        if wanted("host"):
+            status.host = self.container_cache.host_of(container)
+        if wanted("usage") and self.usage is not None:
+            usage = self.usage.usage(instance_id)
+            if usage is not None:
+                status.usage.cpu_percent = usage.cpu_percent
+                status.usage.memory_bytes = usage.memory_bytes
+                status.usage.block_read_bytes_per_second = usage.io_read_rate
+                status.usage.block_write_bytes_per_second = usage.io_write_rate
+                status.usage.net_rx_bytes_per_second = usage.net_rx_rate
+                status.usage.net_tx_bytes_per_second = usage.net_tx_rate
+                status.usage.sampled_at.FromNanoseconds(int(usage.sampled_at * 1e9))
+        if wanted("health") and self.health is not None:
+            probe = self.health.result(instance_id)
+            if probe is not None:
+                status.health.health = transctrl_pb2.HEALTHY if probe.healthy else transctrl_pb2.UNHEALTHY
+                status.health.latency_seconds = probe.latency
+                status.health.error = probe.error
+                status.health.checked_at.FromNanoseconds(int(probe.checked_at * 1e9))
+        return status
+
+def prepare_socket(socket_path: str):
     # Ensure directory exists
     os.makedirs(os.path.dirname(socket_path), exist_ok=True)
     # Remove existing socket if it exists
     if os.path.exists(socket_path):
         os.remove(socket_path)
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+def serve():
+    if settings.SERVER_MODE == "aio":
+        import asyncio
+        from .aio_server import serve_aio
+        asyncio.run(serve_aio())
+        return
+    if settings.SERVER_MODE != "threaded":
+        raise ValueError(f"Unknown SERVER_MODE: {settings.SERVER_MODE}")
+
+    socket_path = settings.SOCKET_PATH
+    prepare_socket(socket_path)
+
+    if settings.METRICS_ADDRESS:
+        start_metrics_server(settings.METRICS_ADDRESS)
+
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=settings.GRPC_MAX_WORKERS),
+        interceptors=[RpcMetricsInterceptor()],
+    )
     transctrl_pb2_grpc.add_TransmissionControllerServicer_to_server(
         TransmissionControllerServicer(), server
     )
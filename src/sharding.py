@@ -0,0 +1,343 @@
+import bisect
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .audit import new_correlation_id
+from .config import settings
+from .container_cache import ContainerCache, Subscription
+from .metrics import RECONCILE_PHASE_DURATION
+from .reconciler import Reconciler, ReconcilePlan
+from .status import StatusQuery
+
+logger = logging.getLogger(__name__)
+
+PLACEMENT_POLICIES = ("hash", "capacity")
+
+
+def docker_hosts() -> List[str]:
+    """Docker daemons to manage: DOCKER_HOSTS, or just DOCKER_HOST."""
+    return list(settings.DOCKER_HOSTS) or [settings.DOCKER_HOST]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of instance IDs onto hosts.
+
+    Each host owns `replicas` points on the ring, so adding or removing a
+    host only moves the IDs hashing next to the points it gains or loses.
+    """
+
+    def __init__(self, hosts: Iterable[str], replicas: int = 100):
+        points = sorted((_hash(f"{host}#{i}"), host) for host in hosts for i in range(replicas))
+        self._points = [point for point, _ in points]
+        self._hosts = [host for _, host in points]
+
+    def host_for(self, key: str) -> str:
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._hosts[index]
+
+
+class Placement:
+    """
+    Decides which host runs each instance.
+
+    An instance stays on the host its container already runs on: its
+    config and data paths live there. New instances go to their hash ring
+    host ("hash"), or to the host running the fewest instances ("capacity").
+    """
+
+    def __init__(self, hosts: List[str], policy: str = None):
+        self.hosts = list(hosts)
+        self.policy = policy or settings.PLACEMENT_POLICY
+        if self.policy not in PLACEMENT_POLICIES:
+            raise ValueError(f"Unknown PLACEMENT_POLICY: {self.policy}")
+        self.ring = HashRing(self.hosts)
+
+    def assign(self, specs: List, current: Dict[str, str], load: Dict[str, int] = None) -> Dict[str, List]:
+        """
+        Group specs by the host they should run on.
+
+        current: instance ID -> host its container is on now
+        load: host -> instances it runs other than those in specs
+        """
+        groups: Dict[str, List] = {host: [] for host in self.hosts}
+        load = {host: (load or {}).get(host, 0) for host in self.hosts}
+        new = []
+        for spec in specs:
+            host = current.get(spec.id)
+            if host in groups:
+                groups[host].append(spec)
+                load[host] += 1
+            else:
+                new.append(spec)
+        for spec in new:
+            if self.policy == "hash":
+                host = self.ring.host_for(spec.id)
+            else:
+                host = min(self.hosts, key=load.__getitem__)
+            groups[host].append(spec)
+            load[host] += 1
+        return groups
+
+
+@dataclass
+class ShardedPlan:
+    """A ReconcilePlan per reachable host, and what could not be planned."""
+    plans: Dict[str, ReconcilePlan] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+
+    def action_count(self) -> int:
+        return sum(plan.action_count() for plan in self.plans.values())
+
+
+def merge_results(results: Iterable[Dict]) -> Dict:
+    """Combine per-host reconcile results into one."""
+    merged = Reconciler._new_results()
+    for result in results:
+        for key, value in result.items():
+            if key == "image_pull_seconds":
+                # Hosts pull side by side
+                merged[key] = max(merged[key], value)
+            else:
+                merged[key] += value
+    return merged
+
+
+class ShardedReconciler:
+    """
+    Reconciler for instances spread over several Docker hosts.
+
+    Each host has its own Reconciler, and with it its own Docker connection,
+    cache and port checks. Specs are grouped by Placement, then every host
+    is planned and reconciled in parallel and the results merged. Same
+    interface as Reconciler, with ShardedPlan for plans.
+
+    A host that fails is reported in the errors and the others go ahead.
+    While any host is unreachable, instances not found on a reachable one
+    are left alone: they may be running on the host that can't be seen.
+    """
+
+    def __init__(self, reconcilers: Dict[str, Reconciler], placement: Placement = None):
+        self.reconcilers = reconcilers
+        self.placement = placement or Placement(list(reconcilers))
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(reconcilers),
+            thread_name_prefix="shard"
+        )
+
+    def reconcile(self, desired_instances: List, plan: ShardedPlan = None,
+                  correlation_id: str = None, deadline: float = None) -> Dict:
+        # One ID for the actions on every host
+        correlation_id = correlation_id or new_correlation_id()
+        try:
+            if plan is None:
+                plan = self.plan(desired_instances)
+        except Exception as e:
+            logger.error(f"Reconciliation loop failed: {e}")
+            return self._failed(e)
+        # Each host's plan holds its specs; reconcile only needs them to plan
+        return self._execute(plan, lambda host, reconciler: reconciler.reconcile(
+            [], plan=plan.plans[host], correlation_id=correlation_id, deadline=deadline
+        ))
+
+    def apply_changes(self, upserts: List, deletes: List[str], plan: ShardedPlan = None,
+                      correlation_id: str = None, deadline: float = None) -> Dict:
+        correlation_id = correlation_id or new_correlation_id()
+        try:
+            if plan is None:
+                plan = self.plan_changes(upserts, deletes)
+        except Exception as e:
+            logger.error(f"Applying changes failed: {e}")
+            return self._failed(e)
+        return self._execute(plan, lambda host, reconciler: reconciler.apply_changes(
+            [], [], plan=plan.plans[host], correlation_id=correlation_id, deadline=deadline
+        ))
+
+    def _execute(self, plan: ShardedPlan, call: Callable) -> Dict:
+        results, errors = self._fan_out(call, plan.plans)
+        merged = merge_results(results.values())
+        merged["errors"][:0] = plan.errors + self._host_errors(errors)
+        return merged
+
+    def plan(self, desired_instances: List) -> ShardedPlan:
+        """Place every desired instance and diff each host against its share."""
+        with RECONCILE_PHASE_DURATION.time(phase="list"):
+            listings, unreachable = self._fan_out(
+                lambda host, reconciler: reconciler._state().list_managed_containers()
+            )
+        desired_ids = {spec.id for spec in desired_instances}
+        current = {}
+        for host, containers in listings.items():
+            for container in containers:
+                instance_id = container.labels.get("transctrl.instance-id")
+                if instance_id in desired_ids:
+                    current.setdefault(instance_id, host)
+        placeable, errors = self._placeable(desired_instances, current, unreachable)
+        # Containers of instances placed elsewhere, or not wanted at all,
+        # are destroyed by their host's diff
+        groups = self.placement.assign(placeable, current)
+        plans, failed = self._fan_out(
+            lambda host, reconciler: reconciler.diff(listings[host], groups[host]), listings
+        )
+        return ShardedPlan(plans, errors + self._host_errors(failed))
+
+    def plan_changes(self, upserts: List, deletes: List[str]) -> ShardedPlan:
+        """Place the upserts and send every host the changes touching it."""
+        upsert_ids = {spec.id for spec in upserts}
+        touched = upsert_ids.union(deletes)
+        conflicting = upsert_ids.intersection(deletes)
+        with RECONCILE_PHASE_DURATION.time(phase="list"):
+            found, unreachable = self._fan_out(lambda host, reconciler: self._lookup(reconciler, touched))
+            load = {}
+            if self.placement.policy == "capacity":
+                listings, _ = self._fan_out(
+                    lambda host, reconciler: reconciler._state().list_managed_containers(), found
+                )
+                load = {host: len(containers) for host, containers in listings.items()}
+        current = {}
+        for host, existing_map in found.items():
+            for instance_id in existing_map:
+                current.setdefault(instance_id, host)
+                # Deleted, or counted again wherever it is placed
+                load[host] = load.get(host, 0) - 1
+        placeable, errors = self._placeable(upserts, current, unreachable)
+        if unreachable:
+            hosts = ", ".join(unreachable)
+            errors += [f"Instance {instance_id} not deleted while {hosts} unreachable"
+                       for instance_id in deletes if instance_id not in current and instance_id not in upsert_ids]
+        groups = self.placement.assign(placeable, current, load)
+        placed = {spec.id: host for host, specs in groups.items() for spec in specs}
+
+        host_deletes = {host: [] for host in found}
+        for instance_id in conflicting:
+            # Only the upsert's host hears of it, and reports the conflict
+            if instance_id in placed:
+                host_deletes[placed[instance_id]].append(instance_id)
+        for host, existing_map in found.items():
+            for instance_id in existing_map:
+                if instance_id in conflicting:
+                    continue
+                # Deleted, or a stray copy of an instance placed elsewhere
+                if instance_id not in upsert_ids or placed[instance_id] != host:
+                    host_deletes[host].append(instance_id)
+        plans, failed = self._fan_out(
+            lambda host, reconciler: reconciler.diff_changes(
+                found[host], groups[host], host_deletes[host]
+            ), found
+        )
+        return ShardedPlan(plans, errors + self._host_errors(failed))
+
+    def _lookup(self, reconciler: Reconciler, instance_ids) -> Dict:
+        return reconciler._state().get_containers_by_ids(list(instance_ids)) if instance_ids else {}
+
+    @staticmethod
+    def _placeable(specs: List, current: Dict[str, str], unreachable: Dict) -> Tuple[List, List[str]]:
+        """
+        Specs that may be placed, and errors for those held back: with a host
+        unreachable, only those found running on a reachable host.
+        """
+        if not unreachable:
+            return list(specs), []
+        hosts = ", ".join(unreachable)
+        held = [spec.id for spec in specs if spec.id not in current]
+        return (
+            [spec for spec in specs if spec.id in current],
+            ShardedReconciler._host_errors(unreachable)
+            + [f"Instance {instance_id} not placed while {hosts} unreachable" for instance_id in held],
+        )
+
+    def _fan_out(self, call: Callable, hosts: Iterable[str] = None) -> Tuple[Dict, Dict]:
+        """
+        Run call(host, reconciler) for every host, or just those in hosts,
+        in parallel; returns host -> result for those that succeeded, and
+        host -> exception for those that failed.
+        """
+        futures = {
+            host: self._executor.submit(call, host, self.reconcilers[host])
+            for host in (self.reconcilers if hosts is None else hosts)
+        }
+        results, errors = {}, {}
+        for host, future in futures.items():
+            try:
+                results[host] = future.result()
+            except Exception as e:
+                logger.error(f"Docker host {host} failed: {e}")
+                errors[host] = e
+        return results, errors
+
+    @staticmethod
+    def _host_errors(errors: Dict) -> List[str]:
+        return [f"Docker host {host} unreachable: {error}" for host, error in errors.items()]
+
+    def _failed(self, error: Exception) -> Dict:
+        results = Reconciler._new_results()
+        results["errors"].append(f"Global reconciliation error: {error}")
+        return results
+
+
+class ShardedCache:
+    """
+    One view over a ContainerCache per host, for the servicer's status reads.
+
+    Watch subscriptions are fed by every host's cache. Reads skip a host
+    whose cache fails (stale, with its daemon unreachable), logging why.
+    """
+
+    def __init__(self, caches: Dict[str, ContainerCache]):
+        self.caches = caches
+
+    def list_managed_containers(self, query: StatusQuery = None) -> List:
+        containers = []
+        for host, cache in self.caches.items():
+            try:
+                containers.extend(cache.list_managed_containers(query))
+            except Exception as e:
+                logger.warning(f"Skipping containers on {host}: {e}")
+        return containers
+
+    def get_container_by_id(self, instance_id: str):
+        return self.get_containers_by_ids([instance_id]).get(instance_id)
+
+    def get_containers_by_ids(self, instance_ids: List[str]) -> Dict:
+        found = {}
+        for host, cache in self.caches.items():
+            missing = [instance_id for instance_id in instance_ids if instance_id not in found]
+            if not missing:
+                break
+            try:
+                found.update(cache.get_containers_by_ids(missing))
+            except Exception as e:
+                logger.warning(f"Skipping containers on {host}: {e}")
+        return found
+
+    def host_of(self, container) -> str:
+        """Host a container is on, or "" if no cache holds it (e.g. read past a stale cache)."""
+        for host, cache in self.caches.items():
+            if cache.holds(container.id):
+                return host
+        return ""
+
+    def subscribe(self, max_pending: int = None) -> Subscription:
+        subscription = Subscription(max_pending or settings.WATCH_MAX_PENDING)
+        for cache in self.caches.values():
+            cache.subscribe(subscription=subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for cache in self.caches.values():
+            cache.unsubscribe(subscription)
+
+    def start(self):
+        for cache in self.caches.values():
+            cache.start()
+
+    def stop(self):
+        for cache in self.caches.values():
+            cache.stop()
@@ -0,0 +1,51 @@
+import hashlib
+import json
+from typing import Dict
+from .config import settings
+
+TRANSMISSION_IMAGE = "linuxserver/transmission"
+
+# Label carrying the fingerprint of the spec a container was created from.
+# The version prefix lets the fingerprint's inputs change without every
+# existing container suddenly looking drifted. v2 leaves out resource
+# limits, which can be changed on a live container and are compared
+# against its HostConfig instead.
+SPEC_HASH_LABEL = "transctrl.spec-hash"
+SPEC_HASH_VERSION = "v2"
+
+# normalize_spec() fields that Docker can update in place
+LIVE_UPDATE_FIELDS = ("memory", "cpu_quota")
+
+def image_ref(image_tag: str) -> str:
+    """Full image reference for a Transmission image tag."""
+    return f"{TRANSMISSION_IMAGE}:{image_tag or 'latest'}"
+
+def parse_memory(mem_str: str) -> int:
+    """Parse memory string (e.g., 512m) to bytes."""
+    units = {"k": 1024, "m": 1024**2, "g": 1024**3}
+    unit = mem_str[-1].lower()
+    if unit in units:
+        return int(mem_str[:-1]) * units[unit]
+    return int(mem_str)
+
+def normalize_spec(spec) -> Dict:
+    """Container-relevant fields of an InstanceSpec, with defaults applied."""
+    return {
+        "config_path": spec.config_path,
+        "data_path": spec.data_path,
+        "watch_path": spec.watch_path,
+        "web_port": spec.web_port,
+        "data_port": spec.data_port,
+        "image": image_ref(spec.image_tag),
+        "memory": parse_memory(spec.resource_limits.memory or settings.DEFAULT_MEM_LIMIT),
+        "cpu_quota": spec.resource_limits.cpu_quota if spec.resource_limits.cpu_quota > 0 else settings.DEFAULT_CPU_QUOTA,
+    }
+
+def spec_fingerprint(spec) -> str:
+    """
+    Stable hash of the normalized spec, stamped on containers as
+    SPEC_HASH_LABEL. Covers only the fields that need a recreate to change.
+    """
+    fields = {k: v for k, v in normalize_spec(spec).items() if k not in LIVE_UPDATE_FIELDS}
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return f"{SPEC_HASH_VERSION}:{hashlib.sha256(canonical.encode()).hexdigest()}"
@@ -0,0 +1,111 @@
+import base64
+import binascii
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import transctrl_pb2
+
+# Docker container state -> Status; any other state is ERROR
+DOCKER_STATUSES = {
+    "running": transctrl_pb2.RUNNING,
+    "exited": transctrl_pb2.STOPPED,
+    "created": transctrl_pb2.CREATING,
+    "restarting": transctrl_pb2.CREATING,
+    "paused": transctrl_pb2.STOPPED,
+}
+# The remaining states Docker can filter on
+_ERROR_STATES = ("removing", "dead")
+
+STATUS_FIELDS = frozenset(transctrl_pb2.InstanceStatus.DESCRIPTOR.fields_by_name)
+
+
+def status_of(container) -> int:
+    return DOCKER_STATUSES.get(container.status, transctrl_pb2.ERROR)
+
+
+def mask_fields(field_mask) -> Optional[Set[str]]:
+    """InstanceStatus fields a FieldMask selects, id included; None if it is empty."""
+    if not field_mask.paths:
+        return None
+    unknown = set(field_mask.paths) - STATUS_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown InstanceStatus fields: {', '.join(sorted(unknown))}")
+    return set(field_mask.paths) | {"id"}
+
+
+def _instance_id(container) -> str:
+    return container.labels.get("transctrl.instance-id") or ""
+
+
+@dataclass
+class StatusQuery:
+    """The instances a GetStatus request selects, and the fields it wants of them."""
+    statuses: Set[int] = field(default_factory=set)
+    id_prefix: str = ""
+    labels: Dict[str, str] = field(default_factory=dict)
+    fields: Optional[Set[str]] = None  # None: every field
+
+    @classmethod
+    def from_request(cls, request) -> "StatusQuery":
+        """Raises ValueError for field mask paths InstanceStatus doesn't have."""
+        return cls(
+            statuses=set(request.statuses),
+            id_prefix=request.id_prefix,
+            labels=dict(request.labels),
+            fields=mask_fields(request.field_mask),
+        )
+
+    @property
+    def filtered(self) -> bool:
+        return bool(self.statuses or self.id_prefix or self.labels)
+
+    def docker_filters(self) -> Dict[str, List[str]]:
+        """Docker list filters narrowing a listing to (a superset of) the matches."""
+        filters = {}
+        if self.labels:
+            filters["label"] = [f"{key}={value}" for key, value in self.labels.items()]
+        if self.statuses:
+            states = [state for state, status in DOCKER_STATUSES.items() if status in self.statuses]
+            if transctrl_pb2.ERROR in self.statuses:
+                states.extend(_ERROR_STATES)
+            filters["status"] = states
+        return filters
+
+    def matches(self, container) -> bool:
+        if self.statuses and status_of(container) not in self.statuses:
+            return False
+        if self.id_prefix and not _instance_id(container).startswith(self.id_prefix):
+            return False
+        labels = container.labels
+        return all(labels.get(key) == value for key, value in self.labels.items())
+
+
+def decode_page_token(token: str) -> str:
+    """The instance ID a page token continues after; raises ValueError if malformed."""
+    if not token:
+        return ""
+    try:
+        return base64.urlsafe_b64decode(token.encode()).decode()
+    except (binascii.Error, UnicodeError):
+        raise ValueError("Malformed page_token")
+
+
+def page(containers: List, page_size: int, after: str = "") -> Tuple[List, str]:
+    """
+    The page of containers following instance ID after, in instance ID order,
+    and the token for the next page ("" after the last).
+
+    Pages are keyed on instance IDs rather than offsets, so instances added
+    or removed between calls don't shift later pages.
+    """
+    if after:
+        containers = [c for c in containers if _instance_id(c) > after]
+    if page_size <= 0:
+        return sorted(containers, key=_instance_id), ""
+    # Only order as many as the page needs
+    selected = heapq.nsmallest(page_size + 1, containers, key=_instance_id)
+    if len(selected) <= page_size:
+        return selected, ""
+    selected = selected[:page_size]
+    return selected, base64.urlsafe_b64encode(_instance_id(selected[-1]).encode()).decode()
@@ -1,45 +1,76 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
 # source: transctrl.proto
-# Protobuf Python Version: 4.25.0
+# Protobuf Python Version: 6.31.1
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
 from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'transctrl.proto'
+)
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ftransctrl.proto\x12\ttransctrl\x1a\x1fgoogle/protobuf/timestamp.proto\"\x07\n\x05\x45mpty\"\x18\n\nInstanceId\x12\n\n\x02id\x18\x01 \x01(\t\"3\n\x0eResourceLimits\x12\x0e\n\x06memory\x18\x01 \x01(\t\x12\x11\n\tcpu_quota\x18\x02 \x01(\x05\"\xc2\x01\n\x0cInstanceSpec\x12\n\n\x02id\x18\x01 \x01(\t\x12\x13\n\x0b\x63onfig_path\x18\x02 \x01(\t\x12\x11\n\tdata_path\x18\x03 \x01(\t\x12\x12\n\nwatch_path\x18\x04 \x01(\t\x12\x10\n\x08web_port\x18\x05 \x01(\x05\x12\x11\n\tdata_port\x18\x06 \x01(\x05\x12\x32\n\x0fresource_limits\x18\x07 \x01(\x0b\x32\x19.transctrl.ResourceLimits\x12\x11\n\timage_tag\x18\x08 \x01(\t\":\n\x0c\x44\x65siredState\x12*\n\tinstances\x18\x01 \x03(\x0b\x32\x17.transctrl.InstanceSpec\"\xcf\x01\n\x0eInstanceStatus\x12\n\n\x02id\x18\x01 \x01(\t\x12\x14\n\x0c\x63ontainer_id\x18\x02 \x01(\t\x12!\n\x06status\x18\x03 \x01(\x0e\x32\x11.transctrl.Status\x12\x15\n\rerror_message\x18\x04 \x01(\t\x12.\n\ncreated_at\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x17\n\x0f\x61\x63tual_web_port\x18\x06 \x01(\x05\x12\x18\n\x10\x61\x63tual_data_port\x18\x07 \x01(\x05\"<\n\x0c\x43urrentState\x12,\n\tinstances\x18\x01 \x03(\x0b\x32\x19.transctrl.InstanceStatus\"\xb1\x01\n\x0fReconcileResult\x12,\n\tinstances\x18\x01 \x03(\x0b\x32\x19.transctrl.InstanceStatus\x12\x15\n\rcreated_count\x18\x02 \x01(\x05\x12\x17\n\x0f\x64\x65stroyed_count\x18\x03 \x01(\x05\x12\x17\n\x0funchanged_count\x18\x04 \x01(\x05\x12\x17\n\x0frecreated_count\x18\x05 \x01(\x05\x12\x0e\n\x06\x65rrors\x18\x06 \x03(\t*;\n\x06Status\x12\x0b\n\x07RUNNING\x10\x00\x12\x0b\n\x07STOPPED\x10\x01\x12\x0c\n\x08\x43REATING\x10\x02\x12\t\n\x05\x45RROR\x10\x03\x32\xd3\x01\n\x16TransmissionController\x12@\n\tReconcile\x12\x17.transctrl.DesiredState\x1a\x1a.transctrl.ReconcileResult\x12\x36\n\tGetStatus\x12\x10.transctrl.Empty\x1a\x17.transctrl.CurrentState\x12?\n\x0bGetInstance\x12\x15.transctrl.InstanceId\x1a\x19.transctrl.InstanceStatusb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ftransctrl.proto\x12\ttransctrl\x1a google/protobuf/field_mask.proto\x1a\x1fgoogle/protobuf/timestamp.proto\"\x07\n\x05\x45mpty\"\x18\n\nInstanceId\x12\n\n\x02id\x18\x01 \x01(\t\"J\n\x0bInstanceIds\x12\x0b\n\x03ids\x18\x01 \x03(\t\x12.\n\nfield_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"3\n\x0eResourceLimits\x12\x0e\n\x06memory\x18\x01 \x01(\t\x12\x11\n\tcpu_quota\x18\x02 \x01(\x05\"\xd4\x01\n\x0cInstanceSpec\x12\n\n\x02id\x18\x01 \x01(\t\x12\x13\n\x0b\x63onfig_path\x18\x02 \x01(\t\x12\x11\n\tdata_path\x18\x03 \x01(\t\x12\x12\n\nwatch_path\x18\x04 \x01(\t\x12\x10\n\x08web_port\x18\x05 \x01(\x05\x12\x11\n\tdata_port\x18\x06 \x01(\x05\x12\x32\n\x0fresource_limits\x18\x07 \x01(\x0b\x32\x19.transctrl.ResourceLimits\x12\x11\n\timage_tag\x18\x08 \x01(\t\x12\x10\n\x08priority\x18\t \x01(\x05\"V\n\x0c\x44\x65siredState\x12*\n\tinstances\x18\x01 \x03(\x0b\x32\x17.transctrl.InstanceSpec\x12\x1a\n\x12\x63ontinuation_token\x18\x02 \x01(\t\"F\n\tChangeSet\x12(\n\x07upserts\x18\x01 \x03(\x0b\x32\x17.transctrl.InstanceSpec\x12\x0f\n\x07\x64\x65letes\x18\x02 \x03(\t\"\xae\x02\n\x0eInstanceStatus\x12\n\n\x02id\x18\x01 \x01(\t\x12\x14\n\x0c\x63ontainer_id\x18\x02 \x01(\t\x12!\n\x06status\x18\x03 \x01(\x0e\x32\x11.transctrl.Status\x12\x15\n\rerror_message\x18\x04 \x01(\t\x12.\n\ncreated_at\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x17\n\x0f\x61\x63tual_web_port\x18\x06 \x01(\x05\x12\x18\n\x10\x61\x63tual_data_port\x18\x07 \x01(\x05\x12\x0c\n\x04host\x18\x08 \x01(\t\x12\'\n\x05usage\x18\t \x01(\x0b\x32\x18.transctrl.ResourceUsage\x12&\n\x06health\x18\n \x01(\x0b\x32\x16.transctrl.HealthCheck\"\x88\x01\n\x0bHealthCheck\x12!\n\x06health\x18\x01 \x01(\x0e\x32\x11.transctrl.Health\x12\x17\n\x0flatency_seconds\x18\x02 \x01(\x01\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12.\n\nchecked_at\x18\x04 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\"\xf7\x01\n\rResourceUsage\x12\x13\n\x0b\x63pu_percent\x18\x01 \x01(\x01\x12\x14\n\x0cmemory_bytes\x18\x02 \x01(\x03\x12#\n\x1b\x62lock_read_bytes_per_second\x18\x03 \x01(\x01\x12$\n\x1c\x62lock_write_bytes_per_second\x18\x04 \x01(\x01\x12\x1f\n\x17net_rx_bytes_per_second\x18\x05 \x01(\x01\x12\x1f\n\x17net_tx_bytes_per_second\x18\x06 \x01(\x01\x12.\n\nsampled_at\x18\x07 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\"\x83\x02\n\rStatusRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\x12#\n\x08statuses\x18\x03 \x03(\x0e\x32\x11.transctrl.Status\x12\x11\n\tid_prefix\x18\x04 \x01(\t\x12\x34\n\x06labels\x18\x05 \x03(\x0b\x32$.transctrl.StatusRequest.LabelsEntry\x12.\n\nfield_mask\x18\x06 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x1a-\n\x0bLabelsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"!\n\x0cWatchRequest\x12\x11\n\tknown_ids\x18\x01 \x03(\t\"U\n\x0c\x43urrentState\x12,\n\tinstances\x18\x01 \x03(\x0b\x32\x19.transctrl.InstanceStatus\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"J\n\tInstances\x12,\n\tinstances\x18\x01 \x03(\x0b\x32\x19.transctrl.InstanceStatus\x12\x0f\n\x07missing\x18\x02 \x03(\t\"\x98\x02\n\x0fReconcileResult\x12,\n\tinstances\x18\x01 \x03(\x0b\x32\x19.transctrl.InstanceStatus\x12\x15\n\rcreated_count\x18\x02 \x01(\x05\x12\x17\n\x0f\x64\x65stroyed_count\x18\x03 \x01(\x05\x12\x17\n\x0funchanged_count\x18\x04 \x01(\x05\x12\x17\n\x0frecreated_count\x18\x05 \x01(\x05\x12\x0e\n\x06\x65rrors\x18\x06 \x03(\t\x12\x1a\n\x12image_pull_seconds\x18\x07 \x01(\x01\x12\x15\n\rupdated_count\x18\x08 \x01(\x05\x12\x16\n\x0e\x64\x65\x66\x65rred_count\x18\t \x01(\x05\x12\x1a\n\x12\x63ontinuation_token\x18\n \x01(\t*H\n\x06Status\x12\x0b\n\x07RUNNING\x10\x00\x12\x0b\n\x07STOPPED\x10\x01\x12\x0c\n\x08\x43REATING\x10\x02\x12\t\n\x05\x45RROR\x10\x03\x12\x0b\n\x07REMOVED\x10\x04*8\n\x06Health\x12\x12\n\x0eHEALTH_UNKNOWN\x10\x00\x12\x0b\n\x07HEALTHY\x10\x01\x12\r\n\tUNHEALTHY\x10\x02\x32\xa0\x03\n\x16TransmissionController\x12@\n\tReconcile\x12\x17.transctrl.DesiredState\x1a\x1a.transctrl.ReconcileResult\x12@\n\x0c\x41pplyChanges\x12\x14.transctrl.ChangeSet\x1a\x1a.transctrl.ReconcileResult\x12>\n\tGetStatus\x12\x18.transctrl.StatusRequest\x1a\x17.transctrl.CurrentState\x12?\n\x0bGetInstance\x12\x15.transctrl.InstanceId\x1a\x19.transctrl.InstanceStatus\x12<\n\x0cGetInstances\x12\x16.transctrl.InstanceIds\x1a\x14.transctrl.Instances\x12\x43\n\x0bWatchStatus\x12\x17.transctrl.WatchRequest\x1a\x19.transctrl.InstanceStatus0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'transctrl_pb2', _globals)
-if _descriptor._USE_C_DESCRIPTORS == False:
-  DESCRIPTOR._options = None
-  _globals['_STATUS']._serialized_start=860
-  _globals['_STATUS']._serialized_end=919
-  _globals['_EMPTY']._serialized_start=63
-  _globals['_EMPTY']._serialized_end=70
-  _globals['_INSTANCEID']._serialized_start=72
-  _globals['_INSTANCEID']._serialized_end=96
-  _globals['_RESOURCELIMITS']._serialized_start=98
-  _globals['_RESOURCELIMITS']._serialized_end=149
-  _globals['_INSTANCESPEC']._serialized_start=152
-  _globals['_INSTANCESPEC']._serialized_end=346
-  _globals['_DESIREDSTATE']._serialized_start=348
-  _globals['_DESIREDSTATE']._serialized_end=406
-  _globals['_INSTANCESTATUS']._serialized_start=409
-  _globals['_INSTANCESTATUS']._serialized_end=616
-  _globals['_CURRENTSTATE']._serialized_start=618
-  _globals['_CURRENTSTATE']._serialized_end=678
-  _globals['_RECONCILERESULT']._serialized_start=681
-  _globals['_RECONCILERESULT']._serialized_end=858
-  _globals['_TRANSMISSIONCONTROLLER']._serialized_start=922
-  _globals['_TRANSMISSIONCONTROLLER']._serialized_end=1133
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_STATUSREQUEST_LABELSENTRY']._loaded_options = None
+  _globals['_STATUSREQUEST_LABELSENTRY']._serialized_options = b'8\001'
+  _globals['_STATUS']._serialized_start=2073
+  _globals['_STATUS']._serialized_end=2145
+  _globals['_HEALTH']._serialized_start=2147
+  _globals['_HEALTH']._serialized_end=2203
+  _globals['_EMPTY']._serialized_start=97
+  _globals['_EMPTY']._serialized_end=104
+  _globals['_INSTANCEID']._serialized_start=106
+  _globals['_INSTANCEID']._serialized_end=130
+  _globals['_INSTANCEIDS']._serialized_start=132
+  _globals['_INSTANCEIDS']._serialized_end=206
+  _globals['_RESOURCELIMITS']._serialized_start=208
+  _globals['_RESOURCELIMITS']._serialized_end=259
+  _globals['_INSTANCESPEC']._serialized_start=262
+  _globals['_INSTANCESPEC']._serialized_end=474
+  _globals['_DESIREDSTATE']._serialized_start=476
+  _globals['_DESIREDSTATE']._serialized_end=562
+  _globals['_CHANGESET']._serialized_start=564
+  _globals['_CHANGESET']._serialized_end=634
+  _globals['_INSTANCESTATUS']._serialized_start=637
+  _globals['_INSTANCESTATUS']._serialized_end=939
+  _globals['_HEALTHCHECK']._serialized_start=942
+  _globals['_HEALTHCHECK']._serialized_end=1078
+  _globals['_RESOURCEUSAGE']._serialized_start=1081
+  _globals['_RESOURCEUSAGE']._serialized_end=1328
+  _globals['_STATUSREQUEST']._serialized_start=1331
+  _globals['_STATUSREQUEST']._serialized_end=1590
+  _globals['_STATUSREQUEST_LABELSENTRY']._serialized_start=1545
+  _globals['_STATUSREQUEST_LABELSENTRY']._serialized_end=1590
+  _globals['_WATCHREQUEST']._serialized_start=1592
+  _globals['_WATCHREQUEST']._serialized_end=1625
+  _globals['_CURRENTSTATE']._serialized_start=1627
+  _globals['_CURRENTSTATE']._serialized_end=1712
+  _globals['_INSTANCES']._serialized_start=1714
+  _globals['_INSTANCES']._serialized_end=1788
+  _globals['_RECONCILERESULT']._serialized_start=1791
+  _globals['_RECONCILERESULT']._serialized_end=2071
+  _globals['_TRANSMISSIONCONTROLLER']._serialized_start=2206
+  _globals['_TRANSMISSIONCONTROLLER']._serialized_end=2622
 # @@protoc_insertion_point(module_scope)
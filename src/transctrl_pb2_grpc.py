@@ -1,8 +1,28 @@
 # Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
 """Client and server classes corresponding to protobuf-defined services."""
 import grpc
+import warnings
 
-import transctrl_pb2 as transctrl__pb2
+from . import transctrl_pb2 as transctrl__pb2
+
+GRPC_GENERATED_VERSION = '1.76.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in transctrl_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
 
 
 class TransmissionControllerStub(object):
@@ -18,17 +38,32 @@ class TransmissionControllerStub(object):
                 '/transctrl.TransmissionController/Reconcile',
                 request_serializer=transctrl__pb2.DesiredState.SerializeToString,
                 response_deserializer=transctrl__pb2.ReconcileResult.FromString,
-                )
+                _registered_method=True)
+        self.ApplyChanges = channel.unary_unary(
+                '/transctrl.TransmissionController/ApplyChanges',
+                request_serializer=transctrl__pb2.ChangeSet.SerializeToString,
+                response_deserializer=transctrl__pb2.ReconcileResult.FromString,
+                _registered_method=True)
         self.GetStatus = channel.unary_unary(
                 '/transctrl.TransmissionController/GetStatus',
-                request_serializer=transctrl__pb2.Empty.SerializeToString,
+                request_serializer=transctrl__pb2.StatusRequest.SerializeToString,
                 response_deserializer=transctrl__pb2.CurrentState.FromString,
-                )
+                _registered_method=True)
         self.GetInstance = channel.unary_unary(
                 '/transctrl.TransmissionController/GetInstance',
                 request_serializer=transctrl__pb2.InstanceId.SerializeToString,
                 response_deserializer=transctrl__pb2.InstanceStatus.FromString,
-                )
+                _registered_method=True)
+        self.GetInstances = channel.unary_unary(
+                '/transctrl.TransmissionController/GetInstances',
+                request_serializer=transctrl__pb2.InstanceIds.SerializeToString,
+                response_deserializer=transctrl__pb2.Instances.FromString,
+                _registered_method=True)
+        self.WatchStatus = channel.unary_stream(
+                '/transctrl.TransmissionController/WatchStatus',
+                request_serializer=transctrl__pb2.WatchRequest.SerializeToString,
+                response_deserializer=transctrl__pb2.InstanceStatus.FromString,
+                _registered_method=True)
 
 
 class TransmissionControllerServicer(object):
@@ -40,6 +75,12 @@ class TransmissionControllerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ApplyChanges(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def GetStatus(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -52,6 +93,20 @@ class TransmissionControllerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetInstances(self, request, context):
+        """Many instances in one call, resolved from a single listing
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchStatus(self, request, context):
+        """Initial snapshot of every instance, then one message per change
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_TransmissionControllerServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -60,9 +115,14 @@ def add_TransmissionControllerServicer_to_server(servicer, server):
                     request_deserializer=transctrl__pb2.DesiredState.FromString,
                     response_serializer=transctrl__pb2.ReconcileResult.SerializeToString,
             ),
+            'ApplyChanges': grpc.unary_unary_rpc_method_handler(
+                    servicer.ApplyChanges,
+                    request_deserializer=transctrl__pb2.ChangeSet.FromString,
+                    response_serializer=transctrl__pb2.ReconcileResult.SerializeToString,
+            ),
             'GetStatus': grpc.unary_unary_rpc_method_handler(
                     servicer.GetStatus,
-                    request_deserializer=transctrl__pb2.Empty.FromString,
+                    request_deserializer=transctrl__pb2.StatusRequest.FromString,
                     response_serializer=transctrl__pb2.CurrentState.SerializeToString,
             ),
             'GetInstance': grpc.unary_unary_rpc_method_handler(
@@ -70,10 +130,21 @@ def add_TransmissionControllerServicer_to_server(servicer, server):
                     request_deserializer=transctrl__pb2.InstanceId.FromString,
                     response_serializer=transctrl__pb2.InstanceStatus.SerializeToString,
             ),
+            'GetInstances': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetInstances,
+                    request_deserializer=transctrl__pb2.InstanceIds.FromString,
+                    response_serializer=transctrl__pb2.Instances.SerializeToString,
+            ),
+            'WatchStatus': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchStatus,
+                    request_deserializer=transctrl__pb2.WatchRequest.FromString,
+                    response_serializer=transctrl__pb2.InstanceStatus.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'transctrl.TransmissionController', rpc_method_handlers)
     server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('transctrl.TransmissionController', rpc_method_handlers)
 
 
  # This class is part of an EXPERIMENTAL API.
@@ -91,11 +162,48 @@ class TransmissionController(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/transctrl.TransmissionController/Reconcile',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/transctrl.TransmissionController/Reconcile',
             transctrl__pb2.DesiredState.SerializeToString,
             transctrl__pb2.ReconcileResult.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ApplyChanges(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/transctrl.TransmissionController/ApplyChanges',
+            transctrl__pb2.ChangeSet.SerializeToString,
+            transctrl__pb2.ReconcileResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def GetStatus(request,
@@ -108,11 +216,21 @@ class TransmissionController(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/transctrl.TransmissionController/GetStatus',
-            transctrl__pb2.Empty.SerializeToString,
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/transctrl.TransmissionController/GetStatus',
+            transctrl__pb2.StatusRequest.SerializeToString,
             transctrl__pb2.CurrentState.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def GetInstance(request,
@@ -125,8 +243,72 @@ class TransmissionController(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/transctrl.TransmissionController/GetInstance',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/transctrl.TransmissionController/GetInstance',
             transctrl__pb2.InstanceId.SerializeToString,
             transctrl__pb2.InstanceStatus.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetInstances(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/transctrl.TransmissionController/GetInstances',
+            transctrl__pb2.InstanceIds.SerializeToString,
+            transctrl__pb2.Instances.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchStatus(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/transctrl.TransmissionController/WatchStatus',
+            transctrl__pb2.WatchRequest.SerializeToString,
+            transctrl__pb2.InstanceStatus.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,103 @@
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .specs import parse_memory
+
+INSTANCE_ID_PATTERN = re.compile(r"[a-zA-Z0-9_][a-zA-Z0-9_-]{0,63}")
+PATH_ATTRS = ("config_path", "data_path", "watch_path")
+
+
+class SpecValidator:
+    """
+    Validates whole requests of instance specs before anything is planned.
+
+    Mount path checks resolve symlinks, so a path only passes if it really
+    is under ALLOWED_MOUNT_BASE, and their outcomes are cached for ttl
+    seconds: the filesystem is only touched once per path per ttl however
+    many specs or requests mention it.
+    """
+
+    def __init__(self, allowed_base: str = None, ttl: float = None):
+        self.allowed_base = allowed_base or settings.ALLOWED_MOUNT_BASE
+        self.ttl = ttl if ttl is not None else settings.VALIDATION_CACHE_TTL
+        self._lock = threading.Lock()
+        self._paths: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def validate(self, specs: List) -> Dict[str, str]:
+        """Map of instance ID -> reason, for every invalid spec in specs."""
+        errors = {}
+        counts = Counter(spec.id for spec in specs)
+        for spec in specs:
+            if spec.id in errors:
+                continue
+            if counts[spec.id] > 1:
+                errors[spec.id] = f"Duplicate instance ID: {spec.id}"
+                continue
+            error = self.check(spec)
+            if error:
+                errors[spec.id] = error
+        return errors
+
+    def check(self, spec) -> Optional[str]:
+        """Why spec is invalid, or None."""
+        if not INSTANCE_ID_PATTERN.fullmatch(spec.id):
+            return f"Invalid instance ID: {spec.id}"
+
+        for path_attr in PATH_ATTRS:
+            error = self._check_path(getattr(spec, path_attr))
+            if error:
+                return f"{path_attr} {error}"
+
+        if not (1024 <= spec.web_port <= 65535):
+            return f"web_port out of range: {spec.web_port}"
+        if not (1024 <= spec.data_port <= 65535):
+            return f"data_port out of range: {spec.data_port}"
+        if spec.web_port == spec.data_port:
+            return "web_port and data_port must be different"
+
+        memory = spec.resource_limits.memory
+        if memory:
+            try:
+                valid = parse_memory(memory) > 0
+            except ValueError:
+                valid = False
+            if not valid:
+                return f"Invalid memory limit: {memory}"
+        if spec.resource_limits.cpu_quota < 0:
+            return f"cpu_quota must not be negative: {spec.resource_limits.cpu_quota}"
+        return None
+
+    def invalidate(self, path: str = None):
+        """Forget one cached path check, or all of them."""
+        with self._lock:
+            if path is None:
+                self._paths.clear()
+            else:
+                self._paths.pop(path, None)
+
+    def _check_path(self, path: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._paths.get(path)
+            if entry and entry[1] > now:
+                return entry[0]
+        error = self._resolve_path(path)
+        with self._lock:
+            self._paths[path] = (error, now + self.ttl)
+        return error
+
+    def _resolve_path(self, path: str) -> Optional[str]:
+        if not os.path.isabs(path):
+            return f"must be an absolute path: {path}"
+        base = os.path.realpath(self.allowed_base)
+        real = os.path.realpath(path)
+        if real != base and not real.startswith(base.rstrip(os.sep) + os.sep):
+            return f"must be under {self.allowed_base}: {path}"
+        if not os.path.exists(real):
+            return f"does not exist: {path}"
+        return None
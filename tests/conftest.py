@@ -0,0 +1,88 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src import transctrl_pb2
+from src.container_cache import ContainerCache
+from src.docker_client import DockerClient
+
+
+def make_spec(instance_id="test-1", web_port=9091, data_port=51413, **fields):
+    """An InstanceSpec with mount paths of its own; fields override the rest."""
+    spec = transctrl_pb2.InstanceSpec(
+        id=instance_id,
+        config_path=f"/mnt/configs/{instance_id}",
+        data_path=f"/mnt/data/{instance_id}",
+        watch_path=f"/mnt/watch/{instance_id}",
+        web_port=web_port,
+        data_port=data_port,
+        image_tag="latest",
+        resource_limits=transctrl_pb2.ResourceLimits(memory="512m", cpu_quota=50000),
+    )
+    for name, value in fields.items():
+        setattr(spec, name, value)
+    return spec
+
+
+def make_container(container_id, instance_id, status="running"):
+    """A running managed container, publishing the default ports."""
+    container = MagicMock()
+    container.id = container_id
+    container.status = status
+    container.labels = {"transctrl.managed": "true", "transctrl.instance-id": instance_id}
+    container.attrs = {"HostConfig": {"PortBindings": {
+        "9091/tcp": [{"HostPort": "9091"}],
+        "51413/tcp": [{"HostPort": "51413"}],
+    }}}
+    return container
+
+
+def container_for(spec, config_image="linuxserver/transmission:latest", image_id="sha256:aaa"):
+    """A managed container matching spec, as Docker would describe it."""
+    container = MagicMock()
+    container.labels = {"transctrl.instance-id": spec.id, "transctrl.managed": "true"}
+    container.attrs = {
+        "Image": image_id,
+        "Config": {"Image": config_image} if config_image else {},
+        "Mounts": [
+            {"Destination": "/config", "Source": spec.config_path},
+            {"Destination": "/downloads", "Source": spec.data_path},
+            {"Destination": "/watch", "Source": spec.watch_path},
+        ],
+        "HostConfig": {
+            "PortBindings": {
+                "9091/tcp": [{"HostPort": str(spec.web_port)}],
+                "51413/tcp": [{"HostPort": str(spec.data_port)}],
+            },
+            "Memory": 512 * 1024**2,
+            "CpuQuota": 50000,
+        },
+    }
+    return container
+
+
+@pytest.fixture
+def mock_docker_client():
+    return MagicMock(spec=DockerClient)
+
+
+@pytest.fixture
+def servicer(mock_docker_client):
+    from src import server
+
+    with patch.object(server, "DockerClient", return_value=mock_docker_client), \
+         patch.object(ContainerCache, "start"):
+        servicer = server.TransmissionControllerServicer()
+    mock_docker_client.list_managed_containers.return_value = []
+    servicer.container_cache.resync()
+    servicer.container_cache._connected = True
+    return servicer
+
+
+@pytest.fixture
+def context():
+    context = MagicMock()
+    context.is_active.return_value = True
+    context.time_remaining.return_value = None
+    context.abort.side_effect = Exception("aborted")
+    return context
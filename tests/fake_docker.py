@@ -0,0 +1,375 @@
+"""
+In-memory stand-in for the Docker Engine API, served over a Unix socket.
+
+Implements the endpoints DockerClient, AsyncDockerClient and ContainerCache
+use, closely enough for docker-py to drive it unmodified. Every request can
+be delayed by a fixed latency to model a real daemon, and is counted per
+endpoint so tests and benchmarks can assert on API call volume.
+
+    with FakeDockerDaemon(socket_path, latency=0.001) as daemon:
+        settings.DOCKER_HOST = daemon.url
+        ...
+        daemon.calls["POST /containers/{id}/start"]
+"""
+import hashlib
+import itertools
+import json
+import os
+import queue
+import re
+import socketserver
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+API_VERSION = "1.41"
+
+
+class FakeDockerDaemon:
+    def __init__(self, socket_path: str, latency: float = 0.0,
+                 images=("linuxserver/transmission:latest",)):
+        self.socket_path = socket_path
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.connections = 0  # accepted so far; keep-alive clients reuse theirs
+        self.containers: Dict[str, Dict] = {}
+        self.images: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        self._ports: Dict[str, str] = {}  # host port -> running container ID
+        for ref in images:
+            self.add_image(ref)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers: List[queue.Queue] = []
+        self._stopping = threading.Event()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"unix://{self.socket_path}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.daemon = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="fake-docker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def add_image(self, ref: str) -> str:
+        image_id = "sha256:" + hashlib.sha256(ref.encode()).hexdigest()
+        self.images[ref] = image_id
+        return image_id
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    # Engine API, one method per endpoint. Each returns (status, payload).
+
+    def ping(self, query, body):
+        return 200, "OK"
+
+    def version(self, query, body):
+        return 200, {"ApiVersion": API_VERSION, "MinAPIVersion": "1.24", "Version": "fake"}
+
+    def list_containers(self, query, body):
+        filters = json.loads(query.get("filters", "{}"))
+        labels = filters.get("label", [])
+        if isinstance(labels, dict):  # {"key=value": true} form
+            labels = list(labels)
+        with self._lock:
+            matches = [c for c in self.containers.values() if _has_labels(c, labels)]
+            if filters.get("status"):
+                matches = [c for c in matches if c["State"]["Status"] in filters["status"]]
+            if query.get("all") not in ("1", "true", "True"):
+                matches = [c for c in matches if c["State"]["Running"]]
+            return 200, [{
+                "Id": c["Id"],
+                "Names": [c["Name"]],
+                "Image": c["Config"]["Image"],
+                "Labels": c["Config"]["Labels"],
+                "State": c["State"]["Status"],
+            } for c in matches]
+
+    def create_container(self, query, body):
+        name = "/" + query.get("name", "")
+        with self._lock:
+            if body["Image"] not in self.images:
+                return 404, {"message": f"No such image: {body['Image']}"}
+            if name in self._names:
+                return 409, {"message": f'Conflict. The container name "{name}" is already in use'}
+            container_id = hashlib.sha256(str(next(self._ids)).encode()).hexdigest()
+            host_config = body.get("HostConfig", {})
+            self.containers[container_id] = {
+                "Id": container_id,
+                "Name": name,
+                "Created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "Image": self.images[body["Image"]],
+                "Config": {
+                    "Image": body["Image"],
+                    "Labels": body.get("Labels") or {},
+                    "Env": body.get("Env") or [],
+                    "ExposedPorts": body.get("ExposedPorts") or {},
+                },
+                "HostConfig": host_config,
+                "Mounts": [_mount(bind) for bind in host_config.get("Binds") or []],
+                "State": {"Status": "created", "Running": False},
+            }
+            self._names[name] = container_id
+        self._emit("create", container_id)
+        return 201, {"Id": container_id, "Warnings": []}
+
+    def inspect_container(self, query, body, container_id):
+        with self._lock:
+            container = self._find(container_id)
+            if container is None:
+                return 404, {"message": f"No such container: {container_id}"}
+            return 200, container
+
+    def start_container(self, query, body, container_id):
+        with self._lock:
+            container = self._find(container_id)
+            if container is None:
+                return 404, {"message": f"No such container: {container_id}"}
+            if container["State"]["Running"]:
+                return 304, None
+            for port in _host_ports(container):
+                if port in self._ports:
+                    return 500, {"message": "driver failed programming external connectivity: "
+                                            f"Bind for 0.0.0.0:{port} failed: port is already allocated"}
+            for port in _host_ports(container):
+                self._ports[port] = container["Id"]
+            container["State"] = {"Status": "running", "Running": True}
+        self._emit("start", container["Id"])
+        return 204, None
+
+    def stop_container(self, query, body, container_id):
+        with self._lock:
+            container = self._find(container_id)
+            if container is None:
+                return 404, {"message": f"No such container: {container_id}"}
+            if not container["State"]["Running"]:
+                return 304, None
+            container["State"] = {"Status": "exited", "Running": False}
+            self._release_ports(container)
+        self._emit("die", container["Id"])
+        self._emit("stop", container["Id"])
+        return 204, None
+
+    def update_container(self, query, body, container_id):
+        with self._lock:
+            container = self._find(container_id)
+            if container is None:
+                return 404, {"message": f"No such container: {container_id}"}
+            for key in ("Memory", "MemorySwap", "CpuQuota"):
+                if key in body:
+                    container["HostConfig"][key] = body[key]
+        self._emit("update", container["Id"])
+        return 200, {"Warnings": []}
+
+    def remove_container(self, query, body, container_id):
+        with self._lock:
+            container = self._find(container_id)
+            if container is None:
+                return 404, {"message": f"No such container: {container_id}"}
+            if container["State"]["Running"] and query.get("force") not in ("1", "true", "True"):
+                return 409, {"message": "You cannot remove a running container"}
+            self._release_ports(container)
+            del self.containers[container["Id"]]
+            del self._names[container["Name"]]
+        self._emit("destroy", container["Id"], container)
+        return 204, None
+
+    def inspect_image(self, query, body, ref):
+        with self._lock:
+            image_id = self.images.get(ref)
+        if image_id is None:
+            return 404, {"message": f"No such image: {ref}"}
+        return 200, {"Id": image_id, "RepoTags": [ref]}
+
+    def pull_image(self, query, body):
+        ref = f"{query['fromImage']}:{query.get('tag') or 'latest'}"
+        with self._lock:
+            self.add_image(ref)
+        return 200, {"status": f"Downloaded newer image for {ref}"}
+
+    def _find(self, key: str) -> Optional[Dict]:
+        # Docker accepts an ID, a unique ID prefix or a name
+        container_id = key if key in self.containers else self._names.get("/" + key)
+        if container_id is not None:
+            return self.containers[container_id]
+        for container in self.containers.values():
+            if container["Id"].startswith(key):
+                return container
+        return None
+
+    def _release_ports(self, container: Dict):
+        for port in _host_ports(container):
+            if self._ports.get(port) == container["Id"]:
+                del self._ports[port]
+
+    def _emit(self, action: str, container_id: str, container: Dict = None):
+        if container is None:
+            with self._lock:
+                container = self.containers.get(container_id)
+        labels = container["Config"]["Labels"] if container else {}
+        event = {
+            "Type": "container", "Action": action, "status": action, "id": container_id,
+            "Actor": {"ID": container_id, "Attributes": dict(labels)},
+            "time": int(time.time()), "timeNano": time.time_ns(),
+        }
+        for subscriber in list(self._subscribers):
+            subscriber.put(event)
+
+
+ROUTES = [
+    ("GET", re.compile(r"/_ping"), "ping"),
+    ("GET", re.compile(r"/version"), "version"),
+    ("GET", re.compile(r"/containers/json"), "list_containers"),
+    ("POST", re.compile(r"/containers/create"), "create_container"),
+    ("GET", re.compile(r"/containers/([^/]+)/json"), "inspect_container"),
+    ("POST", re.compile(r"/containers/([^/]+)/start"), "start_container"),
+    ("POST", re.compile(r"/containers/([^/]+)/stop"), "stop_container"),
+    ("POST", re.compile(r"/containers/([^/]+)/update"), "update_container"),
+    ("DELETE", re.compile(r"/containers/([^/]+)"), "remove_container"),
+    ("GET", re.compile(r"/images/(.+)/json"), "inspect_image"),
+    ("POST", re.compile(r"/images/create"), "pull_image"),
+]
+
+
+def _has_labels(container: Dict, filters: List[str]) -> bool:
+    labels = container["Config"]["Labels"]
+    for label in filters:
+        key, sep, value = label.partition("=")
+        if key not in labels or (sep and labels[key] != value):
+            return False
+    return True
+
+
+def _mount(bind: str) -> Dict:
+    source, destination, *mode = bind.split(":")
+    return {"Type": "bind", "Source": source, "Destination": destination,
+            "Mode": mode[0] if mode else "", "RW": "ro" not in mode}
+
+
+def _host_ports(container: Dict) -> List[str]:
+    bindings = container["HostConfig"].get("PortBindings") or {}
+    return [b["HostPort"] for entries in bindings.values() for b in entries or [] if b.get("HostPort")]
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Unix sockets refuse connects (EAGAIN) once the backlog is full
+    request_queue_size = 128
+    daemon: FakeDockerDaemon = None
+
+    def get_request(self):
+        request, _ = super().get_request()
+        self.daemon.connections += 1
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("docker", 0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_DELETE(self):
+        self._dispatch()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        daemon = self.server.daemon
+        url = urlsplit(self.path)
+        path = re.sub(r"^/v[0-9.]+", "", unquote(url.path))
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        if self.command == "GET" and path == "/events":
+            daemon.calls["GET /events"] += 1
+            self._stream_events(daemon)
+            return
+
+        for method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(path)
+            if method == self.command and match:
+                endpoint = f"{method} {_template(pattern.pattern)}"
+                daemon.calls[endpoint] += 1
+                if daemon.latency:
+                    time.sleep(daemon.latency)
+                status, payload = getattr(daemon, handler)(query, body, *match.groups())
+                break
+        else:
+            status, payload = 404, {"message": f"page not found: {self.command} {path}"}
+        self._send(status, payload)
+
+    def _send(self, status: int, payload):
+        self.send_response(status)
+        if status in (204, 304):
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if isinstance(payload, str):
+            data, content_type = payload.encode(), "text/plain"
+        else:
+            data, content_type = json.dumps(payload).encode(), "application/json"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_events(self, daemon: FakeDockerDaemon):
+        events = queue.Queue()
+        daemon._subscribers.append(events)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+            while not daemon._stopping.is_set():
+                try:
+                    event = events.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                data = json.dumps(event).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            daemon._subscribers.remove(events)
+            self.close_connection = True
+
+
+def _template(pattern: str) -> str:
+    return pattern.replace("([^/]+)", "{id}").replace("(.+)", "{name}")
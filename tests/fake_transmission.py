@@ -0,0 +1,59 @@
+"""
+A fake Transmission RPC endpoint for exercising HealthProber.
+
+Speaks just enough HTTP/1.1 over TCP on 127.0.0.1: requests without the
+current X-Transmission-Session-Id get 409 handing it out, others 200.
+Set `wedged` to accept connections and never answer, or `delay` to answer
+slowly. Runs on the caller's event loop.
+"""
+import asyncio
+import json
+
+
+class FakeTransmission:
+    def __init__(self, session_id: str = "abc123"):
+        self.session_id = session_id
+        self.wedged = False
+        self.delay = 0.0
+        self.requests = []  # session ID sent with each request
+        self.open = 0
+        self.peak_open = 0
+        self.port = None
+        self._server = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+
+    async def _handle(self, reader, writer):
+        self.open += 1
+        self.peak_open = max(self.peak_open, self.open)
+        try:
+            await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                key, _, value = line.decode().partition(":")
+                headers[key.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers.get("content-length", 0)))
+            self.requests.append(headers.get("x-transmission-session-id"))
+            if self.wedged:
+                await asyncio.sleep(3600)
+            await asyncio.sleep(self.delay)
+            if headers.get("x-transmission-session-id") != self.session_id:
+                status, extra, body = 409, f"X-Transmission-Session-Id: {self.session_id}\r\n", b""
+            else:
+                status, extra = 200, ""
+                body = json.dumps({"result": "success", "arguments": {"version": "4.0.6"}}).encode()
+            writer.write(
+                f"HTTP/1.1 {status} X\r\n{extra}Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self.open -= 1
+            writer.close()
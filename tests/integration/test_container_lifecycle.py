@@ -16,7 +16,6 @@ import os
 
 # Add paths for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
 
 from src import transctrl_pb2
 from src import transctrl_pb2_grpc
@@ -120,7 +119,7 @@ class TestContainerStatus:
         # Give container a moment to start
         time.sleep(2)
 
-        status = client.GetStatus(transctrl_pb2.Empty())
+        status = client.GetStatus(transctrl_pb2.StatusRequest())
         for instance in status.instances:
             print(f"[test] Status check: id={instance.id}, status={transctrl_pb2.Status.Name(instance.status)}")
 
@@ -131,6 +130,22 @@ class TestContainerStatus:
         assert instance.actual_web_port == 19091
         assert instance.actual_data_port == 61413
 
+    def test_get_status_filters_and_masks_fields(self, client, clean_state):
+        """GetStatus should apply the id prefix and fill only the masked fields."""
+        spec = create_instance_spec("test-status-1")
+        client.Reconcile(transctrl_pb2.DesiredState(instances=[spec]))
+        time.sleep(2)
+
+        request = transctrl_pb2.StatusRequest(id_prefix="test-status-", page_size=10)
+        request.field_mask.paths.append("status")
+        status = client.GetStatus(request)
+
+        assert [instance.id for instance in status.instances] == ["test-status-1"]
+        assert status.instances[0].actual_web_port == 0
+        assert status.next_page_token == ""
+
+        assert client.GetStatus(transctrl_pb2.StatusRequest(id_prefix="nobody-")).instances == []
+
     def test_get_instance_by_id(self, client, clean_state):
         """GetInstance should return specific container info."""
         spec = create_instance_spec("test-get-1")
@@ -163,7 +178,7 @@ class TestContainerDestruction:
         time.sleep(1)
 
         # Verify it exists
-        status = client.GetStatus(transctrl_pb2.Empty())
+        status = client.GetStatus(transctrl_pb2.StatusRequest())
         assert len(status.instances) == 1
 
         # Reconcile with empty list should destroy it
@@ -174,7 +189,7 @@ class TestContainerDestruction:
         assert result.created_count == 0
 
         # Verify it's gone
-        status = client.GetStatus(transctrl_pb2.Empty())
+        status = client.GetStatus(transctrl_pb2.StatusRequest())
         assert len(status.instances) == 0
 
 
@@ -199,7 +214,7 @@ class TestContainerRecreation:
         assert result.recreated_count == 1
 
         # Verify new port
-        status = client.GetStatus(transctrl_pb2.Empty())
+        status = client.GetStatus(transctrl_pb2.StatusRequest())
         assert len(status.instances) == 1
         assert status.instances[0].actual_web_port == 19099
 
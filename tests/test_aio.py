@@ -0,0 +1,208 @@
+import asyncio
+import json
+import threading
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.aio_docker import AsyncDockerClient, ContainerRecord, NotFound
+from src.aio_reconciler import AsyncReconciler
+from src.docker_client import DockerClient
+from conftest import make_spec
+
+
+class FakeEngine:
+    """Just enough of the Engine API, over a Unix socket, to drive AsyncDockerClient."""
+
+    def __init__(self):
+        self.requests = []
+        self.connections = 0
+        self.containers = {}
+        self.images = set()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, _ = request_line.decode().split(" ")
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                key, _, value = line.decode().partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            path = target.split("?")[0].split("/", 2)[2]
+            self.requests.append((method, "/" + path))
+            status, payload = self.route(method, "/" + path, json.loads(body) if body else None)
+            data = json.dumps(payload).encode()
+            # Lists come back chunked, everything else with a Content-Length
+            if path == "containers/json":
+                framed = b"Transfer-Encoding: chunked\r\n\r\n" + b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data)
+            else:
+                framed = b"Content-Length: %d\r\n\r\n%s" % (len(data), data)
+            writer.write(b"HTTP/1.1 %d X\r\nContent-Type: application/json\r\n%s" % (status, framed))
+            await writer.drain()
+        writer.close()
+
+    def route(self, method, path, body):
+        parts = path.strip("/").split("/")
+        if path == "/containers/json":
+            return 200, [{"Id": id} for id in self.containers]
+        if path == "/containers/create":
+            if body["Image"] not in self.images:
+                return 404, {"message": "No such image"}
+            id = f"c{len(self.containers)}"
+            self.containers[id] = {"Id": id, "Config": {"Labels": body["Labels"], "Image": body["Image"]},
+                                   "HostConfig": body["HostConfig"], "State": {"Status": "created"}}
+            return 201, {"Id": id}
+        if path == "/images/create":
+            self.images.add("linuxserver/transmission:latest")
+            return 200, {"status": "Downloaded"}
+        if parts[0] == "containers" and parts[1] not in self.containers:
+            return 404, {"message": "No such container"}
+        if parts[-1] == "json":
+            return 200, self.containers[parts[1]]
+        if parts[-1] == "start":
+            self.containers[parts[1]]["State"]["Status"] = "running"
+        if method == "DELETE":
+            del self.containers[parts[1]]
+        return 204, None
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return FakeEngine(), f"unix://{tmp_path}/docker.sock"
+
+
+def run_with_engine(engine, scenario):
+    fake, url = engine
+
+    async def main():
+        server = await asyncio.start_unix_server(fake.handle, path=url[len("unix://"):])
+        client = AsyncDockerClient(base_url=url, max_connections=4, timeout=5)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+            server.close()
+
+    return asyncio.run(main())
+
+
+def test_create_pulls_missing_image_and_starts(engine):
+    fake, _ = engine
+
+    async def scenario(client):
+        container = await client.create_container(make_spec())
+        return container, await client.list_managed_containers()
+
+    container, listed = run_with_engine(engine, scenario)
+
+    assert container.status == "running"
+    assert container.labels["transctrl.instance-id"] == "test-1"
+    assert container.attrs["HostConfig"]["PortBindings"]["9091/tcp"][0]["HostPort"] == "9091"
+    assert container.attrs["HostConfig"]["Memory"] == 512 * 1024**2
+    assert [c.id for c in listed] == [container.id]
+    assert ("POST", "/images/create") in fake.requests
+
+
+def test_requests_reuse_keep_alive_connections(engine):
+    fake, _ = engine
+    fake.containers = {f"c{i}": {"Id": f"c{i}", "State": {"Status": "running"}} for i in range(20)}
+
+    async def scenario(client):
+        for _ in range(3):
+            await client.list_managed_containers()
+
+    run_with_engine(engine, scenario)
+
+    assert len(fake.requests) == 63
+    assert fake.connections <= 4
+
+
+def test_remove_and_not_found(engine):
+    fake, _ = engine
+    fake.containers = {"c0": {"Id": "c0", "Config": {"Labels": {"transctrl.managed": "true"}}}}
+
+    async def scenario(client):
+        await client.remove_container(ContainerRecord(fake.containers["c0"]))
+        with pytest.raises(NotFound):
+            await client.get_container("c0")
+
+    run_with_engine(engine, scenario)
+    assert fake.containers == {}
+
+
+def test_async_reconciler_runs_actions_concurrently():
+    aio_docker = MagicMock()
+    aio_docker.list_managed_containers = AsyncMock(return_value=[])
+    aio_docker.get_image_id = AsyncMock(return_value="sha256:aaa")
+    in_flight = peak = 0
+
+    async def create(spec):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    aio_docker.create_container = create
+    specs = [make_spec(f"test-{i}", 9091 + i, 19091 + i) for i in range(10)]
+
+    async def main():
+        reconciler = AsyncReconciler(MagicMock(spec=DockerClient), aio_docker, concurrency=4)
+        with patch("os.path.exists", return_value=True):
+            return await reconciler.reconcile(specs)
+
+    results = asyncio.run(main())
+
+    assert results["created_count"] == 10
+    assert results["errors"] == []
+    assert peak == 4
+
+
+def test_async_reconciler_pulls_each_missing_image_once():
+    aio_docker = MagicMock()
+    aio_docker.list_managed_containers = AsyncMock(return_value=[])
+    pulled = set()
+    aio_docker.get_image_id = AsyncMock(side_effect=lambda ref: "sha256:aaa" if ref in pulled else None)
+    aio_docker.pull_image = AsyncMock(side_effect=pulled.add)
+    aio_docker.create_container = AsyncMock()
+    specs = [make_spec(f"test-{i}", 9091 + i, 19091 + i) for i in range(5)]
+
+    async def main():
+        reconciler = AsyncReconciler(MagicMock(spec=DockerClient), aio_docker)
+        with patch("os.path.exists", return_value=True):
+            return await asyncio.gather(reconciler.reconcile(specs[:3]), reconciler.reconcile(specs[3:]))
+
+    for results in asyncio.run(main()):
+        assert results["errors"] == []
+    aio_docker.pull_image.assert_awaited_once_with("linuxserver/transmission:latest")
+
+
+def test_async_reconciler_diffs_off_the_event_loop():
+    aio_docker = MagicMock()
+    aio_docker.list_managed_containers = AsyncMock(return_value=[])
+    aio_docker.get_containers_by_ids = AsyncMock(return_value={})
+    reconciler = AsyncReconciler(MagicMock(spec=DockerClient), aio_docker)
+    threads = []
+
+    def record(method):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+        return wrapper
+
+    reconciler.diff = record(reconciler.diff)
+    reconciler.diff_changes = record(reconciler.diff_changes)
+
+    async def main():
+        with patch("os.path.exists", return_value=True):
+            await reconciler.plan([make_spec("test-1")])
+            await reconciler.plan_changes([make_spec("test-2")], ["test-3"])
+
+    asyncio.run(main())
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+    aio_docker.get_containers_by_ids.assert_awaited_once()
+    assert sorted(aio_docker.get_containers_by_ids.call_args.args[0]) == ["test-2", "test-3"]
@@ -0,0 +1,77 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from src.audit import AuditLogger, _RotatingFileSink
+from src.docker_client import DockerClient
+from src.reconciler import Reconciler
+from conftest import container_for, make_spec
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_written_in_order(tmp_path):
+    path = tmp_path / "audit.log"
+    audit = AuditLogger(path=str(path))
+    audit.start()
+
+    audit.log("reconcile", details={"instance_count": 2}, correlation_id="c1")
+    audit.log("create", instance_id="user-1", details={"outcome": "ok"}, correlation_id="c1")
+    audit.close()
+
+    records = read_records(path)
+    assert [(r["event"], r["correlation_id"]) for r in records] == [("reconcile", "c1"), ("create", "c1")]
+    assert records[1]["instance_id"] == "user-1"
+    assert audit.written == 2
+
+
+def test_full_queue_drops_records(tmp_path):
+    path = tmp_path / "audit.log"
+    audit = AuditLogger(path=str(path), max_queue=2, policy="drop")
+
+    for i in range(3):
+        audit.log("reconcile", details={"i": i})
+    audit.start()
+    audit.close()
+
+    assert audit.dropped == 1
+    assert [r["details"]["i"] for r in read_records(path)] == [0, 1]
+
+
+def test_file_rolls_over_past_max_bytes(tmp_path):
+    path = tmp_path / "audit.log"
+    sink = _RotatingFileSink(str(path), max_bytes=250, backups=2)
+    for i in range(5):
+        sink.write(f"{i}" * 99 + "\n")
+    sink.close()
+
+    assert [(tmp_path / name).read_text()[0] for name in ("audit.log", "audit.log.1", "audit.log.2")] == ["4", "2", "0"]
+    assert not (tmp_path / "audit.log.3").exists()
+
+
+def test_each_action_is_audited_under_the_correlation_id():
+    docker_client = MagicMock(spec=DockerClient)
+    stale = container_for(make_spec("old"))
+    docker_client.list_managed_containers.return_value = [stale]
+
+    def create_container(spec):
+        if spec.id == "b":
+            raise RuntimeError("boom")
+        return MagicMock()
+
+    docker_client.create_container.side_effect = create_container
+
+    with patch("src.reconciler.log_event") as log_event, patch("os.path.exists", return_value=True):
+        Reconciler(docker_client).reconcile(
+            [make_spec("a", 9000, 19000), make_spec("b", 9001, 19001)], correlation_id="c1"
+        )
+
+    records = sorted((call.args[0], call.args[1], call.args[2]["outcome"], call.args[3])
+                     for call in log_event.call_args_list)
+    assert records == [
+        ("create", "a", "ok", "c1"),
+        ("create", "b", "error", "c1"),
+        ("destroy", "old", "ok", "c1"),
+    ]
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import grpc
+
+from client._stubs import desired_state
+from client.aio_client import AsyncTransmissionControllerClient
+from src import transctrl_pb2, transctrl_pb2_grpc
+
+
+class ScriptedServicer(transctrl_pb2_grpc.TransmissionControllerServicer):
+    """Fails the first `failures` calls of each RPC, then answers."""
+
+    def __init__(self, failures=0, retry_after=None):
+        self.failures = failures
+        self.retry_after = retry_after
+        self.calls = {}
+        self.known_ids = []  # per WatchStatus call
+
+    async def _fail(self, method, context, code=grpc.StatusCode.RESOURCE_EXHAUSTED):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.calls[method] <= self.failures:
+            if self.retry_after is not None:
+                context.set_trailing_metadata((("retry-after", str(self.retry_after)),))
+            await context.abort(code, "try again")
+
+    async def Reconcile(self, request, context):
+        await self._fail("Reconcile", context)
+        return transctrl_pb2.ReconcileResult(created_count=len(request.instances))
+
+    async def GetInstance(self, request, context):
+        return transctrl_pb2.InstanceStatus(id=request.id)
+
+    async def WatchStatus(self, request, context):
+        self.calls["WatchStatus"] = self.calls.get("WatchStatus", 0) + 1
+        self.known_ids.append(list(request.known_ids))
+        yield transctrl_pb2.InstanceStatus(id=f"pass-{self.calls['WatchStatus']}")
+        if self.calls["WatchStatus"] <= self.failures:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "restarting")
+
+
+def run(servicer, tmp_path, use):
+    async def main():
+        socket_path = str(tmp_path / "transctrl.sock")
+        server = grpc.aio.server()
+        transctrl_pb2_grpc.add_TransmissionControllerServicer_to_server(servicer, server)
+        server.add_insecure_port(f"unix:{socket_path}")
+        await server.start()
+        try:
+            async with AsyncTransmissionControllerClient(socket_path, base_delay=0.001) as client:
+                return await use(client)
+        finally:
+            await server.stop(None)
+    return asyncio.run(main())
+
+
+def spec_dict(i):
+    return {
+        "id": f"user-{i}", "config_path": f"/mnt/configs/{i}", "data_path": f"/mnt/data/{i}",
+        "watch_path": f"/mnt/watch/{i}", "web_port": 9000 + i, "data_port": 50000 + i,
+        "resource_limits": {"memory": "512m", "cpu_quota": 50000},
+    }
+
+
+def test_rate_limited_calls_wait_out_retry_after(tmp_path):
+    servicer = ScriptedServicer(failures=2, retry_after=0.05)
+    started = time.monotonic()
+
+    result = run(servicer, tmp_path, lambda client: client.reconcile([spec_dict(1), spec_dict(2)]))
+
+    assert result.created_count == 2
+    assert servicer.calls["Reconcile"] == 3
+    assert time.monotonic() - started >= 0.1
+
+
+def test_concurrent_calls_share_the_channel(tmp_path):
+    async def use(client):
+        return await asyncio.gather(*(client.get_instance(f"user-{i}") for i in range(50)))
+
+    statuses = run(ScriptedServicer(), tmp_path, use)
+    assert [s.id for s in statuses] == [f"user-{i}" for i in range(50)]
+
+
+def test_watch_reconnects_after_unavailable(tmp_path):
+    async def use(client):
+        return [status.id async for status in client.watch()]
+
+    servicer = ScriptedServicer(failures=1)
+    assert run(servicer, tmp_path, use) == ["pass-1", "pass-2"]
+    # The new stream is told what the dropped one had sent
+    assert servicer.known_ids == [[], ["pass-1"]]
+
+
+def test_bulk_desired_state_matches_spec_by_spec():
+    items = [spec_dict(i) for i in range(100)]
+    one_by_one = transctrl_pb2.DesiredState(instances=[transctrl_pb2.InstanceSpec(**item) for item in items])
+
+    assert desired_state(items) == one_by_one
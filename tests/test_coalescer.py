@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.coalescer import AsyncReconcileCoalescer, ReconcileCoalescer
+
+
+def spec(instance_id, web_port=9091):
+    return SimpleNamespace(id=instance_id, web_port=web_port)
+
+
+class RecordingReconciler:
+    """Records passes; each pass blocks until released when gated."""
+
+    def __init__(self, gated=False):
+        self.passes = []
+        self.unfinished = set()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not gated:
+            self.release.set()
+
+    def reconcile(self, desired_instances, plan=None, correlation_id=None, deadline=None):
+        return self._pass("reconcile", [(s.id, s.web_port) for s in desired_instances], plan)
+
+    def apply_changes(self, upserts, deletes, plan=None, correlation_id=None, deadline=None):
+        return self._pass("apply_changes", ([(s.id, s.web_port) for s in upserts], list(deletes)), plan)
+
+    def _pass(self, kind, request, plan):
+        self.passes.append((kind, request, plan))
+        self.started.set()
+        self.release.wait(5)
+        # Passes listed in unfinished leave an action for later
+        deferred = int(len(self.passes) in self.unfinished)
+        return {"errors": [], "pass": len(self.passes), "deferred_count": deferred}
+
+
+def run_in_thread(call):
+    out = {}
+    thread = threading.Thread(target=lambda: out.setdefault("result", call()))
+    thread.start()
+    return thread, out
+
+
+def test_lone_request_runs_its_own_plan():
+    reconciler = RecordingReconciler()
+    coalescer = ReconcileCoalescer(reconciler)
+    plan = object()
+
+    coalescer.reconcile([spec("a")], plan=plan, planned_at=coalescer.generation)
+
+    assert reconciler.passes == [("reconcile", [("a", 9091)], plan)]
+    assert coalescer.generation == 1
+
+
+def test_plan_made_before_another_pass_is_dropped():
+    reconciler = RecordingReconciler()
+    coalescer = ReconcileCoalescer(reconciler)
+    planned_at = coalescer.generation
+    coalescer.reconcile([])
+
+    coalescer.reconcile([spec("a")], plan=object(), planned_at=planned_at)
+
+    assert reconciler.passes[-1][2] is None
+
+
+def test_requests_during_a_pass_share_one_follow_up_pass():
+    reconciler = RecordingReconciler(gated=True)
+    coalescer = ReconcileCoalescer(reconciler)
+
+    first, first_out = run_in_thread(lambda: coalescer.reconcile([spec("a")]))
+    assert reconciler.started.wait(5)
+    waiters = [
+        run_in_thread(lambda: coalescer.reconcile([spec("a"), spec("b")])),
+        run_in_thread(lambda: coalescer.reconcile([spec("b"), spec("c")], plan=object(), planned_at=0)),
+        run_in_thread(lambda: coalescer.apply_changes([spec("c", 9000), spec("d")], ["b"])),
+    ]
+    while coalescer._next is None or coalescer._next.size < 3:
+        time.sleep(0.01)
+    reconciler.release.set()
+
+    for thread, _ in [(first, first_out)] + waiters:
+        thread.join(5)
+    assert first_out["result"]["pass"] == 1
+    assert [out["result"]["pass"] for _, out in waiters] == [2, 2, 2]
+    # Latest full state, with the later change set applied on top
+    assert reconciler.passes[1] == ("reconcile", [("c", 9000), ("d", 9091)], None)
+
+
+def test_change_sets_merge_with_later_ones_winning():
+    reconciler = RecordingReconciler(gated=True)
+    coalescer = ReconcileCoalescer(reconciler)
+
+    first, _ = run_in_thread(lambda: coalescer.reconcile([]))
+    assert reconciler.started.wait(5)
+    waiters = [
+        run_in_thread(lambda: coalescer.apply_changes([spec("a"), spec("x")], ["b", "x"])),
+        run_in_thread(lambda: coalescer.apply_changes([spec("b")], ["a"])),
+    ]
+    while coalescer._next is None or coalescer._next.size < 2:
+        time.sleep(0.01)
+    reconciler.release.set()
+    for thread, _ in [(first, None)] + waiters:
+        thread.join(5)
+
+    assert reconciler.passes[1] == ("apply_changes", ([("b", 9091)], ["a"]), None)
+    assert waiters[0][1]["result"]["errors"] == ["Instance x is both upserted and deleted; skipping"]
+
+
+def test_unfinished_pass_resumes_with_later_changes_on_top():
+    reconciler = RecordingReconciler()
+    reconciler.unfinished = {1}
+    coalescer = ReconcileCoalescer(reconciler, background=False)
+
+    first = coalescer.reconcile([spec("a"), spec("b")], deadline=time.monotonic())
+    token = first["continuation_token"]
+    coalescer.apply_changes([spec("c")], ["a"])
+    result = coalescer.resume(token)
+
+    assert reconciler.passes[2] == ("reconcile", [("b", 9091), ("c", 9091)], None)
+    assert "continuation_token" not in result
+    # Asking again gets the pass that finished it
+    assert coalescer.resume(token) is result
+    with pytest.raises(KeyError):
+        coalescer.resume("unknown")
+
+
+def test_later_desired_state_supersedes_an_unfinished_pass():
+    reconciler = RecordingReconciler()
+    reconciler.unfinished = {1}
+    coalescer = ReconcileCoalescer(reconciler, background=False)
+
+    token = coalescer.reconcile([spec("a")])["continuation_token"]
+    latest = coalescer.reconcile([spec("b")])
+
+    assert coalescer.resume(token) is latest
+    assert len(reconciler.passes) == 2
+
+
+def test_unfinished_pass_is_finished_in_the_background():
+    reconciler = RecordingReconciler()
+    reconciler.unfinished = {1}
+    coalescer = ReconcileCoalescer(reconciler, background=True)
+
+    token = coalescer.reconcile([spec("a")])["continuation_token"]
+    for _ in range(100):
+        if len(reconciler.passes) == 2:
+            break
+        time.sleep(0.01)
+
+    assert reconciler.passes[1] == ("reconcile", [("a", 9091)], None)
+    assert coalescer.resume(token)["pass"] == 2
+
+
+def test_async_pass_survives_its_caller_being_cancelled():
+    class AsyncReconciler:
+        def __init__(self):
+            self.passes = 0
+            self.release = asyncio.Event()
+
+        async def reconcile(self, desired_instances, plan=None, correlation_id=None, deadline=None):
+            self.passes += 1
+            await self.release.wait()
+            return {"errors": [], "pass": self.passes}
+
+    async def main():
+        reconciler = AsyncReconciler()
+        coalescer = AsyncReconcileCoalescer(reconciler)
+        leader = asyncio.ensure_future(coalescer.reconcile([]))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.reconcile([spec("a")]))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        reconciler.release.set()
+        return await follower, reconciler.passes
+
+    result, passes = asyncio.run(main())
+    assert (result["pass"], passes) == (2, 2)
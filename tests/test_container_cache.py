@@ -0,0 +1,154 @@
+import threading
+import time
+import pytest
+import docker
+from src.container_cache import ContainerCache
+from src.metrics import CACHE_STALENESS
+from conftest import make_container
+
+
+def container_event(action, container_id):
+    return {"Type": "container", "Action": action, "Actor": {"ID": container_id, "Attributes": {}}}
+
+
+@pytest.fixture
+def cache(mock_docker_client):
+    return ContainerCache(mock_docker_client, max_staleness=5.0)
+
+
+def test_reads_fall_back_to_docker_until_synced(cache, mock_docker_client):
+    container = make_container("c1", "user-1")
+    mock_docker_client.list_managed_containers.return_value = [container]
+
+    assert not cache.is_fresh()
+    assert cache.list_managed_containers() == [container]
+    mock_docker_client.list_managed_containers.assert_called_once()
+
+
+def test_serves_reads_from_cache_while_connected(cache, mock_docker_client):
+    container = make_container("c1", "user-1")
+    mock_docker_client.list_managed_containers.return_value = [container]
+    cache.resync()
+    cache._connected = True
+    mock_docker_client.reset_mock()
+
+    for _ in range(5):
+        assert cache.list_managed_containers() == [container]
+        assert cache.get_container_by_id("user-1") is container
+    assert cache.get_container_by_id("user-2") is None
+
+    mock_docker_client.list_managed_containers.assert_not_called()
+    mock_docker_client.get_container_by_id.assert_not_called()
+
+
+def test_events_update_the_cache(cache, mock_docker_client):
+    mock_docker_client.list_managed_containers.return_value = []
+    cache.resync()
+    cache._connected = True
+
+    started = make_container("c1", "user-1")
+    mock_docker_client.get_container.return_value = started
+    cache.handle_event(container_event("start", "c1"))
+    assert cache.get_container_by_id("user-1") is started
+
+    stopped = make_container("c1", "user-1", status="exited")
+    mock_docker_client.get_container.return_value = stopped
+    cache.handle_event(container_event("die", "c1"))
+    assert cache.get_container_by_id("user-1").status == "exited"
+
+    cache.handle_event(container_event("exec_start: sh", "c1"))
+    assert mock_docker_client.get_container.call_count == 2
+
+    cache.handle_event(container_event("destroy", "c1"))
+    assert cache.list_managed_containers() == []
+
+
+def test_late_event_for_replaced_container(cache, mock_docker_client):
+    old = make_container("old", "user-1")
+    new = make_container("new", "user-1")
+    mock_docker_client.list_managed_containers.return_value = [old]
+    cache.resync()
+    cache._connected = True
+
+    cache.discard(old)
+    cache.put(new)
+    mock_docker_client.get_container.side_effect = docker.errors.NotFound("gone")
+    cache.handle_event(container_event("die", "old"))
+
+    assert cache.get_container_by_id("user-1") is new
+    assert cache.list_managed_containers() == [new]
+
+
+def test_removing_an_instances_container_falls_back_to_another(cache, mock_docker_client):
+    replacement = make_container("new", "user-1")
+    current = make_container("old", "user-1")
+    mock_docker_client.list_managed_containers.return_value = [replacement, current]
+    cache.resync()
+    cache._connected = True
+    subscription = cache.subscribe()
+
+    cache.discard(current)
+    assert cache.get_container_by_id("user-1") is replacement
+    cache.discard(replacement)
+    assert cache.get_container_by_id("user-1") is None
+
+    assert [(id, c.id, removed) for id, c, removed in subscription.drain(0)] == [("user-1", "new", True)]
+
+
+class FakeStream:
+    """Events stream that yields the given events, then blocks until closed."""
+
+    def __init__(self, events, block=False):
+        self.events = events
+        self.block = block
+        self.opened = threading.Event()
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        self.opened.set()
+        yield from self.events
+        if self.block:
+            self.closed.wait(5)
+
+    def close(self):
+        self.closed.set()
+
+
+def test_staleness_follows_the_event_being_applied(cache, mock_docker_client):
+    mock_docker_client.list_managed_containers.return_value = []
+    cache.resync()
+    cache._connected = True
+    lag = []
+
+    def get_container(container_id):
+        lag.append((cache.staleness(), cache.is_fresh()))
+        return make_container(container_id, "user-1")
+
+    mock_docker_client.get_container.side_effect = get_container
+    event = container_event("start", "c1")
+    event["timeNano"] = int((time.time() - 30) * 1e9)
+    cache._apply(event)
+
+    (staleness, fresh), = lag
+    assert staleness == pytest.approx(30, abs=1)
+    assert not fresh
+    assert cache.staleness() == 0.0
+
+
+def test_resyncs_after_stream_disconnect(cache, mock_docker_client):
+    first = make_container("c1", "user-1")
+    second = make_container("c2", "user-2")
+    mock_docker_client.list_managed_containers.side_effect = [[first], [first, second]]
+    dropped = FakeStream([])
+    reconnected = FakeStream([], block=True)
+    mock_docker_client.managed_events.side_effect = [dropped, reconnected]
+    cache._stop.wait = lambda timeout: False
+
+    cache.start()
+    assert reconnected.opened.wait(5)
+    assert cache.staleness() == 0.0
+    assert f'transctrl_container_cache_staleness_seconds{{host="{cache.host}"}} 0.0' in CACHE_STALENESS._samples()
+    cache.stop()
+
+    assert mock_docker_client.list_managed_containers.call_count == 2
+    assert {c.id for c in cache.list_managed_containers()} == {"c1", "c2"}
@@ -0,0 +1,194 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from conftest import make_spec
+from fake_docker import FakeDockerDaemon
+from src import transctrl_pb2
+from src.config import settings
+from src.container_cache import ContainerCache
+from src.docker_client import DockerClient
+from src.reconciler import Reconciler
+from src.specs import SPEC_HASH_LABEL, spec_fingerprint
+from src.status import StatusQuery
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    with FakeDockerDaemon(str(tmp_path / "docker.sock")) as daemon:
+        monkeypatch.setattr(settings, "DOCKER_HOST", daemon.url)
+        monkeypatch.setattr(settings, "ALLOWED_MOUNT_BASE", str(tmp_path))
+        yield daemon
+
+
+def spec_in(tmp_path, instance_id, web_port):
+    spec = make_spec(instance_id, web_port=web_port, data_port=web_port + 10000)
+    for attr in ("config_path", "data_path", "watch_path"):
+        path = tmp_path / attr / instance_id
+        path.mkdir(parents=True)
+        setattr(spec, attr, str(path))
+    return spec
+
+
+def test_create_and_remove_container(daemon, tmp_path):
+    client = DockerClient()
+    spec = spec_in(tmp_path, "user-1", 9091)
+
+    container = client.create_container(spec)
+    assert container.labels[SPEC_HASH_LABEL] == spec_fingerprint(spec)
+    assert client.get_container_by_id("user-1").id == container.id
+    assert client.get_container(container.id).status == "running"
+    assert daemon.calls["POST /containers/{id}/start"] == 1
+
+    client.remove_container(client.get_container(container.id))
+    assert client.list_managed_containers() == []
+
+
+def test_create_pulls_missing_image(daemon, tmp_path):
+    daemon.images.clear()
+    client = DockerClient()
+
+    client.create_container(spec_in(tmp_path, "user-1", 9091))
+    assert daemon.calls["POST /images/create"] == 1
+    assert client.get_image_id("linuxserver/transmission:latest") is not None
+
+
+def test_reconcile_round_trip_api_calls(daemon, tmp_path):
+    reconciler = Reconciler(DockerClient(), concurrency=4)
+    specs = [spec_in(tmp_path, f"user-{i}", 20000 + i) for i in range(5)]
+
+    result = reconciler.reconcile(specs)
+    assert (result["created_count"], result["errors"]) == (5, [])
+
+    daemon.reset_calls()
+    result = reconciler.reconcile(specs)
+    assert result["unchanged_count"] == 5
+    # One list plus an inspect per container, nothing else
+    assert daemon.calls == {"GET /containers/json": 1, "GET /containers/{id}/json": 5}
+
+    daemon.reset_calls()
+    result = reconciler.reconcile([])
+    assert result["destroyed_count"] == 5
+    assert daemon.containers == {}
+
+
+def test_port_clash_fails_start(daemon, tmp_path):
+    client = DockerClient()
+    client.create_container(spec_in(tmp_path, "user-1", 9091))
+    clash = spec_in(tmp_path, "user-2", 9091)
+
+    with pytest.raises(Exception, match="port is already allocated"):
+        client.create_container(clash)
+
+
+def test_cache_follows_fake_events(daemon, tmp_path):
+    client = DockerClient()
+    cache = ContainerCache(client)
+    cache.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not cache.is_fresh() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        container = client.create_container(spec_in(tmp_path, "user-1", 9091))
+        deadline = time.monotonic() + 5
+        while cache.get_container_by_id("user-1") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cache.get_container_by_id("user-1").id == container.id
+    finally:
+        cache.stop()
+
+
+def test_concurrent_calls_share_kept_alive_connections(daemon):
+    import threading
+
+    daemon.latency = 0.02
+    client = DockerClient(pool_size=2)
+    opened = daemon.connections  # API version negotiation
+    threads = [threading.Thread(target=client.list_managed_containers) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = client.pool.stats()
+    assert daemon.calls["GET /containers/json"] == 8
+    assert daemon.connections - opened <= 2
+    assert stats["waits"] >= 6
+    assert (stats["in_use"], stats["waiting"], stats["timeouts"]) == (0, 0, 0)
+
+
+def test_calls_for_different_containers_reuse_one_connection(daemon, tmp_path):
+    client = DockerClient(pool_size=4)
+    opened = daemon.connections
+    for i in range(3):
+        container = client.create_container(spec_in(tmp_path, f"user-{i}", 9091 + i))
+        client.get_container(container.id)
+
+    assert daemon.connections - opened == 1
+
+
+def test_tcp_and_tls_hosts_get_sized_pools():
+    from docker.api.client import APIClient
+
+    with patch.object(APIClient, "_retrieve_server_version", return_value="1.43"):
+        client = DockerClient("https://docker.example:2376", pool_size=4)
+
+    for prefix in ("http://", "https://"):
+        assert client.client.api.get_adapter(prefix)._pool_maxsize == 5
+
+
+def test_unknown_docker_socket_adapter_is_refused(daemon):
+    from docker.api.client import APIClient
+
+    real_init = APIClient.__init__
+
+    def init(self, *args, **kwargs):
+        real_init(self, *args, **kwargs)
+        del self._custom_adapter
+
+    with patch.object(APIClient, "__init__", init), pytest.raises(RuntimeError, match="docker 7.x"):
+        DockerClient(daemon.url)
+
+
+def test_pool_gives_up_after_timeout():
+    from src.docker_client import ConnectionPool, PoolTimeout
+
+    pool = ConnectionPool("unix:///test.sock", size=1, timeout=0.01)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_filtered_listing_is_narrowed_by_docker(daemon, tmp_path):
+    client = DockerClient()
+    for i in range(3):
+        client.create_container(spec_in(tmp_path, f"user-{i}", 20000 + i))
+    client.client.containers.get(client.get_container_by_id("user-1").id).stop()
+
+    cache = ContainerCache(client)  # never synced, so it reads through
+    query = StatusQuery(statuses={transctrl_pb2.STOPPED})
+    inspected = daemon.calls["GET /containers/{id}/json"]
+
+    assert [c.labels["transctrl.instance-id"] for c in cache.list_managed_containers(query)] == ["user-1"]
+    # Only the match came back from Docker to be inspected
+    assert daemon.calls["GET /containers/{id}/json"] == inspected + 1
+
+
+def test_get_containers_by_ids_lists_once(daemon, tmp_path):
+    client = DockerClient()
+    for i in range(4):
+        client.create_container(spec_in(tmp_path, f"user-{i}", 20000 + i))
+    listed, inspected = daemon.calls["GET /containers/json"], daemon.calls["GET /containers/{id}/json"]
+
+    found = client.get_containers_by_ids(["user-1", "user-3", "ghost"])
+
+    assert sorted(found) == ["user-1", "user-3"]
+    assert found["user-3"].labels["transctrl.instance-id"] == "user-3"
+    assert daemon.calls["GET /containers/json"] == listed + 1
+    assert daemon.calls["GET /containers/{id}/json"] == inspected + 2
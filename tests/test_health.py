@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from fake_transmission import FakeTransmission
+from src import transctrl_pb2
+from src.health import HealthProber
+from conftest import make_container
+
+
+def published_on(port, instance_id, status="running"):
+    container = make_container(f"c-{instance_id}", instance_id, status=status)
+    container.attrs["HostConfig"]["PortBindings"]["9091/tcp"] = [{"HostPort": str(port)}]
+    return container
+
+
+def prober_for(containers, **kwargs):
+    cache = MagicMock()
+    cache.list_managed_containers.return_value = containers
+    cache.host_of.return_value = "unix:///var/run/docker.sock"
+    return HealthProber(cache, interval=1, **kwargs)
+
+
+def test_probe_does_the_session_handshake_once():
+    async def main():
+        async with FakeTransmission() as rpc:
+            prober = prober_for([published_on(rpc.port, "user-1")])
+            await prober.sweep()
+            await prober.sweep()
+            return prober.result("user-1"), rpc.requests
+
+    result, requests = asyncio.run(main())
+    assert result.healthy and result.error == ""
+    # 409 then retry, and afterwards the remembered session ID
+    assert requests == [None, "abc123", "abc123"]
+
+
+def test_wedged_or_stopped_instances():
+    async def main():
+        async with FakeTransmission() as rpc:
+            rpc.wedged = True
+            prober = prober_for([
+                published_on(rpc.port, "wedged"),
+                published_on(rpc.port, "stopped", status="exited"),
+            ], timeout=0.2)
+            await prober.sweep()
+            return prober
+
+    prober = asyncio.run(main())
+    wedged = prober.result("wedged")
+    assert not wedged.healthy and "0.2" in wedged.error
+    assert 0.2 <= wedged.latency < 1.0
+    assert prober.result("stopped") is None
+
+
+def test_probes_run_concurrently_within_the_bound():
+    async def main():
+        async with FakeTransmission() as rpc:
+            rpc.delay = 0.05
+            prober = prober_for([published_on(rpc.port, f"user-{i}") for i in range(12)], concurrency=4)
+            await prober.sweep()
+            return prober, rpc.peak_open
+
+    prober, peak_open = asyncio.run(main())
+    assert all(prober.result(f"user-{i}").healthy for i in range(12))
+    assert peak_open == 4
+
+
+def test_status_carries_health(servicer, context):
+    async def main():
+        async with FakeTransmission() as rpc:
+            container = published_on(rpc.port, "user-1")
+            servicer.container_cache.put(container)
+            servicer.health = prober_for([container])
+            await servicer.health.sweep()
+
+    asyncio.run(main())
+    status = servicer.GetInstance(transctrl_pb2.InstanceId(id="user-1"), context)
+
+    assert status.health.health == transctrl_pb2.HEALTHY
+    assert status.health.latency_seconds > 0
@@ -0,0 +1,128 @@
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+from src.coalescer import ReconcileCoalescer
+from src.container_cache import ContainerCache
+from src.docker_client import DockerClient
+from src.journal import Journal
+from conftest import make_spec
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unfinished_pass_survives_a_restart(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    journal.open()
+    journal.begin_reconcile("p1", [make_spec("a"), make_spec("b", 9092)])
+    journal.end("p1")
+    journal.begin_reconcile("p2", [make_spec("a"), make_spec("c", 9093)])
+    journal.done("p2", "destroy", "b")
+
+    recovery = Journal(path).open()
+
+    assert recovery.full and recovery.done == 1
+    assert [spec.id for spec in recovery.desired] == ["a", "c"]
+    # Compacted to the snapshot plus the unfinished pass
+    assert [r["t"] for r in read_records(path)] == ["snapshot", "reconcile"]
+
+
+def test_unfinished_change_sets_are_merged(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    journal.open()
+    journal.begin_apply("p1", [make_spec("a"), make_spec("b", 9092)], ["old"])
+    journal.begin_apply("p2", [make_spec("a", 9099)], ["b"])
+    with open(path, "a") as f:
+        f.write('{"t": "done", "id": "p2"')  # torn by a crash
+
+    recovery = Journal(path).open()
+
+    assert recovery.desired is None  # no full state accepted yet
+    assert [(spec.id, spec.web_port) for spec in recovery.upserts] == [("a", 9099)]
+    assert recovery.deletes == ["old", "b"]
+
+
+def test_unfinished_change_set_replays_later_finished_changes(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    journal.open()
+    journal.begin_apply("p1", [make_spec("x")], [])
+    journal.begin_apply("p2", [], ["x"])
+    journal.end("p2")
+
+    recovery = Journal(path).open()
+
+    # p1 is replayed, but x was deleted after it and must stay deleted
+    assert recovery.passes == ["p1"]
+    assert (recovery.upserts, recovery.deletes) == ([], ["x"])
+
+
+def test_unchanged_desired_state_is_not_written_again(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path, compact_bytes=10 ** 6)
+    journal.open()
+    specs = [make_spec("a"), make_spec("b", 9092)]
+    for pass_id in ("p1", "p2"):
+        journal.begin_reconcile(pass_id, specs)
+        journal.end(pass_id)
+
+    begun = [r for r in read_records(path) if r["t"] == "reconcile"]
+    assert ["instances" in r for r in begun] == [True, False]
+
+
+def test_coalescer_journals_passes_from_start_to_end(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    journal.open()
+    reconciler = MagicMock()
+    reconciler.reconcile.return_value = {"errors": []}
+
+    ReconcileCoalescer(reconciler, journal=journal).reconcile([make_spec("a")], correlation_id="c1")
+
+    assert [(r["t"], r.get("id")) for r in read_records(path)][1:] == [("reconcile", "c1"), ("end", "c1")]
+
+
+def test_unfinished_pass_ends_only_once_resumed(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    journal.open()
+    reconciler = MagicMock()
+    reconciler.reconcile.return_value = {"errors": [], "deferred_count": 1}
+    coalescer = ReconcileCoalescer(reconciler, journal=journal, background=False)
+
+    token = coalescer.reconcile([make_spec("a")], correlation_id="c1")["continuation_token"]
+    assert [r["t"] for r in read_records(path)][1:] == ["reconcile"]
+
+    reconciler.reconcile.return_value = {"errors": [], "deferred_count": 0}
+    coalescer.resume(token)
+    assert [(r["t"], r.get("id")) for r in read_records(path)][-1] == ("end", "c1")
+
+
+def test_servicer_resumes_an_unfinished_pass_on_startup(tmp_path):
+    from src import server
+
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    journal.open()
+    journal.begin_reconcile("p1", [make_spec("a")])
+    journal.close()
+
+    docker_client = MagicMock(spec=DockerClient)
+    docker_client.list_managed_containers.return_value = []
+    docker_client.get_container_by_id.return_value = None
+    with patch.object(server.settings, "JOURNAL_PATH", path), \
+         patch.object(server, "DockerClient", return_value=docker_client), \
+         patch.object(ContainerCache, "start"), \
+         patch("os.path.exists", return_value=True):
+        server.TransmissionControllerServicer()
+        deadline = time.monotonic() + 5
+        while {"t": "end", "id": "p1"} not in read_records(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert [call.args[0].id for call in docker_client.create_container.call_args_list] == ["a"]
+    assert Journal(path).open().unfinished is False
@@ -0,0 +1,107 @@
+import asyncio
+import urllib.request
+from concurrent import futures
+from unittest.mock import MagicMock, patch
+
+import grpc
+import pytest
+
+from src import transctrl_pb2, transctrl_pb2_grpc
+from src.container_cache import ContainerCache
+from src.docker_client import DockerClient
+from src.metrics import (
+    DOCKER_API_CALLS,
+    RPC_DURATION,
+    Counter,
+    Histogram,
+    Registry,
+    RpcMetricsInterceptor,
+    docker_call,
+    start_metrics_server,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = Histogram("test_latency_seconds", "Test latency.", ["op"],
+                        buckets=(0.1, 1.0), registry=registry)
+    calls = Counter("test_calls_total", "Test calls.", registry=registry)
+    latency.observe(0.05, op="a")
+    latency.observe(0.5, op="a")
+    calls.inc()
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{op="a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{op="a",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{op="a",le="+Inf"} 2' in lines
+    assert 'test_latency_seconds_count{op="a"} 2' in lines
+    assert "test_calls_total 1" in lines
+
+
+def test_docker_call_counts_outcomes_for_sync_and_async_methods():
+    @docker_call("test_sync")
+    def sync_call(fail):
+        if fail:
+            raise RuntimeError("boom")
+
+    @docker_call("test_async")
+    async def async_call():
+        return "ok"
+
+    sync_call(False)
+    with pytest.raises(RuntimeError):
+        sync_call(True)
+    assert asyncio.run(async_call()) == "ok"
+
+    assert DOCKER_API_CALLS.value(operation="test_sync", outcome="ok") == 1
+    assert DOCKER_API_CALLS.value(operation="test_sync", outcome="error") == 1
+    assert DOCKER_API_CALLS.value(operation="test_async", outcome="ok") == 1
+
+
+def test_rpc_interceptor_records_method_and_code(tmp_path):
+    from src import server as server_module
+
+    docker_client = MagicMock(spec=DockerClient)
+    docker_client.list_managed_containers.return_value = []
+    with patch.object(server_module, "DockerClient", return_value=docker_client), \
+         patch.object(ContainerCache, "start"):
+        servicer = server_module.TransmissionControllerServicer()
+    servicer.container_cache.resync()
+    servicer.container_cache._connected = True
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2),
+                         interceptors=[RpcMetricsInterceptor()])
+    transctrl_pb2_grpc.add_TransmissionControllerServicer_to_server(servicer, server)
+    address = f"unix:{tmp_path}/test.sock"
+    server.add_insecure_port(address)
+    server.start()
+    try:
+        with grpc.insecure_channel(address) as channel:
+            stub = transctrl_pb2_grpc.TransmissionControllerStub(channel)
+            ok_before = RPC_DURATION.count(method="GetStatus", code="OK")
+            missing_before = RPC_DURATION.count(method="GetInstance", code="NOT_FOUND")
+
+            stub.GetStatus(transctrl_pb2.StatusRequest())
+            with pytest.raises(grpc.RpcError):
+                stub.GetInstance(transctrl_pb2.InstanceId(id="missing"))
+    finally:
+        server.stop(0)
+
+    assert RPC_DURATION.count(method="GetStatus", code="OK") == ok_before + 1
+    assert RPC_DURATION.count(method="GetInstance", code="NOT_FOUND") == missing_before + 1
+
+
+def test_metrics_endpoint_serves_registry():
+    server = start_metrics_server("127.0.0.1:0")
+    try:
+        host, port = server.server_address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            body = response.read().decode()
+            content_type = response.headers["Content-Type"]
+    finally:
+        server.shutdown()
+
+    assert content_type.startswith("text/plain")
+    assert "# TYPE transctrl_docker_api_calls_total counter" in body
+    assert "# TYPE transctrl_reconcile_phase_duration_seconds histogram" in body
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.ports import PortIndex, container_ports, parse_port_range
+
+
+def container(container_id, instance_id, web_port, data_port):
+    return SimpleNamespace(
+        id=container_id,
+        labels={"transctrl.instance-id": instance_id},
+        attrs={"HostConfig": {"PortBindings": {
+            "9091/tcp": [{"HostIp": "", "HostPort": str(web_port)}],
+            "51413/tcp": [{"HostIp": "", "HostPort": str(data_port)}],
+        }}},
+    )
+
+
+def test_container_ports_default_to_zero():
+    assert container_ports(container("c1", "a", 9000, 19000)) == (9000, 19000)
+    assert container_ports(SimpleNamespace(attrs={})) == (0, 0)
+
+
+def test_parse_port_range():
+    assert parse_port_range("") is None
+    assert parse_port_range("20000-20009") == range(20000, 20010)
+    assert parse_port_range("20000") == range(20000, 20001)
+    for value in ("80-90", "20000-70000", "30000-20000"):
+        with pytest.raises(ValueError):
+            parse_port_range(value)
+
+
+def test_removing_a_replaced_container_keeps_its_successors_ports():
+    old = container("c1", "a", 9000, 19000)
+    new = container("c2", "a", 9000, 19001)
+    index = PortIndex([old])
+
+    index.add(new)
+    index.remove(old)
+
+    assert (index.owner(9000), index.owner(19000), index.owner(19001)) == ("a", None, "a")
+    assert len(index) == 2
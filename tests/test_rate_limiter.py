@@ -0,0 +1,80 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from src import rate_limiter
+from src.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    with patch.object(rate_limiter.time, "monotonic", side_effect=lambda: now[0]):
+        yield now
+
+
+def test_bucket_refills_at_window_rate(clock):
+    limiter = RateLimiter(requests=2, window=10)
+
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == pytest.approx(5.0)
+
+    clock[0] += 5
+    assert limiter.acquire() == 0.0
+
+
+def test_expensive_call_needs_full_bucket_and_leaves_debt(clock):
+    limiter = RateLimiter(requests=10, window=10)
+
+    assert limiter.acquire(cost=5) == 0.0
+    # 5 tokens left; a call costing 25 waits for the bucket to be full
+    assert limiter.acquire(cost=25) == pytest.approx(5.0)
+    clock[0] += 5
+    assert limiter.acquire(cost=25) == 0.0
+    # ...and then everyone waits out the debt
+    assert limiter.acquire() == pytest.approx(16.0)
+
+
+def test_charge_can_put_the_bucket_in_debt(clock):
+    limiter = RateLimiter(requests=2, window=10)
+
+    assert limiter.acquire() == 0.0
+    limiter.charge(3)
+    assert limiter.acquire() == pytest.approx(15.0)
+
+
+def test_keys_have_separate_buckets(clock):
+    limiter = RateLimiter(requests=1, window=60)
+
+    assert limiter.is_allowed(key="noisy")
+    assert not limiter.is_allowed(key="noisy")
+    assert limiter.is_allowed(key="quiet")
+
+
+def test_full_buckets_are_pruned(clock):
+    limiter = RateLimiter(requests=1, window=1)
+    with patch.object(rate_limiter, "MAX_KEYS", 3):
+        for key in ("a", "b", "c"):
+            limiter.acquire(key=key)
+        clock[0] += 1
+        limiter.acquire(key="d")
+
+    assert set(limiter._buckets) == {"d"}
+
+
+def test_concurrent_acquires_never_overspend():
+    limiter = RateLimiter(requests=100, window=3600)
+    allowed = []
+
+    def worker():
+        allowed.append(sum(limiter.is_allowed() for _ in range(50)))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(allowed) == 100
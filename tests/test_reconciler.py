@@ -1,11 +1,7 @@
 import pytest
 from unittest.mock import MagicMock, patch
 from src.reconciler import Reconciler
-from src.docker_client import DockerClient
-
-@pytest.fixture
-def mock_docker_client():
-    return MagicMock(spec=DockerClient)
+from conftest import container_for, make_spec
 
 @pytest.fixture
 def reconciler(mock_docker_client):
@@ -48,3 +44,410 @@ def test_reconcile_destroy_unwanted(reconciler, mock_docker_client):
     # Assertions
     assert result["destroyed_count"] == 1
     mock_docker_client.remove_container.assert_called_once_with(unwanted_container)
+
+def test_reconcile_runs_actions_with_bounded_concurrency(mock_docker_client):
+    import threading
+    import time
+
+    reconciler = Reconciler(mock_docker_client, concurrency=3)
+    mock_docker_client.list_managed_containers.return_value = []
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def slow_create(spec):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+
+    mock_docker_client.create_container.side_effect = slow_create
+    specs = [make_spec(f"test-{i}", 10000 + 2 * i, 10001 + 2 * i) for i in range(9)]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["created_count"] == 9
+    assert result["errors"] == []
+    assert peak == 3
+
+def test_actions_past_the_deadline_are_deferred(mock_docker_client, monkeypatch):
+    from types import SimpleNamespace
+    from src import reconciler as reconciler_module
+
+    now = [1000.0]
+    monkeypatch.setattr(reconciler_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    reconciler = Reconciler(mock_docker_client, concurrency=1)
+    mock_docker_client.list_managed_containers.return_value = []
+    created = []
+
+    def slow_create(spec):
+        created.append(spec.id)
+        now[0] += 0.2
+
+    mock_docker_client.create_container.side_effect = slow_create
+    specs = [make_spec(f"test-{i}", 10000 + 2 * i, 10001 + 2 * i) for i in range(4)]
+    specs[2].priority = 5
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs, deadline=now[0] + 0.3)
+
+    # Highest priority first; nothing starts once the deadline has passed
+    assert created == ["test-2", "test-0"]
+    assert (result["created_count"], result["deferred_count"]) == (2, 2)
+    assert result["errors"] == []
+
+def test_reconcile_destroys_before_recreating(reconciler, mock_docker_client):
+    old_container = MagicMock()
+    old_container.labels = {"transctrl.instance-id": "test-1", "transctrl.managed": "true"}
+    mock_docker_client.list_managed_containers.return_value = [old_container]
+
+    calls = []
+    mock_docker_client.remove_container.side_effect = lambda c: calls.append("remove")
+    mock_docker_client.create_container.side_effect = lambda s: calls.append("create")
+
+    with patch("os.path.exists", return_value=True), \
+         patch.object(reconciler, "_needs_recreation", return_value=True):
+        result = reconciler.reconcile([make_spec("test-1")])
+
+    assert calls == ["remove", "create"]
+    assert result["destroyed_count"] == 1
+    assert result["created_count"] == 1
+    assert result["recreated_count"] == 1
+
+def test_reconcile_aggregates_errors_in_order(reconciler, mock_docker_client):
+    mock_docker_client.list_managed_containers.return_value = []
+
+    def create(spec):
+        if spec.id != "test-1":
+            raise RuntimeError("boom")
+
+    mock_docker_client.create_container.side_effect = create
+    specs = [make_spec(f"test-{i}", 10000 + 2 * i, 10001 + 2 * i) for i in range(4)]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["created_count"] == 1
+    assert result["errors"] == [
+        "Failed to create test-0: boom",
+        "Failed to create test-2: boom",
+        "Failed to create test-3: boom",
+    ]
+
+def test_unchanged_diff_makes_no_image_calls(reconciler, mock_docker_client):
+    specs = [make_spec(f"test-{i}", 10000 + 2 * i, 10001 + 2 * i) for i in range(1000)]
+    mock_docker_client.list_managed_containers.return_value = [container_for(s) for s in specs]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["unchanged_count"] == 1000
+    mock_docker_client.get_image_id.assert_not_called()
+    mock_docker_client.create_container.assert_not_called()
+
+def test_image_tag_change_needs_recreation(reconciler):
+    spec = make_spec("test-1")
+    spec.image_tag = "4.0.6"
+    assert reconciler._needs_recreation(container_for(spec), spec)
+
+def test_image_id_fallback_is_cached(reconciler, mock_docker_client):
+    spec = make_spec("test-1")
+    mock_docker_client.get_image_id.return_value = "sha256:aaa"
+    same = container_for(spec, config_image=None, image_id="sha256:aaa")
+    stale = container_for(spec, config_image=None, image_id="sha256:old")
+
+    assert not reconciler._needs_recreation(same, spec)
+    assert reconciler._needs_recreation(stale, spec)
+    mock_docker_client.get_image_id.assert_called_once_with("linuxserver/transmission:latest")
+
+def test_matching_spec_hash_skips_attribute_comparison(reconciler):
+    from src.specs import SPEC_HASH_LABEL, spec_fingerprint
+
+    spec = make_spec("test-1")
+    container = MagicMock()
+    container.labels = {"transctrl.instance-id": "test-1", SPEC_HASH_LABEL: spec_fingerprint(spec)}
+
+    assert not reconciler._needs_recreation(container, spec)
+    container.attrs.get.assert_not_called()
+
+    changed = make_spec("test-1", web_port=9092)
+    assert reconciler._needs_recreation(container, changed)
+
+def test_deep_verify_compares_attributes(mock_docker_client):
+    from src.specs import SPEC_HASH_LABEL, spec_fingerprint
+
+    reconciler = Reconciler(mock_docker_client, deep_verify=True)
+    spec = make_spec("test-1")
+    container = container_for(spec)
+    container.labels[SPEC_HASH_LABEL] = spec_fingerprint(spec)
+    # Drifted outside transctrl; the label still matches the spec
+    container.attrs["Mounts"][0]["Source"] = "/mnt/elsewhere"
+
+    assert reconciler._needs_recreation(container, spec)
+
+def test_unknown_spec_hash_version_falls_back_to_attributes(reconciler):
+    from src.specs import SPEC_HASH_LABEL
+
+    spec = make_spec("test-1")
+    container = container_for(spec)
+    container.labels[SPEC_HASH_LABEL] = "v0:deadbeef"
+
+    assert not reconciler._needs_recreation(container, spec)
+
+def test_spec_fingerprint_applies_defaults():
+    from src.specs import spec_fingerprint
+
+    explicit = make_spec("test-1")
+    defaulted = make_spec("test-1")
+    defaulted.image_tag = ""
+    defaulted.resource_limits.memory = ""
+    defaulted.resource_limits.cpu_quota = 0
+
+    assert spec_fingerprint(explicit) == spec_fingerprint(defaulted)
+
+def test_apply_changes_only_touches_listed_instances(reconciler, mock_docker_client):
+    kept = make_spec("kept")
+    removed = make_spec("removed", 9093, 51414)
+    containers = {s.id: container_for(s) for s in (kept, removed)}
+    mock_docker_client.get_containers_by_ids.side_effect = lambda ids: {
+        id: containers[id] for id in ids if id in containers
+    }
+
+    added = make_spec("added", 9095, 51415)
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.apply_changes([added], ["removed", "missing"])
+
+    assert result["created_count"] == 1
+    assert result["destroyed_count"] == 1
+    assert result["errors"] == []
+    mock_docker_client.list_managed_containers.assert_not_called()
+    mock_docker_client.get_container_by_id.assert_not_called()
+    assert sorted(mock_docker_client.get_containers_by_ids.call_args.args[0]) == ["added", "missing", "removed"]
+    mock_docker_client.create_container.assert_called_once_with(added)
+    mock_docker_client.remove_container.assert_called_once_with(containers["removed"])
+
+def test_apply_changes_rejects_upsert_and_delete_of_same_id(reconciler, mock_docker_client):
+    result = reconciler.apply_changes([make_spec("test-1")], ["test-1"])
+
+    assert result["created_count"] == 0
+    assert result["errors"] == ["Instance test-1 is both upserted and deleted; skipping"]
+    mock_docker_client.create_container.assert_not_called()
+
+def test_missing_images_are_pulled_once_before_creating(reconciler, mock_docker_client):
+    mock_docker_client.list_managed_containers.return_value = []
+    mock_docker_client.get_image_id.return_value = None
+    specs = [make_spec(f"test-{i}", 10000 + 2 * i, 10001 + 2 * i) for i in range(6)]
+    for spec in specs[3:]:
+        spec.image_tag = "4.0.6"
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["created_count"] == 6
+    assert sorted(c.args[0] for c in mock_docker_client.pull_image.call_args_list) == [
+        "linuxserver/transmission:4.0.6",
+        "linuxserver/transmission:latest",
+    ]
+    assert result["image_pull_seconds"] >= 0
+
+def test_concurrent_pulls_of_one_image_are_deduplicated(mock_docker_client):
+    import threading
+    import time
+    from src.docker_client import ImageIdCache
+    from src.image_puller import ImagePuller
+
+    release = threading.Event()
+    mock_docker_client.get_image_id.return_value = None
+    mock_docker_client.pull_image.side_effect = lambda ref: release.wait(5)
+    puller = ImagePuller(mock_docker_client, ImageIdCache(mock_docker_client))
+
+    threads = [threading.Thread(target=puller.pull, args=("linuxserver/transmission:latest",))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    mock_docker_client.pull_image.assert_called_once()
+
+def test_failed_pull_keeps_the_old_container(reconciler, mock_docker_client):
+    spec = make_spec("test-1")
+    spec.image_tag = "broken"
+    container = container_for(make_spec("test-1"))
+    mock_docker_client.list_managed_containers.return_value = [container]
+    mock_docker_client.get_image_id.return_value = None
+    mock_docker_client.pull_image.side_effect = RuntimeError("manifest unknown")
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile([spec])
+
+    mock_docker_client.remove_container.assert_not_called()
+    mock_docker_client.create_container.assert_not_called()
+    assert result["errors"] == [
+        "Failed to pull image linuxserver/transmission:broken: manifest unknown",
+        "Skipped test-1: image linuxserver/transmission:broken is unavailable",
+    ]
+
+def test_limit_only_change_updates_in_place(reconciler, mock_docker_client):
+    from src.specs import SPEC_HASH_LABEL, spec_fingerprint
+
+    spec = make_spec("test-1")
+    container = container_for(spec)
+    container.labels[SPEC_HASH_LABEL] = spec_fingerprint(spec)
+    mock_docker_client.list_managed_containers.return_value = [container]
+    mock_docker_client.update_container.side_effect = lambda c, memory, cpu_quota: c
+
+    spec.resource_limits.memory = "1g"
+    spec.resource_limits.cpu_quota = 100000
+    assert not reconciler._needs_recreation(container, spec)
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile([spec])
+
+    assert result["updated_count"] == 1
+    assert result["unchanged_count"] == 0
+    assert result["errors"] == []
+    mock_docker_client.update_container.assert_called_once_with(container, 1024**3, 100000)
+    mock_docker_client.remove_container.assert_not_called()
+    mock_docker_client.create_container.assert_not_called()
+
+def test_limit_and_mount_change_recreates(reconciler, mock_docker_client):
+    spec = make_spec("test-1")
+    container = container_for(spec)
+    mock_docker_client.list_managed_containers.return_value = [container]
+
+    spec.resource_limits.memory = "1g"
+    spec.config_path = "/mnt/configs/moved"
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile([spec])
+
+    assert result["recreated_count"] == 1
+    assert result["updated_count"] == 0
+    mock_docker_client.update_container.assert_not_called()
+
+def test_invalid_specs_are_reported_and_never_touched(reconciler, mock_docker_client):
+    valid = make_spec("test-1", web_port=9092, data_port=51414)
+    bad_port = make_spec("test-2", web_port=80)
+    escaped = make_spec("test-3")
+    escaped.data_path = "/mnt/../etc"
+    existing = container_for(make_spec("test-2", web_port=9000))
+    mock_docker_client.list_managed_containers.return_value = [existing]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile([valid, bad_port, escaped])
+
+    assert result["errors"] == [
+        "Invalid spec for test-2: web_port out of range: 80",
+        "Invalid spec for test-3: data_path must be under /mnt: /mnt/../etc",
+    ]
+    # The drifted container of the invalid spec is neither destroyed nor recreated
+    mock_docker_client.remove_container.assert_not_called()
+    mock_docker_client.create_container.assert_called_once_with(valid)
+
+def test_bad_resource_limits_are_reported_per_instance(reconciler, mock_docker_client):
+    bad_memory = make_spec("test-1")
+    existing = container_for(bad_memory)
+    bad_memory.resource_limits.memory = "lots"
+    negative_cpu = make_spec("test-2", web_port=9092, data_port=51414)
+    negative_cpu.resource_limits.cpu_quota = -5
+    valid = make_spec("test-3", web_port=9093, data_port=51415)
+    mock_docker_client.list_managed_containers.return_value = [existing]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile([bad_memory, negative_cpu, valid])
+
+    assert result["errors"] == [
+        "Invalid spec for test-1: Invalid memory limit: lots",
+        "Invalid spec for test-2: cpu_quota must not be negative: -5",
+    ]
+    mock_docker_client.remove_container.assert_not_called()
+    mock_docker_client.create_container.assert_called_once_with(valid)
+
+def test_duplicate_ids_are_invalid(reconciler):
+    specs = [make_spec("test-1"), make_spec("test-1", web_port=9000)]
+    with patch("os.path.exists", return_value=True):
+        assert reconciler.validator.validate(specs) == {"test-1": "Duplicate instance ID: test-1"}
+
+def test_path_checks_are_cached(reconciler):
+    specs = [make_spec("test-1") for _ in range(3)]
+    with patch("os.path.exists", return_value=True) as exists:
+        for spec in specs:
+            assert reconciler.validator.check(spec) is None
+    assert exists.call_count == 3  # config, data and watch path, once each
+
+    reconciler.validator.invalidate()
+    with patch("os.path.exists", return_value=False):
+        assert reconciler.validator.check(specs[0]).startswith("config_path does not exist")
+
+def test_port_clashes_are_rejected(reconciler, mock_docker_client):
+    kept = make_spec("kept", web_port=9000, data_port=19000)
+    mock_docker_client.list_managed_containers.return_value = [container_for(kept)]
+    specs = [
+        kept,
+        make_spec("a", web_port=9001, data_port=19001),
+        make_spec("b", web_port=9001, data_port=19002),
+        make_spec("c", web_port=9002, data_port=19000),
+    ]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["errors"] == [
+        "Invalid spec for a: Port 9001 is also requested by b",
+        "Invalid spec for b: Port 9001 is also requested by a",
+        "Invalid spec for c: Port 19000 is in use by instance kept",
+    ]
+    mock_docker_client.create_container.assert_not_called()
+
+def test_ports_of_replaced_containers_can_be_reused(reconciler, mock_docker_client):
+    old = make_spec("old", web_port=9000, data_port=19000)
+    moved = make_spec("moved", web_port=9001, data_port=19001)
+    mock_docker_client.list_managed_containers.return_value = [container_for(old), container_for(moved)]
+    specs = [
+        make_spec("new", web_port=9000, data_port=19000),
+        make_spec("moved", web_port=9002, data_port=19002),
+    ]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["errors"] == []
+    # Recreating "moved" destroys its old container too
+    assert (result["destroyed_count"], result["created_count"], result["recreated_count"]) == (2, 2, 1)
+
+def test_zero_ports_are_assigned_from_range(reconciler, mock_docker_client):
+    reconciler.port_range = range(20000, 20010)
+    existing = make_spec("existing", web_port=20003, data_port=20000)
+    taken = make_spec("taken", web_port=20001, data_port=20002)
+    mock_docker_client.list_managed_containers.return_value = [container_for(existing), container_for(taken)]
+    specs = [
+        make_spec("existing", web_port=0, data_port=0),
+        taken,
+        make_spec("new", web_port=0, data_port=0),
+        make_spec("half", web_port=9091, data_port=0),
+    ]
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile(specs)
+
+    assert result["errors"] == []
+    ports = {spec.id: (spec.web_port, spec.data_port) for spec in result["instances"]}
+    # The existing instance keeps its ports, so nothing changes for it
+    assert ports == {"new": (20004, 20005), "half": (9091, 20006)}
+    assert result["unchanged_count"] == 2
+    assert specs[2].web_port == 0
+
+def test_zero_ports_without_range_are_invalid(reconciler, mock_docker_client):
+    mock_docker_client.list_managed_containers.return_value = []
+
+    with patch("os.path.exists", return_value=True):
+        result = reconciler.reconcile([make_spec("test-1", web_port=0)])
+
+    assert result["errors"] == ["Invalid spec for test-1: web_port out of range: 0"]
@@ -0,0 +1,256 @@
+import grpc
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from src import transctrl_pb2
+from src.container_cache import ContainerCache
+from conftest import make_container
+
+
+def test_watch_status_sends_snapshot_then_changes(servicer, context):
+    cache = servicer.container_cache
+    cache.put(make_container("c1", "user-1"))
+    stream = servicer.WatchStatus(transctrl_pb2.WatchRequest(), context)
+
+    snapshot = next(stream)
+    assert (snapshot.id, snapshot.status) == ("user-1", transctrl_pb2.RUNNING)
+
+    cache.put(make_container("c1", "user-1", status="exited"))
+    cache.put(make_container("c2", "user-2"))
+    cache.discard(make_container("c2", "user-2"))
+
+    update = next(stream)
+    assert (update.id, update.status) == ("user-1", transctrl_pb2.STOPPED)
+    removed = next(stream)
+    assert (removed.id, removed.container_id, removed.status) == ("user-2", "c2", transctrl_pb2.REMOVED)
+
+    stream.close()
+    assert cache._subscriptions == []
+
+
+def test_slow_watcher_gets_a_fresh_snapshot(servicer, context):
+    cache = servicer.container_cache
+    cache.put(make_container("c0", "user-0"))
+    stream = servicer.WatchStatus(transctrl_pb2.WatchRequest(), context)
+    assert next(stream).id == "user-0"
+
+    # Falls more than max_pending instances behind
+    cache._subscriptions[0].max_pending = 2
+    for i in range(1, 5):
+        cache.put(make_container(f"c{i}", f"user-{i}"))
+
+    ids = {next(stream).id for _ in range(5)}
+    assert ids == {f"user-{i}" for i in range(5)}
+    stream.close()
+
+
+def test_watcher_is_told_of_removals_it_missed(servicer, context):
+    cache = servicer.container_cache
+    cache.put(make_container("c0", "user-0"))
+    cache.put(make_container("c9", "user-9"))
+    stream = servicer.WatchStatus(transctrl_pb2.WatchRequest(known_ids=["user-gone"]), context)
+    first = [next(stream) for _ in range(3)]
+    assert (first[0].id, first[0].status) == ("user-gone", transctrl_pb2.REMOVED)
+
+    # Overflows, losing user-9's removal
+    cache._subscriptions[0].max_pending = 2
+    cache.discard(make_container("c9", "user-9"))
+    for i in range(1, 4):
+        cache.put(make_container(f"c{i}", f"user-{i}"))
+
+    removed = next(stream)
+    assert (removed.id, removed.container_id, removed.status) == ("user-9", "c9", transctrl_pb2.REMOVED)
+    assert {next(stream).id for _ in range(4)} == {f"user-{i}" for i in range(4)}
+    stream.close()
+
+
+def test_watchers_are_capped(servicer, context):
+    streams = [servicer.WatchStatus(transctrl_pb2.WatchRequest(), context) for _ in range(5)]
+    servicer.container_cache.put(make_container("c1", "user-1"))
+    for stream in streams[:4]:
+        next(stream)
+
+    with pytest.raises(Exception, match="aborted"):
+        next(streams[4])
+    context.abort.assert_called_once()
+    for stream in streams[:4]:
+        stream.close()
+
+
+def test_reconcile_is_charged_by_planned_actions(servicer, context, monkeypatch):
+    from src import rate_limiter
+    from src.rate_limiter import RateLimiter
+    from src.server import settings
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ACTION_COST", 0.1)
+    # No refill while the pass runs, however long it takes
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: 1000.0))
+    servicer.rate_limiter = RateLimiter(requests=3, window=60)
+    specs = [transctrl_pb2.InstanceSpec(
+        id=f"user-{i}", config_path="/mnt/c", data_path="/mnt/d", watch_path="/mnt/w",
+        web_port=10000 + i, data_port=20000 + i,
+    ) for i in range(20)]
+
+    # 20 creates cost 1 + 2 tokens: the whole bucket
+    with patch("os.path.exists", return_value=True):
+        servicer.Reconcile(transctrl_pb2.DesiredState(instances=specs), context)
+    with pytest.raises(Exception, match="aborted"):
+        servicer.ApplyChanges(transctrl_pb2.ChangeSet(), context)
+
+    (trailer,), = context.set_trailing_metadata.call_args.args
+    assert trailer[0] == "retry-after"
+    assert float(trailer[1]) == pytest.approx(20.0)
+
+
+def test_rate_limited_call_is_turned_away_before_planning(servicer, context):
+    from src.rate_limiter import RateLimiter
+
+    servicer.rate_limiter = RateLimiter(requests=1, window=60)
+    servicer.Reconcile(transctrl_pb2.DesiredState(), context)
+
+    with patch.object(servicer.reconciler, "plan") as plan, pytest.raises(Exception, match="aborted"):
+        servicer.Reconcile(transctrl_pb2.DesiredState(), context)
+    plan.assert_not_called()
+
+
+def test_rate_limit_budget_per_metadata_key(servicer, context, monkeypatch):
+    from src.rate_limiter import RateLimiter
+    from src.server import settings
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_KEY", "metadata:x-client-id")
+    servicer.rate_limit_key = servicer._checked_rate_limit_key()
+    servicer.rate_limiter = RateLimiter(requests=1, window=60)
+
+    context.invocation_metadata.return_value = (("x-client-id", "a"),)
+    servicer.Reconcile(transctrl_pb2.DesiredState(), context)
+    with pytest.raises(Exception, match="aborted"):
+        servicer.Reconcile(transctrl_pb2.DesiredState(), context)
+
+    context.invocation_metadata.return_value = (("x-client-id", "b"),)
+    servicer.Reconcile(transctrl_pb2.DesiredState(), context)
+
+
+def test_unknown_rate_limit_key_fails_at_startup(mock_docker_client, monkeypatch):
+    from src import server
+
+    monkeypatch.setattr(server.settings, "RATE_LIMIT_KEY", "ip")
+    with patch.object(server, "DockerClient", return_value=mock_docker_client), \
+         patch.object(ContainerCache, "start"), \
+         pytest.raises(ValueError, match="Unknown RATE_LIMIT_KEY: ip"):
+        server.TransmissionControllerServicer()
+
+
+def test_reconcile_out_of_time_returns_a_continuation(servicer, context, mock_docker_client):
+    servicer.coalescer.background = False
+    mock_docker_client.create_container.side_effect = lambda spec: make_container(f"c-{spec.id}", spec.id)
+    specs = [transctrl_pb2.InstanceSpec(
+        id=f"user-{i}", config_path="/mnt/c", data_path="/mnt/d", watch_path="/mnt/w",
+        web_port=10000 + i, data_port=20000 + i,
+    ) for i in range(3)]
+
+    # Less time left than RECONCILE_DEADLINE_MARGIN: nothing may start
+    context.time_remaining.return_value = 0.5
+    with patch("os.path.exists", return_value=True):
+        partial = servicer.Reconcile(transctrl_pb2.DesiredState(instances=specs), context)
+    assert (partial.created_count, partial.deferred_count) == (0, 3)
+    assert partial.continuation_token
+
+    context.time_remaining.return_value = None
+    with patch("os.path.exists", return_value=True):
+        rest = servicer.Reconcile(
+            transctrl_pb2.DesiredState(continuation_token=partial.continuation_token), context
+        )
+    assert (rest.created_count, rest.deferred_count, rest.continuation_token) == (3, 0, "")
+
+    with pytest.raises(Exception, match="aborted"):
+        servicer.Reconcile(transctrl_pb2.DesiredState(continuation_token="unknown"), context)
+    assert context.abort.call_args.args[0] == grpc.StatusCode.NOT_FOUND
+
+
+def test_apply_changes_reports_assigned_ports(servicer, context, mock_docker_client):
+    servicer.reconciler.port_range = range(30000, 30010)
+    servicer.container_cache.put(make_container("c0", "user-0"))  # holds 9091 and 51413
+
+    def create_container(spec):
+        container = make_container(f"c-{spec.id}", spec.id)
+        container.attrs["HostConfig"]["PortBindings"] = {
+            "9091/tcp": [{"HostPort": str(spec.web_port)}],
+            "51413/tcp": [{"HostPort": str(spec.data_port)}],
+        }
+        return container
+
+    mock_docker_client.create_container.side_effect = create_container
+    specs = [transctrl_pb2.InstanceSpec(
+        id=instance_id, config_path="/mnt/c", data_path="/mnt/d", watch_path="/mnt/w",
+        web_port=web_port,
+    ) for instance_id, web_port in (("user-1", 0), ("user-2", 9091))]
+
+    with patch("os.path.exists", return_value=True), \
+         patch.object(servicer.container_cache, "get_containers_by_ids",
+                      wraps=servicer.container_cache.get_containers_by_ids) as bulk:
+        result = servicer.ApplyChanges(transctrl_pb2.ChangeSet(upserts=specs), context)
+
+    assert result.errors == ["Invalid spec for user-2: Port 9091 is in use by instance user-0"]
+    assert [(s.id, s.container_id, s.actual_web_port, s.actual_data_port) for s in result.instances] == [
+        ("user-1", "c-user-1", 30000, 30001),
+    ]
+    bulk.assert_called_with(["user-1"])
+
+
+def test_status_names_the_docker_host(servicer, context):
+    from src.server import settings
+
+    servicer.container_cache.put(make_container("c1", "user-1"))
+
+    (status,) = servicer.GetStatus(transctrl_pb2.StatusRequest(), context).instances
+    assert status.host == settings.DOCKER_HOST
+
+
+def test_get_status_pages_in_id_order(servicer, context):
+    for i in (3, 1, 4, 0, 2):
+        servicer.container_cache.put(make_container(f"c{i}", f"user-{i}"))
+
+    pages, request = [], transctrl_pb2.StatusRequest(page_size=2)
+    while True:
+        response = servicer.GetStatus(request, context)
+        pages.append([s.id for s in response.instances])
+        if not response.next_page_token:
+            break
+        request.page_token = response.next_page_token
+
+    assert pages == [["user-0", "user-1"], ["user-2", "user-3"], ["user-4"]]
+
+
+def test_get_status_filters_and_masks_fields(servicer, context):
+    cache = servicer.container_cache
+    cache.put(make_container("c1", "user-1"))
+    cache.put(make_container("c2", "user-2", status="exited"))
+    cache.put(make_container("c3", "guest-3", status="exited"))
+
+    request = transctrl_pb2.StatusRequest(statuses=[transctrl_pb2.STOPPED], id_prefix="user-")
+    request.field_mask.paths.append("status")
+    (status,) = servicer.GetStatus(request, context).instances
+
+    assert (status.id, status.status) == ("user-2", transctrl_pb2.STOPPED)
+    assert (status.container_id, status.actual_web_port, status.HasField("created_at")) == ("", 0, False)
+
+
+def test_get_status_rejects_unknown_fields(servicer, context):
+    request = transctrl_pb2.StatusRequest()
+    request.field_mask.paths.append("nonsense")
+
+    with pytest.raises(Exception, match="aborted"):
+        servicer.GetStatus(request, context)
+    assert context.abort.call_args.args[0] == grpc.StatusCode.INVALID_ARGUMENT
+
+
+def test_get_instances_returns_found_and_missing(servicer, context):
+    servicer.container_cache.put(make_container("c1", "user-1"))
+    servicer.container_cache.put(make_container("c2", "user-2"))
+
+    response = servicer.GetInstances(transctrl_pb2.InstanceIds(ids=["user-2", "ghost", "user-1", "user-2"]), context)
+
+    assert [(s.id, s.container_id) for s in response.instances] == [("user-2", "c2"), ("user-1", "c1")]
+    assert list(response.missing) == ["ghost"]
+    servicer.container_cache.docker_client.get_containers_by_ids.assert_not_called()
@@ -0,0 +1,154 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.container_cache import ContainerCache
+from src.docker_client import DockerClient
+from src.reconciler import Reconciler
+from src.sharding import HashRing, Placement, ShardedCache, ShardedReconciler
+from conftest import container_for, make_spec
+
+HOSTS = ["tcp://a:2375", "tcp://b:2375"]
+
+
+@pytest.fixture
+def clients():
+    clients = {host: MagicMock(spec=DockerClient) for host in HOSTS}
+    for client in clients.values():
+        client.list_managed_containers.return_value = []
+        client.get_containers_by_ids.return_value = {}
+    return clients
+
+
+def sharded(clients, policy="capacity"):
+    reconcilers = {host: Reconciler(client) for host, client in clients.items()}
+    return ShardedReconciler(reconcilers, Placement(HOSTS, policy=policy))
+
+
+def created_ids(client):
+    return [call.args[0].id for call in client.create_container.call_args_list]
+
+
+def test_adding_a_host_only_moves_instances_to_it():
+    ids = [f"user-{i}" for i in range(1000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    moved = [i for i in ids if before.host_for(i) != after.host_for(i)]
+
+    assert all(after.host_for(i) == "d" for i in moved)
+    assert 150 < len(moved) < 350
+
+
+def test_existing_instances_stay_and_new_ones_fill_the_emptiest_host(clients):
+    a, b = HOSTS
+    clients[a].list_managed_containers.return_value = [container_for(make_spec("x", 9000, 19000))]
+    specs = [
+        make_spec("x", 9000, 19000),
+        make_spec("y", 9001, 19001),
+        make_spec("z", 9002, 19002),
+    ]
+
+    with patch("os.path.exists", return_value=True):
+        result = sharded(clients).reconcile(specs)
+
+    assert result["errors"] == []
+    assert (result["created_count"], result["unchanged_count"]) == (2, 1)
+    assert (created_ids(clients[a]), created_ids(clients[b])) == (["z"], ["y"])
+
+
+def test_stray_copies_on_other_hosts_are_destroyed(clients):
+    a, b = HOSTS
+    spec = make_spec("x", 9000, 19000)
+    stray = container_for(spec)
+    clients[a].list_managed_containers.return_value = [container_for(spec)]
+    clients[b].list_managed_containers.return_value = [stray]
+
+    with patch("os.path.exists", return_value=True):
+        result = sharded(clients).reconcile([spec])
+
+    assert (result["unchanged_count"], result["destroyed_count"]) == (1, 1)
+    clients[b].remove_container.assert_called_once_with(stray)
+
+
+def test_changes_go_to_the_hosts_they_touch(clients):
+    a, b = HOSTS
+    old = container_for(make_spec("old"))
+    clients[b].get_containers_by_ids.side_effect = lambda ids: {"old": old} if "old" in ids else {}
+
+    with patch("os.path.exists", return_value=True):
+        result = sharded(clients, policy="hash").apply_changes(
+            [make_spec("new"), make_spec("both", 9092, 51414)], ["old", "both"]
+        )
+
+    assert result["errors"] == ["Instance both is both upserted and deleted; skipping"]
+    assert (result["created_count"], result["destroyed_count"]) == (1, 1)
+    clients[b].remove_container.assert_called_once_with(old)
+    clients[a].remove_container.assert_not_called()
+
+
+def test_an_unreachable_host_leaves_the_others_reconciling(clients):
+    a, b = HOSTS
+    clients[a].list_managed_containers.return_value = [container_for(make_spec("x", 9000, 19000))]
+    clients[b].list_managed_containers.side_effect = ConnectionError("refused")
+    specs = [make_spec("x", 9000, 19000), make_spec("y", 9001, 19001)]
+
+    with patch("os.path.exists", return_value=True):
+        result = sharded(clients).reconcile(specs)
+
+    assert result["errors"] == [
+        f"Docker host {b} unreachable: refused",
+        f"Instance y not placed while {b} unreachable",
+    ]
+    assert result["unchanged_count"] == 1
+    clients[a].create_container.assert_not_called()
+
+
+def test_changes_skip_an_unreachable_host(clients):
+    a, b = HOSTS
+    old = container_for(make_spec("old"))
+    clients[a].get_containers_by_ids.side_effect = lambda ids: {"old": old}
+    clients[b].get_containers_by_ids.side_effect = ConnectionError("refused")
+
+    with patch("os.path.exists", return_value=True):
+        result = sharded(clients, policy="hash").apply_changes([make_spec("new")], ["old", "gone"])
+
+    assert result["errors"] == [
+        f"Docker host {b} unreachable: refused",
+        f"Instance new not placed while {b} unreachable",
+        f"Instance gone not deleted while {b} unreachable",
+    ]
+    assert result["destroyed_count"] == 1
+    clients[a].remove_container.assert_called_once_with(old)
+
+
+def test_sharded_cache_skips_a_failing_host():
+    caches = {host: MagicMock(spec=ContainerCache) for host in HOSTS}
+    caches[HOSTS[0]].list_managed_containers.side_effect = ConnectionError("refused")
+    caches[HOSTS[0]].get_containers_by_ids.side_effect = ConnectionError("refused")
+    container = container_for(make_spec("y"))
+    caches[HOSTS[1]].list_managed_containers.return_value = [container]
+    caches[HOSTS[1]].get_containers_by_ids.return_value = {"y": container}
+    view = ShardedCache(caches)
+
+    assert view.list_managed_containers() == [container]
+    assert view.get_containers_by_ids(["y"]) == {"y": container}
+
+
+def test_sharded_cache_reports_hosts_and_merges_watches():
+    caches = {host: ContainerCache(MagicMock(spec=DockerClient), host=host) for host in HOSTS}
+    for cache in caches.values():
+        cache.docker_client.list_managed_containers.return_value = []
+        cache.resync()
+        cache._connected = True
+    view = ShardedCache(caches)
+    subscription = view.subscribe()
+
+    for host, instance_id in zip(HOSTS, ("x", "y")):
+        container = container_for(make_spec(instance_id))
+        container.id = f"c-{instance_id}"
+        caches[host].put(container)
+
+    assert [view.host_of(c) for c in view.list_managed_containers()] == HOSTS
+    assert view.get_container_by_id("y").id == "c-y"
+    assert [id for id, _, _ in subscription.drain(timeout=0)] == ["x", "y"]
@@ -0,0 +1,89 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src import transctrl_pb2
+from src.usage import UsageSampler
+from conftest import make_container
+
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: {lo} 10 0 0 0 0 0 0 {lo} 10 0 0 0 0 0 0
+  eth0: {rx} 10 0 0 0 0 0 0 {tx} 10 0 0 0 0 0 0
+"""
+
+
+def write_cgroup(root, proc, container_id, pid, cpu_usec, memory, rbytes, wbytes, rx, tx, systemd=True):
+    """Lay out the cgroup v2 and /proc files the sampler reads for one container."""
+    path = root / "system.slice" / f"docker-{container_id}.scope" if systemd else root / "docker" / container_id
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "cpu.stat").write_text(f"usage_usec {cpu_usec}\nuser_usec 0\nsystem_usec 0\n")
+    (path / "memory.current").write_text(f"{memory}\n")
+    (path / "io.stat").write_text(f"8:0 rbytes={rbytes} wbytes={wbytes} rios=1 wios=1\n"
+                                  f"8:16 rbytes=0 wbytes=0 rios=0 wios=0\n")
+    (path / "cgroup.procs").write_text(f"{pid}\n{pid + 1}\n")
+    net = proc / str(pid) / "net"
+    net.mkdir(parents=True, exist_ok=True)
+    (net / "dev").write_text(NET_DEV.format(lo=999999, rx=rx, tx=tx))
+
+
+@pytest.fixture
+def cgroups(tmp_path):
+    return tmp_path / "cgroup", tmp_path / "proc"
+
+
+def sampler_for(cgroups, containers):
+    root, proc = cgroups
+    cache = MagicMock()
+    cache.list_managed_containers.return_value = containers
+    return UsageSampler(cache, interval=1, root=str(root), proc_root=str(proc), history=3)
+
+
+def test_usage_is_the_rate_between_the_last_two_sweeps(cgroups):
+    root, proc = cgroups
+    container = make_container("abc", "user-1")
+    sampler = sampler_for(cgroups, [container])
+
+    write_cgroup(root, proc, "abc", 100, cpu_usec=1_000_000, memory=50, rbytes=0, wbytes=0, rx=0, tx=0)
+    with patch("src.usage.time.monotonic", return_value=10.0):
+        sampler.sweep()
+    assert sampler.usage("user-1") is None
+
+    write_cgroup(root, proc, "abc", 100, cpu_usec=2_000_000, memory=70, rbytes=4000, wbytes=2000, rx=800, tx=400)
+    with patch("src.usage.time.monotonic", return_value=12.0):
+        sampler.sweep()
+
+    usage = sampler.usage("user-1")
+    assert (usage.cpu_percent, usage.memory_bytes) == (50.0, 70)
+    assert (usage.io_read_rate, usage.io_write_rate) == (2000.0, 1000.0)
+    assert (usage.net_rx_rate, usage.net_tx_rate) == (400.0, 200.0)
+
+
+def test_history_is_bounded_and_dropped_with_the_container(cgroups):
+    root, proc = cgroups
+    sampler = sampler_for(cgroups, [make_container("abc", "user-1")])
+    write_cgroup(root, proc, "abc", 100, 0, 0, 0, 0, 0, 0, systemd=False)
+
+    for _ in range(5):
+        sampler.sweep()
+    assert len(sampler.samples("user-1")) == 3
+
+    sampler.cache.list_managed_containers.return_value = []
+    sampler.sweep()
+    assert sampler.samples("user-1") == []
+
+
+def test_status_carries_usage(servicer, context, cgroups):
+    root, proc = cgroups
+    container = make_container("abc", "user-1")
+    servicer.container_cache.put(container)
+    servicer.usage = sampler_for(cgroups, [container])
+    for tick, cpu_usec in ((10.0, 0), (11.0, 250_000)):
+        write_cgroup(root, proc, "abc", 100, cpu_usec, memory=1024, rbytes=0, wbytes=0, rx=0, tx=0)
+        with patch("src.usage.time.monotonic", return_value=tick):
+            servicer.usage.sweep()
+
+    status = servicer.GetInstance(transctrl_pb2.InstanceId(id="user-1"), context)
+
+    assert (status.usage.cpu_percent, status.usage.memory_bytes) == (25.0, 1024)
+    assert status.usage.sampled_at.seconds > 0